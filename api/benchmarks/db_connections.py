@@ -0,0 +1,152 @@
+"""
+Load tests the tea list endpoint served by gunicorn with a new database
+connection per request, persistent connections and a pool shared by worker
+threads, printing throughput and latency percentiles of each mode.
+A PostgreSQL test database is created for the run, with one user and its
+teas, and gunicorn is started on it for each mode with the same settings
+environment otherwise.
+
+Usage, from the api folder:
+    python -m benchmarks.db_connections
+    python -m benchmarks.db_connections --requests 5000 --clients 32 --threads 8
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+import django
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "tea_project.settings")
+django.setup()
+
+from django.db import connection  # noqa: E402
+
+from catalog.models import CustomUser, Tea  # noqa: E402
+from catalog.serializers import LoginSerializer  # noqa: E402
+
+ADDRESS = "127.0.0.1:8765"
+
+
+def get_modes(workers, threads):
+    """
+    Returns benchmarked modes as a dictionary of environment overrides by
+    name.
+    """
+    sync = {"GUNICORN_WORKERS": str(workers * threads), "GUNICORN_THREADS": "1"}
+    return {
+        "connection per request": {**sync, "SQL_CONN_MAX_AGE": "0"},
+        "persistent connections": {
+            **sync,
+            "SQL_CONN_MAX_AGE": "600",
+            "SQL_HEALTH_CHECKS": "1",
+        },
+        "pooled connections, threads": {
+            "GUNICORN_WORKERS": str(workers),
+            "GUNICORN_THREADS": str(threads),
+            "SQL_ENGINE": "catalog.postgresql_pool",
+            "SQL_CONN_MAX_AGE": "0",
+            "SQL_POOL_MIN_SIZE": str(threads),
+            "SQL_POOL_MAX_SIZE": str(threads),
+        },
+    }
+
+
+def populate(teas):
+    """ Creates a user with teas, returns the user. """
+    user = CustomUser.objects.create_user("benchmark@example.com", "pAzzw0rd!")
+    Tea.objects.bulk_create(Tea(user=user, name=f"Tea {i}") for i in range(teas))
+    return user
+
+
+def start_server(env):
+    """ Starts gunicorn and waits until it answers. """
+    server = subprocess.Popen(
+        ["gunicorn", "tea_project.wsgi:application", "--bind", ADDRESS], env=env
+    )
+    for _ in range(100):
+        try:
+            urllib.request.urlopen(f"http://{ADDRESS}/ping/")
+            return server
+        except OSError:
+            time.sleep(0.1)
+    server.terminate()
+    raise RuntimeError("gunicorn didn't start")
+
+
+def load(token, requests, clients):
+    """
+    Requests the tea list from concurrent clients.
+
+    Returns:
+        Tuple of requests per second and list of latencies in seconds.
+    """
+    request = urllib.request.Request(
+        f"http://{ADDRESS}/api/tea/", headers={"Authorization": f"Bearer {token}"}
+    )
+
+    def fetch(_):
+        start = time.perf_counter()
+        with urllib.request.urlopen(request) as resp:
+            json.load(resp)
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as executor:
+        latencies = list(executor.map(fetch, range(requests)))
+    return requests / (time.perf_counter() - start), latencies
+
+
+def run(args, database):
+    """ Prints throughput and latencies of each mode. """
+    user = populate(args.teas)
+    connection.close()
+
+    for name, overrides in get_modes(args.workers, args.threads).items():
+        env = {**os.environ, "SQL_DATABASE": database, **overrides}
+        server = start_server(env)
+        try:
+            token = str(LoginSerializer.get_token(user).access_token)
+            load(token, args.clients, args.clients)  # Warm up
+            throughput, latencies = load(token, args.requests, args.clients)
+        finally:
+            server.terminate()
+            server.wait()
+
+        percentiles = statistics.quantiles(latencies, n=100)
+        print(
+            f"{name:30} {throughput:8.1f} req/s  "
+            f"p50 {percentiles[49] * 1000:7.2f} ms  "
+            f"p95 {percentiles[94] * 1000:7.2f} ms  "
+            f"p99 {percentiles[98] * 1000:7.2f} ms"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--teas", type=int, default=50)
+    args = parser.parse_args()
+
+    if connection.vendor != "postgresql":
+        sys.exit("The load test needs a PostgreSQL database")
+
+    old_name = connection.creation.create_test_db(verbosity=0)
+    database = connection.settings_dict["NAME"]
+    try:
+        run(args, database)
+    finally:
+        connection.close()
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+if __name__ == "__main__":
+    main()
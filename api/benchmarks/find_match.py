@@ -0,0 +1,122 @@
+"""
+Benchmarks VisionParser fuzzy matching, comparing difflib over the full list
+of catalog names with the NgramIndex candidate filtering.
+
+Usage, from the api folder:
+    python -m benchmarks.find_match
+    python -m benchmarks.find_match --sizes 1000 10000 --phrases 200
+"""
+import argparse
+import difflib
+import random
+import string
+import time
+
+from catalog.ngram_index import NgramIndex
+
+SYLLABLES = (
+    "da hong pao long jing bai hao yin zhen tie guan shui xian pu erh dian "
+    "mao feng bi luo chun lapsang sou chong qi men jin jun mei dan cong ya shi "
+    "xiang ding dong wu yi rou gui lao ban zhang yue guang sencha gyokuro matcha "
+    "hojicha assam darjeeling ceylon earl grey jasmine oolong sheng shou tea shop "
+    "leaf house garden mountain valley cloud spring silver golden needle"
+).split()
+
+
+def random_vocabulary(rng, size=5000):
+    """ Returns a list of random pronounceable words, like brand or place names. """
+    consonants = "bcdfghjklmnprstvwxyz"
+    vowels = "aeiou"
+    return [
+        "".join(
+            rng.choice(consonants) + rng.choice(vowels)
+            for _ in range(rng.randint(2, 4))
+        )
+        for _ in range(size)
+    ]
+
+
+def random_name(rng, vocabulary):
+    """ Returns a random tea-like name of one to four words. """
+    words = []
+    for _ in range(rng.randint(1, 4)):
+        if rng.random() < 0.5:
+            words.append(rng.choice(SYLLABLES))
+        else:
+            words.append(rng.choice(vocabulary))
+    return " ".join(words)
+
+
+def random_phrase(rng, names, vocabulary):
+    """ Returns a random label phrase, half of the times a typo of a known name. """
+    if rng.random() < 0.5:
+        chars = list(rng.choice(names))
+        for _ in range(rng.randint(0, 2)):
+            chars[rng.randrange(len(chars))] = rng.choice(string.ascii_lowercase)
+        return "".join(chars)
+    return random_name(rng, vocabulary)
+
+
+def difflib_matches(phrases, names):
+    """ Runs previous find_match implementation lookups. """
+    return [difflib.get_close_matches(p, names, cutoff=0.8) for p in phrases]
+
+
+def index_matches(phrases, index):
+    """ Runs NgramIndex lookups. """
+    return [index.get_close_matches(p, cutoff=0.8) for p in phrases]
+
+
+def run(size, phrases_count, seed):
+    """
+    Benchmarks both implementations on a synthetic catalog, checking that
+    results match.
+
+    Args:
+        size: Number of catalog names.
+        phrases_count: Number of phrases to look up.
+        seed: Random seed.
+    """
+    rng = random.Random(seed)
+    vocabulary = random_vocabulary(rng)
+    names = {}
+    while len(names) < size:
+        names[random_name(rng, vocabulary)] = None
+    names = list(names)
+    phrases = [random_phrase(rng, names, vocabulary) for _ in range(phrases_count)]
+
+    start = time.perf_counter()
+    index = NgramIndex(names)
+    build_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    expected = difflib_matches(phrases, names)
+    difflib_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    found = index_matches(phrases, index)
+    index_time = time.perf_counter() - start
+
+    assert found == expected, "NgramIndex results differ from difflib"
+
+    print(
+        f"{len(names):>7} names  "
+        f"difflib {difflib_time / phrases_count * 1000:9.3f} ms/phrase  "
+        f"ngram {index_time / phrases_count * 1000:7.3f} ms/phrase  "
+        f"speedup {difflib_time / index_time:6.1f}x  "
+        f"build {build_time:6.2f} s"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--phrases", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    for size in args.sizes:
+        run(size, args.phrases, args.seed)
+
+
+if __name__ == "__main__":
+    main()
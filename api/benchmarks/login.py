@@ -0,0 +1,127 @@
+"""
+Benchmarks login throughput through the login endpoint, counting password
+checks and token signings per login. Exits with an error if a login checks
+the password or signs tokens more than once, so that it can guard against
+regressions in CI. A test database is created for the run.
+
+Usage, from the api folder:
+    python -m benchmarks.login
+    python -m benchmarks.login --logins 200 --threads 4
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import django
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "tea_project.settings")
+django.setup()
+
+from django.contrib.auth import base_user, get_user_model  # noqa: E402
+from django.db import connection  # noqa: E402
+from django.test import Client  # noqa: E402
+from django.test.utils import setup_test_environment  # noqa: E402
+
+from catalog.serializers import LoginSerializer  # noqa: E402
+
+EMAIL = "benchmark@example.com"
+PASSWORD = "pAzzw0rd!"
+
+
+class CallCounter:
+    """
+    Counts calls of a module function or class method while installed.
+
+    Attributes:
+        calls: Integer number of calls.
+    """
+
+    def __init__(self, owner, name, is_classmethod=False):
+        self.owner = owner
+        self.name = name
+        self.is_classmethod = is_classmethod
+        self.calls = 0
+
+    def __enter__(self):
+        self.original = getattr(self.owner, self.name)
+
+        def counted(*args, **kwargs):
+            self.calls += 1
+            if self.is_classmethod:
+                args = args[1:]
+            return self.original(*args, **kwargs)
+
+        setattr(
+            self.owner,
+            self.name,
+            classmethod(counted) if self.is_classmethod else counted,
+        )
+        return self
+
+    def __exit__(self, *args):
+        if self.is_classmethod:
+            setattr(self.owner, self.name, classmethod(self.original.__func__))
+        else:
+            setattr(self.owner, self.name, self.original)
+
+
+def login(_):
+    """ Logs in through the endpoint, returns response status code. """
+    resp = Client().post(
+        "/api/login/",
+        {"email": EMAIL, "password": PASSWORD},
+        content_type="application/json",
+    )
+    return resp.status_code
+
+
+def run(logins, threads):
+    """
+    Runs logins and prints throughput and calls per login.
+
+    Returns:
+        Boolean telling if every login checked the password and signed
+        tokens exactly once.
+    """
+    get_user_model().objects.create_user(EMAIL, PASSWORD)
+    login(None)  # Warm up
+
+    with CallCounter(base_user, "check_password") as checks, CallCounter(
+        LoginSerializer, "get_token", is_classmethod=True
+    ) as signings:
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            statuses = list(executor.map(login, range(logins)))
+        duration = time.perf_counter() - start
+
+    assert statuses == [200] * logins, "Some logins failed"
+    print(
+        f"{logins} logins  {threads} threads  "
+        f"{logins / duration:8.1f} logins/s  "
+        f"{duration / logins * 1000:8.2f} ms/login  "
+        f"password checks {checks.calls / logins:.2f}/login  "
+        f"token signings {signings.calls / logins:.2f}/login"
+    )
+    return checks.calls == logins and signings.calls == logins
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--logins", type=int, default=50)
+    parser.add_argument("--threads", type=int, default=1)
+    args = parser.parse_args()
+
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0)
+    try:
+        ok = run(args.logins, args.threads)
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+    if not ok:
+        sys.exit("Logins should check the password and sign tokens once")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,279 @@
+"""
+Benchmarks per user queries of teas, brewing sessions and catalog lookups on
+a generated database, printing query plans and timings without and with the
+user access indexes of teas and sessions models and the catalog lookup ones.
+A test database is created for the run, the configured one isn't touched.
+
+Usage, from the api folder:
+    python -m benchmarks.user_indexes
+    python -m benchmarks.user_indexes --teas 100000 --users 1000 --repeat 50
+    python -m benchmarks.user_indexes --keepdb
+"""
+import argparse
+import os
+import random
+import statistics
+import time
+from datetime import timedelta
+
+import django
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "tea_project.settings")
+django.setup()
+
+from django.core.management import call_command  # noqa: E402
+from django.db import connection  # noqa: E402
+from django.db.models import Q  # noqa: E402
+from django.utils import timezone  # noqa: E402
+
+from catalog.models import (  # noqa: E402
+    BrewingSession,
+    CustomUser,
+    Origin,
+    Subcategory,
+    Tea,
+    Vendor,
+)
+
+BATCH_SIZE = 10000
+PUBLIC_NAMES = 2000
+PRIVATE_NAMES = 5
+
+# Last migration before catalog lookup indexes
+BASE_MIGRATION = "0005_sync_tracking"
+
+
+def batches(items):
+    """ Yields lists of BATCH_SIZE items at most. """
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == BATCH_SIZE:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def populate(teas, users, seed):
+    """
+    Generates users with private subcategories, vendors and origins, public
+    ones, then teas and a brewing session for every four teas.
+
+    Args:
+        teas: Number of teas.
+        users: Number of users.
+        seed: Random seed.
+    """
+    rng = random.Random(seed)
+    user_ids = [
+        user.id
+        for user in CustomUser.objects.bulk_create(
+            CustomUser(email=f"user{i}@example.com", password="!") for i in range(users)
+        )
+    ]
+    owner = user_ids[0]
+
+    for model in (Subcategory, Vendor):
+        model.objects.bulk_create(
+            model(user_id=owner, name=f"Public {i}", is_public=True)
+            for i in range(PUBLIC_NAMES)
+        )
+        for batch in batches(
+            model(user_id=user_id, name=f"Private {i}")
+            for user_id in user_ids
+            for i in range(PRIVATE_NAMES)
+        ):
+            model.objects.bulk_create(batch)
+    Origin.objects.bulk_create(
+        Origin(user_id=owner, country=f"Country {i}", region="Region", is_public=True)
+        for i in range(PUBLIC_NAMES)
+    )
+
+    subcategories = list(
+        Subcategory.objects.filter(is_public=True).values_list("id", flat=True)
+    )
+    now = timezone.now()
+    for batch in batches(
+        Tea(
+            user_id=rng.choice(user_ids),
+            name=f"Tea {i}",
+            subcategory_id=rng.choice(subcategories),
+        )
+        for i in range(teas)
+    ):
+        Tea.objects.bulk_create(batch)
+    for batch in batches(
+        BrewingSession(user_id=rng.choice(user_ids), name=f"Session {i}")
+        for i in range(teas // 4)
+    ):
+        BrewingSession.objects.bulk_create(batch)
+
+    # Spread timestamps, bulk inserts set them all to now
+    with connection.cursor() as cursor:
+        for table in (Tea._meta.db_table, BrewingSession._meta.db_table):
+            cursor.execute(f"SELECT id FROM {table}")
+            ids = [row[0] for row in cursor.fetchall()]
+            for batch in batches(ids):
+                cursor.executemany(
+                    f"UPDATE {table} SET created_on = %s, modified_on = %s "
+                    "WHERE id = %s",
+                    [
+                        (
+                            now - timedelta(minutes=rng.randrange(500000)),
+                            now - timedelta(minutes=rng.randrange(500000)),
+                            _id,
+                        )
+                        for _id in batch
+                    ],
+                )
+        cursor.execute("ANALYZE")
+
+
+def get_queries(rng, user_ids):
+    """
+    Returns benchmarked queries as a dictionary of functions returning
+    a queryset for random parameters, by name.
+    """
+    since = timezone.now() - timedelta(days=7)
+
+    def user():
+        return rng.choice(user_ids)
+
+    def public_name():
+        return f"Public {rng.randrange(PUBLIC_NAMES)}"
+
+    def private_name():
+        return f"Private {rng.randrange(PRIVATE_NAMES)}"
+
+    return {
+        "tea list page": lambda: Tea.objects.filter(user_id=user()).order_by(
+            "-created_on", "-id"
+        )[:50],
+        "tea delta sync": lambda: Tea.objects.filter(
+            user_id=user(), modified_on__gte=since
+        ).order_by("modified_on"),
+        "session list page": lambda: BrewingSession.objects.filter(
+            user_id=user()
+        ).order_by("-created_on", "-id")[:50],
+        "public subcategory by name": lambda: Subcategory.objects.filter(
+            name=public_name(), is_public=True
+        ),
+        "user subcategory by name": lambda: Subcategory.objects.filter(
+            name=private_name(), is_public=False, user_id=user()
+        ),
+        "user subcategories": lambda: Subcategory.objects.filter(
+            user_id=user(), is_public=False
+        ),
+        "owned or public subcategory by name, OR": lambda: Subcategory.objects.filter(
+            Q(is_public=True) | Q(user_id=user()), name=private_name()
+        ),
+        "owned or public subcategory by name, UNION": lambda: (
+            Subcategory.objects.filter(name=private_name()).owned_or_public(user())
+        ),
+        "public vendor by name": lambda: Vendor.objects.filter(
+            name=public_name(), is_public=True
+        ),
+        "user vendor by name": lambda: Vendor.objects.filter(
+            name=private_name(), is_public=False, user_id=user()
+        ),
+        "public origin": lambda: Origin.objects.filter(
+            country=f"Country {rng.randrange(PUBLIC_NAMES)}",
+            region="Region",
+            locality="",
+            is_public=True,
+        ),
+    }
+
+
+def measure(queries, repeat):
+    """
+    Runs queries repeatedly.
+
+    Returns:
+        Dictionary of (plan, median milliseconds) tuples by query name.
+    """
+    results = {}
+    for name, query in queries.items():
+        plan = query().explain()
+        times = []
+        for _ in range(repeat):
+            queryset = query()
+            start = time.perf_counter()
+            list(queryset)
+            times.append(time.perf_counter() - start)
+        results[name] = (plan, statistics.median(times) * 1000)
+    return results
+
+
+def drop_indexes():
+    """ Drops user access indexes of teas and sessions, and lookup ones. """
+    call_command("migrate", "catalog", BASE_MIGRATION, verbosity=0)
+    with connection.schema_editor() as editor:
+        for model in (Tea, BrewingSession):
+            for index in model._meta.indexes:
+                editor.remove_index(model, index)
+    with connection.cursor() as cursor:
+        cursor.execute("ANALYZE")
+
+
+def create_indexes():
+    """ Creates indexes dropped by drop_indexes. """
+    with connection.schema_editor() as editor:
+        for model in (Tea, BrewingSession):
+            for index in model._meta.indexes:
+                editor.add_index(model, index)
+    call_command("migrate", "catalog", verbosity=0)
+    with connection.cursor() as cursor:
+        cursor.execute("ANALYZE")
+
+
+def run(teas, users, repeat, seed):
+    """
+    Populates the database if empty, then prints plans and median timings
+    of each query without and with indexes.
+    """
+    if not Tea.objects.exists():
+        start = time.perf_counter()
+        populate(teas, users, seed)
+        print(f"Generated {teas} teas in {time.perf_counter() - start:.1f} s")
+
+    user_ids = list(CustomUser.objects.values_list("id", flat=True))
+
+    drop_indexes()
+    without = measure(get_queries(random.Random(seed), user_ids), repeat)
+    create_indexes()
+    indexed = measure(get_queries(random.Random(seed), user_ids), repeat)
+
+    for name, (plan, duration) in indexed.items():
+        base_plan, base_duration = without[name]
+        print(
+            f"\n{name}: {base_duration:9.3f} ms -> {duration:7.3f} ms  "
+            f"speedup {base_duration / duration:7.1f}x"
+        )
+        print("  without indexes:")
+        print("\n".join("    " + line for line in base_plan.splitlines()))
+        print("  with indexes:")
+        print("\n".join("    " + line for line in plan.splitlines()))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--teas", type=int, default=1000000)
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--keepdb", action="store_true", help="Keep the test database for next runs"
+    )
+    args = parser.parse_args()
+
+    old_name = connection.creation.create_test_db(verbosity=0, keepdb=args.keepdb)
+    try:
+        run(args.teas, args.users, args.repeat, args.seed)
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=args.keepdb)
+
+
+if __name__ == "__main__":
+    main()
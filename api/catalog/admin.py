@@ -3,6 +3,8 @@ from django.forms import ModelForm
 from django.urls import reverse
 from django.utils.html import format_html
 
+from .brewing_cache import get_brewing_cache
+from .lookup_index import invalidate_lookup_index
 from .models import (
     Brewing,
     BrewingSession,
@@ -10,20 +12,29 @@ from .models import (
     CategoryName,
     CustomUser,
     Origin,
+    ParserJob,
     Subcategory,
     SubcategoryName,
     Tea,
     Vendor,
     VendorTrademark,
 )
+from .reference_cache import invalidate_reference_data
 from .serializers import custom_get_or_create
+from .sync import touch_nested
 
 
 def make_public(modeladmin, request, queryset):
     """
-    Defines list action to publish instances.
+    Defines list action to publish instances. Bulk updates don't send
+    save signals, so the lookup index and reference lists are invalidated
+    and teas nesting the instances marked as modified here.
     """
+    pks = list(queryset.values_list("pk", flat=True))
     queryset.update(is_public=True)
+    invalidate_lookup_index()
+    invalidate_reference_data()
+    touch_nested(queryset.model, pks)
 
 
 make_public.short_description = "Mark selected as public"
@@ -77,12 +88,10 @@ class BrewingForm(ModelForm):
         pass
 
     def save_m2m(self):
-        instance, _ = Brewing.objects.get_or_create(**self.cleaned_data)
-        return instance
+        return get_brewing_cache().get_or_create(self.cleaned_data)
 
     def save(self, commit=True):
-        instance, _ = Brewing.objects.get_or_create(**self.cleaned_data)
-        return instance
+        return get_brewing_cache().get_or_create(self.cleaned_data)
 
 
 @admin.register(Brewing)
@@ -382,3 +391,21 @@ class BrewingSessionAdmin(admin.ModelAdmin):
             return None
         link = reverse("admin:catalog_tea_change", args=[obj.tea.id])
         return format_html(f'<a href="{link}">{obj.tea.name}</a>')
+
+
+@admin.register(ParserJob)
+class ParserJobAdmin(admin.ModelAdmin):
+    """
+    Registers ParserJob model.
+    """
+
+    list_display = (
+        "id",
+        "created_on",
+        "status",
+        "finished_on",
+        "user",
+    )
+    list_filter = ("status",)
+    exclude = ("image",)
+    ordering = ("-created_on",)
@@ -0,0 +1,60 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import router
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+# User fields set from access token claims added by LoginSerializer.get_token
+CLAIM_FIELDS = ("email", "is_active")
+
+
+def get_token_user(validated_token):
+    """
+    Returns a user instance built from token claims, without query. Other
+    fields are deferred, so that the user row is only loaded once one of them
+    is accessed.
+
+    Args:
+        validated_token: Validated access token with user ID and
+            CLAIM_FIELDS claims.
+
+    Returns:
+        User model instance.
+    """
+    User = get_user_model()
+    claims = {
+        api_settings.USER_ID_FIELD: validated_token[api_settings.USER_ID_CLAIM],
+        **{field: validated_token[field] for field in CLAIM_FIELDS},
+    }
+    fields = [field for field in User._meta.concrete_fields if field.attname in claims]
+    return User.from_db(
+        router.db_for_read(User),
+        [field.attname for field in fields],
+        [field.to_python(claims[field.attname]) for field in fields],
+    )
+
+
+class TokenUserAuthentication(JWTAuthentication):
+    """
+    JWT authentication which, if JWT_TOKEN_USER setting is on, trusts access
+    token claims instead of loading the user on every request. Views only
+    needing the user ID or claims run without a user query, the user row is
+    loaded by the first access to another field. A user deactivated or
+    deleted keeps access until the token expires, within
+    ACCESS_TOKEN_LIFETIME. Tokens missing claims fall back to a user query.
+    """
+
+    def get_user(self, validated_token):
+        """ Returns the user of a token, from its claims if enabled. """
+        if not getattr(settings, "JWT_TOKEN_USER", False) or any(
+            field not in validated_token for field in CLAIM_FIELDS
+        ):
+            return super().get_user(validated_token)
+
+        if api_settings.USER_ID_CLAIM not in validated_token:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+        if not validated_token["is_active"]:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+        return get_token_user(validated_token)
@@ -0,0 +1,145 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from django.conf import settings
+
+from .lookup_index import get_lookup_index
+from .ocr_backends import OcrError, get_ocr_backend
+from .vision_parser import VisionParser
+
+logger = logging.getLogger(__name__)
+
+
+class BatchParser:
+    """
+    Runs several images through the vision parser. Text detection of
+    uncached images is fanned out to a bounded thread pool, in batches when
+    the OCR backend supports them, and every image is matched against the
+    same lookup index. Results are yielded as soon as they are available.
+
+    Attributes:
+        images: List of images data as base64 strings.
+        max_name_length: Max length of tea name strings.
+        backend: OCR backend instance.
+        index: LookupIndex instance shared by all images.
+        threads: Maximum number of concurrent text detection calls.
+
+    Usage example:
+        for position, tea_data, error in BatchParser(images).parse():
+            ...
+    """
+
+    def __init__(self, images, max_name_length=None, backend=None):
+        """
+        Declares images, OCR backend and gets the catalog lookup index.
+
+        Args:
+            images: List of images data as base64 strings.
+            max_name_length: Optional; Max length of tea name strings.
+            backend: Optional; OCR backend instance, defaults to the one
+                configured by OCR_BACKEND setting.
+        """
+        self.images = images
+        self.max_name_length = max_name_length
+        self.backend = backend or get_ocr_backend()
+        self.index = get_lookup_index()
+        self.threads = getattr(settings, "PARSER_BATCH_THREADS", 8)
+
+    def parse(self):
+        """
+        Parses all images, cached ones first, then the others as
+        their text detection batches complete.
+
+        Yields:
+            (position, tea data dictionary, error string) tuples,
+            either tea data or error being None.
+        """
+        # Identical images share a single text detection
+        pending = {}
+        for position, data in enumerate(self.images):
+            try:
+                if not data:
+                    raise ValueError
+                parser = VisionParser(data, backend=self.backend, index=self.index)
+            except ValueError:
+                yield position, None, "Invalid image data"
+                continue
+
+            parser.flat_document = parser.get_cached_text()
+            if parser.flat_document is not None:
+                yield self.run(position, parser)
+            else:
+                pending.setdefault(parser.get_image_hash(), []).append(
+                    (position, parser)
+                )
+
+        if not pending:
+            return
+
+        groups = list(pending.values())
+        size = self.backend.batch_size
+        batches = []
+        for start in range(0, len(groups), size):
+            end = start + size
+            batches.append(groups[start:end])
+
+        executor = ThreadPoolExecutor(
+            max_workers=min(self.threads, len(batches)),
+            thread_name_prefix="batch_parser",
+        )
+        futures = {
+            executor.submit(
+                self.backend.batch_document_text_detection,
+                [group[0][1].image for group in batch],
+            ): batch
+            for batch in batches
+        }
+        try:
+            for future in as_completed(futures):
+                batch = futures[future]
+                try:
+                    documents = future.result()
+                except Exception:
+                    logger.exception("Batch text detection failed")
+                    for group in batch:
+                        for position, _ in group:
+                            yield position, None, "Text detection failed"
+                    continue
+
+                for group, document in zip(batch, documents):
+                    # Failed images aren't cached
+                    if isinstance(document, OcrError):
+                        logger.warning("Text detection failed: %s", document)
+                        for position, _ in group:
+                            yield position, None, "Text detection failed"
+                        continue
+                    flat = group[0][1].set_document(document)
+                    for position, parser in group:
+                        parser.flat_document = flat
+                        yield self.run(position, parser)
+        finally:
+            # Pending calls are dropped if the consumer stops early
+            for future in futures:
+                future.cancel()
+            executor.shutdown(wait=False)
+
+    def run(self, position, parser):
+        """
+        Extracts tea data from an image with text detection available.
+
+        Args:
+            position: Integer position of the image in the batch.
+            parser: VisionParser instance.
+
+        Returns:
+            (position, tea data dictionary, error string) tuple.
+        """
+        try:
+            return (
+                position,
+                parser.get_tea_data(max_name_length=self.max_name_length),
+                None,
+            )
+        except Exception:
+            logger.exception("Parsing image %s failed", position)
+            return position, None, "Parsing failed"
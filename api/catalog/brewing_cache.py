@@ -0,0 +1,204 @@
+import threading
+from collections import OrderedDict
+from datetime import timedelta
+from functools import partial
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.db import transaction
+from django.dispatch import receiver
+
+from .models import Brewing
+from .versions import bump_version, get_version
+
+BREWING_FIELDS = ("temperature", "weight", "initial", "increments")
+
+VERSION_KEY = "catalog:brewings"
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_brewing_key(values):
+    """
+    Returns brewing natural key from a dictionary of values, with defaults for
+    missing ones and weight truncated to 1 decimal as saved.
+    """
+    temperature = values.get("temperature") or 0
+    weight = float("%.1f" % (values.get("weight") or 0))
+    initial = values.get("initial") or timedelta(seconds=0)
+    increments = values.get("increments") or timedelta(seconds=0)
+    return (temperature, weight, initial, increments)
+
+
+def get_instance_key(instance):
+    """ Returns natural key of a saved brewing instance. """
+    return tuple(getattr(instance, field) for field in BREWING_FIELDS)
+
+
+class BrewingCache:
+    """
+    Interning cache of brewings keyed by their unique_brewing fields.
+    Brewings are shared value objects, so once known an instance is reused
+    without query. Least recently used entries are evicted over the limit.
+    Instances are only added once their transaction commits, so that rows
+    rolled back are never handed out. Brewings changed or deleted by any
+    worker bump a shared version, which drops all entries. It's checked with
+    a single query by the first lookup of each request, so that lookups of
+    known brewings don't cost any query afterwards.
+
+    Attributes:
+        max_size: Maximum number of entries.
+        entries: OrderedDict of natural keys to Brewing instances, least
+            recently used first.
+        version: Shared version string entries were fetched at.
+        checked: If True the version was checked since the request started.
+        hits: Integer number of cache hits.
+        misses: Integer number of cache misses.
+
+    Usage example:
+        brewing = get_brewing_cache().get_or_create({"temperature": 95})
+    """
+
+    def __init__(self, max_size=1024):
+        """
+        Declares cache limit, storage and counters.
+
+        Args:
+            max_size: Optional; Maximum number of entries.
+        """
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.version = None
+        self.checked = False
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def expire(self):
+        """ Marks the shared version to be checked by the next lookup. """
+        self.checked = False
+
+    def get_many(self, keys):
+        """
+        Returns cached brewings of natural keys, checking the shared version
+        first if not done since the request started.
+
+        Args:
+            keys: Iterable of natural key tuples from get_brewing_key.
+
+        Returns:
+            Dictionary of Brewing instances by key, without missing keys.
+        """
+        version = None if self.checked else get_version(VERSION_KEY)
+        found = {}
+        with self.lock:
+            if version is not None:
+                if version != self.version:
+                    self.entries.clear()
+                    self.version = version
+                self.checked = True
+            for key in keys:
+                instance = self.entries.get(key)
+                if instance is None:
+                    self.misses += 1
+                    continue
+                self.entries.move_to_end(key)
+                self.hits += 1
+                found[key] = instance
+        return found
+
+    def add(self, instances, version=None):
+        """
+        Stores saved brewings, evicting least recently used ones if needed.
+        Brewings fetched at another version than the current one are skipped.
+        """
+        with self.lock:
+            if version is not None and version != self.version:
+                return
+            for instance in instances:
+                key = get_instance_key(instance)
+                self.entries[key] = instance
+                self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def add_on_commit(self, instances):
+        """ Stores brewings once the current transaction commits. """
+        transaction.on_commit(partial(self.add, list(instances), self.version))
+
+    def discard(self, pk):
+        """
+        Drops entries of a brewing changed or deleted, and bumps the shared
+        version so that other workers drop theirs.
+        """
+        with self.lock:
+            for key, instance in list(self.entries.items()):
+                if instance.pk == pk:
+                    del self.entries[key]
+        bump_version(VERSION_KEY)
+
+    def get_or_create(self, values):
+        """
+        Returns brewing matching values from cache, or fetches it, creating
+        it if missing. Concurrent inserts of the same brewing are handled by
+        get_or_create, which fetches the row again on IntegrityError.
+
+        Args:
+            values: Dictionary of brewing field values, missing ones default
+                to zero.
+
+        Returns:
+            Brewing instance.
+        """
+        key = get_brewing_key(values)
+        instance = self.get_many([key]).get(key)
+        if instance is None:
+            instance, _ = Brewing.objects.get_or_create(
+                **dict(zip(BREWING_FIELDS, key))
+            )
+            self.add_on_commit([instance])
+        return instance
+
+    def stats(self):
+        """
+        Returns cache counters.
+
+        Returns:
+            Dictionary of counters, for example:
+            {"hits": 10, "misses": 4, "entries": 4}
+        """
+        with self.lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": len(self.entries),
+            }
+
+
+def get_brewing_cache():
+    """
+    Returns the process wide brewing cache, limited by BREWING_CACHE_MAX_SIZE
+    setting.
+
+    Returns:
+        BrewingCache instance.
+    """
+    global _cache
+
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = BrewingCache(
+                    max_size=getattr(settings, "BREWING_CACHE_MAX_SIZE", 1024)
+                )
+    return _cache
+
+
+@receiver(setting_changed)
+def reset_brewing_cache(setting, **kwargs):
+    """ Drops the brewing cache instance when its settings change. """
+    global _cache
+
+    if setting.startswith("BREWING_CACHE"):
+        _cache = None
@@ -0,0 +1,191 @@
+import os
+import uuid
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps
+
+EXIF_ORIENTATION = 0x0112
+
+
+def open_image(content):
+    """
+    Opens an image and applies its EXIF orientation.
+
+    Args:
+        content: Image data as bytes.
+
+    Returns:
+        Tuple of PIL Image instance and a boolean telling if it was rotated.
+    """
+    image = Image.open(BytesIO(content))
+    if image.getexif().get(EXIF_ORIENTATION, 1) == 1:
+        return image, False
+    return ImageOps.exif_transpose(image), True
+
+
+def encode_image(image, quality=None):
+    """
+    Encodes an image in the IMAGE_FORMAT setting format, JPEG by default.
+
+    Args:
+        image: PIL Image instance.
+        quality: Optional; Integer encoder quality, defaults to IMAGE_QUALITY.
+
+    Returns:
+        Encoded image as bytes.
+    """
+    image_format = getattr(settings, "IMAGE_FORMAT", "JPEG")
+    if image_format == "JPEG" and image.mode != "RGB":
+        image = image.convert("RGB")
+    output = BytesIO()
+    image.save(
+        output,
+        format=image_format,
+        quality=quality or getattr(settings, "IMAGE_QUALITY", 85),
+        optimize=True,
+    )
+    return output.getvalue()
+
+
+def resize_image(image, max_size):
+    """
+    Returns a copy of the image fitting in a max_size square, or the image
+    itself if it's already small enough.
+    """
+    if max(image.size) <= max_size:
+        return image
+    image = image.copy()
+    image.thumbnail((max_size, max_size), Image.LANCZOS)
+    return image
+
+
+def prepare_ocr_image(content, max_size=None):
+    """
+    Downscales and recompresses an image before text detection.
+    Images already small enough and upright are sent as is, and so are the
+    ones that can't be decoded, leaving error handling to the OCR service.
+
+    Args:
+        content: Image data as bytes.
+        max_size: Optional; Integer maximum width and height in pixels,
+            defaults to OCR_IMAGE_MAX_SIZE.
+
+    Returns:
+        Image data as bytes.
+    """
+    max_size = max_size or getattr(settings, "OCR_IMAGE_MAX_SIZE", 1600)
+    try:
+        image, rotated = open_image(content)
+        if not rotated and max(image.size) <= max_size:
+            return content
+        return encode_image(resize_image(image, max_size))
+    except (OSError, ValueError, Image.DecompressionBombError):
+        return content
+
+
+class ProcessedImageFile(ContentFile):
+    """
+    Processed image file, keeping the decoded image to make thumbnails from.
+
+    Attributes:
+        image: PIL Image instance of the file content.
+    """
+
+    def __init__(self, content, name, image):
+        super().__init__(content, name=name)
+        self.image = image
+
+
+def process_image(content):
+    """
+    Normalizes orientation, downscales to IMAGE_MAX_SIZE and recompresses
+    an uploaded image.
+
+    Args:
+        content: Image data as bytes.
+
+    Returns:
+        ProcessedImageFile with a random name and the processed image.
+    """
+    image, _ = open_image(content)
+    image = resize_image(image, getattr(settings, "IMAGE_MAX_SIZE", 2048))
+    extension = getattr(settings, "IMAGE_FORMAT", "JPEG").lower()
+    return ProcessedImageFile(
+        encode_image(image), name=f"{uuid.uuid4()}.{extension}", image=image
+    )
+
+
+def get_thumbnail_name(name, size):
+    """ Returns thumbnail storage name of an image for a given size. """
+    root, extension = os.path.splitext(name)
+    return f"{root}_{size}{extension}"
+
+
+def save_thumbnails(field_file, image, sizes=None):
+    """
+    Saves fixed size thumbnails of a stored image next to it, one for
+    each IMAGE_THUMBNAIL_SIZES entry.
+
+    Args:
+        field_file: ImageFieldFile of the stored image.
+        image: PIL Image instance of the stored image, as processed.
+        sizes: Optional; Sizes to save, defaults to all of them.
+    """
+    if sizes is None:
+        sizes = getattr(settings, "IMAGE_THUMBNAIL_SIZES", ())
+    for size in sizes:
+        name = get_thumbnail_name(field_file.name, size)
+        thumbnail = encode_image(resize_image(image, size))
+        field_file.storage.save(name, ContentFile(thumbnail))
+
+
+def save_missing_thumbnails(field_file):
+    """
+    Saves thumbnails of a stored image missing some, as images uploaded
+    before thumbnails were made or before a size was added.
+
+    Args:
+        field_file: ImageFieldFile of the stored image.
+
+    Returns:
+        Number of thumbnails saved.
+    """
+    sizes = [
+        size
+        for size in getattr(settings, "IMAGE_THUMBNAIL_SIZES", ())
+        if not field_file.storage.exists(get_thumbnail_name(field_file.name, size))
+    ]
+    if sizes:
+        with field_file.storage.open(field_file.name) as f:
+            image, _ = open_image(f.read())
+        save_thumbnails(field_file, image, sizes)
+    return len(sizes)
+
+
+def delete_thumbnails(field_file):
+    """
+    Deletes thumbnails of a stored image, if any.
+
+    Args:
+        field_file: FieldFile of the image, with its storage and name.
+    """
+    for size in getattr(settings, "IMAGE_THUMBNAIL_SIZES", ()):
+        name = get_thumbnail_name(field_file.name, size)
+        if field_file.storage.exists(name):
+            field_file.storage.delete(name)
+
+
+def get_thumbnails_urls(field_file):
+    """
+    Returns thumbnails URLs of a stored image.
+
+    Returns:
+        Dictionary of URLs by size as string, for example:
+        {"128": "/media/1/image_128.jpeg"}
+    """
+    return {
+        str(size): field_file.storage.url(get_thumbnail_name(field_file.name, size))
+        for size in getattr(settings, "IMAGE_THUMBNAIL_SIZES", ())
+    }
@@ -0,0 +1,181 @@
+import threading
+
+from .models import (
+    Category,
+    CategoryName,
+    Subcategory,
+    SubcategoryName,
+    Vendor,
+    VendorTrademark,
+)
+from .ngram_index import NgramIndex
+from .versions import bump_version, get_version
+
+VERSION_KEY = "catalog:lookup_index"
+
+_index = None
+_index_lock = threading.Lock()
+
+
+class LookupIndex:
+    """
+    Snapshot of the catalog names used to match text detected on tea labels.
+    Built once per worker process and reused until its version is bumped.
+
+    Attributes:
+        version: Version string the index was built for.
+        categories: Dictionary of Category instances by ID.
+        subcategories: Dictionary of Subcategory instances by ID, includes
+            public subcategories and the ones referenced by alternative names.
+        vendors: Dictionary of public Vendor instances by ID.
+        category_lookup: List of lowercase categories names, standard first
+            and alternative after.
+        subcategory_lookup: List of lowercase subcategories names, standard,
+            translated and alternative.
+        vendor_lookup: List of lowercase vendors names and websites.
+        category_matcher: NgramIndex over category_lookup.
+        subcategory_matcher: NgramIndex over subcategory_lookup.
+        vendor_matcher: NgramIndex over vendor_lookup.
+        category_ids: Dictionary of category IDs by lowercase name.
+        subcategory_ids: Dictionary of subcategory IDs by lowercase name.
+        vendor_ids: Dictionary of vendor IDs by lowercase name or website.
+        subcategory_alternative_names: Dictionary of alternative names lists
+            by subcategory ID.
+        vendor_trademarks: Dictionary of trademarks lists by vendor ID.
+    """
+
+    def __init__(self, version):
+        """
+        Loads relevant objects lists and builds name maps.
+
+        Args:
+            version: Version string the index is built for.
+        """
+        self.version = version
+
+        categories = list(Category.objects.all())
+        categories_names = list(CategoryName.objects.all())
+        subcategories = list(
+            Subcategory.objects.filter(is_public=True).select_related("category")
+        )
+        subcategories_names = list(
+            SubcategoryName.objects.select_related("subcategory__category")
+        )
+        vendors = list(Vendor.objects.filter(is_public=True))
+        trademarks = list(VendorTrademark.objects.all())
+
+        self.categories = {c.id: c for c in categories}
+        self.subcategories = {s.id: s for s in subcategories}
+        for alt in subcategories_names:
+            self.subcategories.setdefault(alt.subcategory.id, alt.subcategory)
+        self.vendors = {v.id: v for v in vendors}
+
+        # Ordered lists of names to look for, duplicates dropped
+        self.category_lookup = self.unique(
+            [c.name.lower() for c in categories]
+            + [c.name.lower() for c in categories_names]
+        )
+        self.subcategory_lookup = self.unique(
+            [s.name.lower() for s in subcategories]
+            + [s.translated_name.lower() for s in subcategories]
+            + [s.name.lower() for s in subcategories_names]
+        )
+        self.vendor_lookup = self.unique(
+            [v.name.lower() for v in vendors] + [v.website.lower() for v in vendors]
+        )
+
+        self.category_matcher = NgramIndex(self.category_lookup)
+        self.subcategory_matcher = NgramIndex(self.subcategory_lookup)
+        self.vendor_matcher = NgramIndex(self.vendor_lookup)
+
+        # Alternative names take precedence over standard ones
+        self.category_ids = {}
+        for alt in categories_names:
+            self.category_ids.setdefault(alt.name.lower(), alt.category_id)
+        for c in categories:
+            self.category_ids.setdefault(c.name.lower(), c.id)
+
+        self.subcategory_ids = {}
+        for alt in subcategories_names:
+            self.subcategory_ids.setdefault(alt.name.lower(), alt.subcategory_id)
+        for s in subcategories:
+            self.subcategory_ids.setdefault(s.name.lower(), s.id)
+            self.subcategory_ids.setdefault(s.translated_name.lower(), s.id)
+
+        self.vendor_ids = {}
+        for v in vendors:
+            self.vendor_ids.setdefault(v.name.lower(), v.id)
+            self.vendor_ids.setdefault(v.website.lower(), v.id)
+
+        self.subcategory_alternative_names = {}
+        for alt in subcategories_names:
+            self.subcategory_alternative_names.setdefault(
+                alt.subcategory_id, []
+            ).append(alt.name)
+
+        self.vendor_trademarks = {}
+        for t in trademarks:
+            self.vendor_trademarks.setdefault(t.vendor_id, []).append(t.name)
+
+    @staticmethod
+    def unique(names):
+        """
+        Drops duplicates from a list of names preserving order.
+
+        Args:
+            names: List of strings.
+
+        Returns:
+            List of unique strings.
+        """
+        return list(dict.fromkeys(names))
+
+    def get_category(self, name):
+        """
+        Returns category instance from lowercase name or alternative name, if any.
+        """
+        return self.categories.get(self.category_ids.get(name))
+
+    def get_subcategory(self, name):
+        """
+        Returns subcategory instance from lowercase standard, translated
+        or alternative name, if any.
+        """
+        return self.subcategories.get(self.subcategory_ids.get(name))
+
+    def get_vendor(self, name):
+        """
+        Returns vendor instance from lowercase name or website, if any.
+        """
+        return self.vendors.get(self.vendor_ids.get(name))
+
+
+def get_lookup_index():
+    """
+    Returns the process wide lookup index, rebuilding it only if its shared
+    version changed, which costs a single query.
+
+    Returns:
+        LookupIndex instance.
+    """
+    global _index
+
+    version = get_version(VERSION_KEY)
+    index = _index
+    if index is None or index.version != version:
+        with _index_lock:
+            if _index is None or _index.version != version:
+                _index = LookupIndex(version)
+            index = _index
+    return index
+
+
+def invalidate_lookup_index():
+    """
+    Drops the local lookup index and bumps the shared version so every
+    worker rebuilds it on next use.
+    """
+    global _index
+
+    _index = None
+    bump_version(VERSION_KEY)
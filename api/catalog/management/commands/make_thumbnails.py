@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from catalog.images import save_missing_thumbnails
+from catalog.models import Tea
+
+
+class Command(BaseCommand):
+    """
+    Saves missing thumbnails of tea images, uploaded before thumbnails were
+    made or before a size was added to IMAGE_THUMBNAIL_SIZES, meant to be run
+    after deploying such changes.
+
+    Usage example:
+        python manage.py make_thumbnails
+    """
+
+    help = "Saves missing thumbnails of tea images."
+
+    def handle(self, *args, **options):
+        saved = 0
+        teas = Tea.objects.exclude(Q(image="") | Q(image__isnull=True)).only("image")
+        for tea in teas.iterator():
+            try:
+                saved += save_missing_thumbnails(tea.image)
+            except (OSError, ValueError) as e:
+                self.stderr.write(f"Could not make thumbnails of {tea.image.name}: {e}")
+        self.stdout.write(f"Saved {saved} thumbnails")
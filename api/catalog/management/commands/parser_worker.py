@@ -0,0 +1,56 @@
+import threading
+
+from django.core.management.base import BaseCommand, CommandError
+
+from catalog.parser_queue import DatabaseParserQueue, get_parser_queue
+
+
+class Command(BaseCommand):
+    """
+    Runs a pool of vision parser workers processing queued ParserJob rows.
+
+    Usage example:
+        python manage.py parser_worker --threads 4
+    """
+
+    help = "Runs vision parser workers processing queued jobs."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--threads", type=int, default=4, help="Number of worker threads."
+        )
+        parser.add_argument(
+            "--poll-interval",
+            type=float,
+            default=1,
+            help="Seconds to wait when no job is pending.",
+        )
+
+    def handle(self, *args, **options):
+        queue = get_parser_queue()
+        if not isinstance(queue, DatabaseParserQueue):
+            raise CommandError("PARSER_QUEUE_BACKEND is not a database queue.")
+
+        stop_event = threading.Event()
+        threads = [
+            threading.Thread(
+                target=queue.work,
+                kwargs={
+                    "poll_interval": options["poll_interval"],
+                    "stop_event": stop_event,
+                },
+                name=f"parser-{i}",
+            )
+            for i in range(options["threads"])
+        ]
+        for thread in threads:
+            thread.start()
+        self.stdout.write(f"Started {len(threads)} parser workers.")
+
+        try:
+            for thread in threads:
+                thread.join()
+        except KeyboardInterrupt:
+            stop_event.set()
+            for thread in threads:
+                thread.join()
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from catalog.parser_queue import get_parser_queue, prune_parser_jobs
+
+
+class Command(BaseCommand):
+    """
+    Requeues stale vision parser jobs and deletes the ones finished more than
+    PARSER_JOB_RETENTION days ago, meant to be run daily.
+
+    Usage example:
+        python manage.py prune_parser_jobs
+    """
+
+    help = "Requeues stale parser jobs and deletes finished ones."
+
+    def handle(self, *args, **options):
+        requeued = get_parser_queue().recover()
+        deleted = prune_parser_jobs()
+        self.stdout.write(f"Requeued {requeued} and deleted {deleted} parser jobs")
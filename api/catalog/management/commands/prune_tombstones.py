@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from catalog.sync import prune_tombstones
+
+
+class Command(BaseCommand):
+    """
+    Deletes sync tombstones older than SYNC_TOMBSTONE_RETENTION days,
+    meant to be run daily.
+
+    Usage example:
+        python manage.py prune_tombstones
+    """
+
+    help = "Deletes expired sync tombstones."
+
+    def handle(self, *args, **options):
+        deleted = prune_tombstones()
+        self.stdout.write(f"Deleted {deleted} tombstones")
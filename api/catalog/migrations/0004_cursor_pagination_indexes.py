@@ -0,0 +1,21 @@
+# Generated by Django 3.0.7 on 2026-10-18 10:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0003_parserjob'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='brewingsession',
+            index=models.Index(fields=['user', '-created_on', '-id'], name='session_user_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tea',
+            index=models.Index(fields=['user', '-created_on', '-id'], name='tea_user_created_idx'),
+        ),
+    ]
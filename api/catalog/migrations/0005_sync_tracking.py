@@ -0,0 +1,51 @@
+# Generated by Django 3.0.7 on 2026-10-18 10:48
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0004_cursor_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Tombstone',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model', models.CharField(choices=[('tea', 'tea'), ('brewing_session', 'brewing_session')], max_length=20)),
+                ('object_id', models.UUIDField()),
+                ('deleted_on', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='brewingsession',
+            name='modified_on',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='tea',
+            name='modified_on',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddIndex(
+            model_name='brewingsession',
+            index=models.Index(fields=['user', 'modified_on'], name='session_user_modified_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tea',
+            index=models.Index(fields=['user', 'modified_on'], name='tea_user_modified_idx'),
+        ),
+        migrations.AddField(
+            model_name='tombstone',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='tombstone',
+            index=models.Index(fields=['user', 'deleted_on'], name='tombstone_user_deleted_idx'),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 3.0.7 on 2026-10-18 11:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0005_sync_tracking'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='origin',
+            index=models.Index(condition=models.Q(is_public=True), fields=['country', 'region', 'locality'], name='origin_public_idx'),
+        ),
+        # Expression indexes for case-insensitive name lookups, public ones and
+        # user owned ones, not supported by Index before Django 3.2
+        migrations.RunSQL(
+            'CREATE INDEX "subcategory_public_name_idx" ON "catalog_subcategory" (UPPER("name")) WHERE "is_public"',
+            'DROP INDEX "subcategory_public_name_idx"',
+        ),
+        migrations.RunSQL(
+            'CREATE INDEX "subcategory_user_name_idx" ON "catalog_subcategory" ("user_id", UPPER("name"))',
+            'DROP INDEX "subcategory_user_name_idx"',
+        ),
+        migrations.RunSQL(
+            'CREATE INDEX "vendor_public_name_idx" ON "catalog_vendor" (UPPER("name")) WHERE "is_public"',
+            'DROP INDEX "vendor_public_name_idx"',
+        ),
+        migrations.RunSQL(
+            'CREATE INDEX "vendor_user_name_idx" ON "catalog_vendor" ("user_id", UPPER("name"))',
+            'DROP INDEX "vendor_user_name_idx"',
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 3.0.7 on 2026-10-18 11:31
+
+from django.db import migrations, models
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0006_user_access_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CacheVersion',
+            fields=[
+                ('key', models.CharField(max_length=100, primary_key=True, serialize=False)),
+                ('version', models.UUIDField(default=uuid.uuid4)),
+            ],
+        ),
+    ]
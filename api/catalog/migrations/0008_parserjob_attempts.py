@@ -0,0 +1,18 @@
+# Generated by Django 3.0.7 on 2026-10-18 11:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0007_cache_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='parserjob',
+            name='attempts',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+    ]
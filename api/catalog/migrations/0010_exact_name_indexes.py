@@ -0,0 +1,46 @@
+# Generated by Django 3.0.7 on 2026-10-18 11:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0009_tombstone_user_no_constraint'),
+    ]
+
+    operations = [
+        # Names are matched exactly again, replace UPPER(name) expression indexes
+        migrations.RunSQL(
+            'DROP INDEX "subcategory_public_name_idx"',
+            'CREATE INDEX "subcategory_public_name_idx" ON "catalog_subcategory" (UPPER("name")) WHERE "is_public"',
+        ),
+        migrations.RunSQL(
+            'DROP INDEX "subcategory_user_name_idx"',
+            'CREATE INDEX "subcategory_user_name_idx" ON "catalog_subcategory" ("user_id", UPPER("name"))',
+        ),
+        migrations.RunSQL(
+            'DROP INDEX "vendor_public_name_idx"',
+            'CREATE INDEX "vendor_public_name_idx" ON "catalog_vendor" (UPPER("name")) WHERE "is_public"',
+        ),
+        migrations.RunSQL(
+            'DROP INDEX "vendor_user_name_idx"',
+            'CREATE INDEX "vendor_user_name_idx" ON "catalog_vendor" ("user_id", UPPER("name"))',
+        ),
+        migrations.AddIndex(
+            model_name='subcategory',
+            index=models.Index(condition=models.Q(is_public=True), fields=['name'], name='subcategory_public_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='subcategory',
+            index=models.Index(fields=['user', 'name'], name='subcategory_user_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='vendor',
+            index=models.Index(condition=models.Q(is_public=True), fields=['name'], name='vendor_public_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='vendor',
+            index=models.Index(fields=['user', 'name'], name='vendor_user_name_idx'),
+        ),
+    ]
@@ -77,6 +77,16 @@ class CustomUser(AbstractBaseUser, PermissionsMixin):
     def __str__(self):
         return self.email
 
+    def refresh_from_db(self, using=None, fields=None):
+        """
+        Loads all deferred fields at once when one of them is accessed, as for
+        users built from token claims, instead of one query per field.
+        """
+        deferred_fields = self.get_deferred_fields()
+        if fields is not None and deferred_fields.intersection(fields):
+            fields = list(deferred_fields)
+        super().refresh_from_db(using=using, fields=fields)
+
 
 class Brewing(models.Model):
     """
@@ -127,6 +137,36 @@ class Brewing(models.Model):
         )
 
 
+class OwnedOrPublicQuerySet(models.QuerySet):
+    """
+    Queryset of user owned instances that can be made public.
+    """
+
+    def owned_or_public(self, user):
+        """
+        Returns instances owned by the user or public. Both cases are looked up
+        separately, each with its own index, then their IDs combined with
+        a deduplicating UNION, where an OR filter often ends up scanning the
+        whole table. Unordered querysets are ordered by ID.
+
+        Args:
+            user: CustomUser instance or ID.
+
+        Returns:
+            QuerySet filtered by IDs, which can be further filtered or joined.
+        """
+        ids = (
+            self.filter(is_public=True)
+            .order_by()
+            .values("id")
+            .union(self.filter(user=user).order_by().values("id"))
+        )
+        queryset = self.filter(id__in=ids)
+        if not queryset.ordered:
+            queryset = queryset.order_by("id")
+        return queryset
+
+
 class Origin(models.Model):
     """
     Model defining a geographic indication.
@@ -143,6 +183,8 @@ class Origin(models.Model):
     latitude = models.FloatField(blank=True, null=True)
     longitude = models.FloatField(blank=True, null=True)
 
+    objects = OwnedOrPublicQuerySet.as_manager()
+
     class Meta:
         ordering = ["country", "region", "locality"]
         constraints = [
@@ -160,6 +202,13 @@ class Origin(models.Model):
                 name="unique_locality_origin",
             ),
         ]
+        indexes = [
+            models.Index(
+                fields=["country", "region", "locality"],
+                condition=models.Q(is_public=True),
+                name="origin_public_idx",
+            )
+        ]
 
     def __str__(self):
         """
@@ -240,6 +289,18 @@ class Subcategory(models.Model):
         Brewing, related_name="+", on_delete=models.SET_NULL, null=True, blank=True
     )
 
+    objects = OwnedOrPublicQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["name"],
+                condition=models.Q(is_public=True),
+                name="subcategory_public_name_idx",
+            ),
+            models.Index(fields=["user", "name"], name="subcategory_user_name_idx"),
+        ]
+
     def __str__(self):
         """
         Returns subcategory name in "name (translated_name)" format
@@ -277,6 +338,18 @@ class Vendor(models.Model):
         default=5, validators=[MaxValueValidator(10)], null=True, blank=True
     )
 
+    objects = OwnedOrPublicQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["name"],
+                condition=models.Q(is_public=True),
+                name="vendor_public_name_idx",
+            ),
+            models.Index(fields=["user", "name"], name="vendor_user_name_idx"),
+        ]
+
     def __str__(self):
         return self.name
 
@@ -333,6 +406,7 @@ class Tea(models.Model):
     )
 
     created_on = models.DateTimeField(auto_now_add=True)
+    modified_on = models.DateTimeField(auto_now=True)
     last_consumed_on = models.DateTimeField(null=True, blank=True)
 
     price = models.FloatField(
@@ -354,6 +428,14 @@ class Tea(models.Model):
     )
     notes = models.TextField(max_length=10000, null=True, blank=True)
 
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["user", "-created_on", "-id"], name="tea_user_created_idx"
+            ),
+            models.Index(fields=["user", "modified_on"], name="tea_user_modified_idx"),
+        ]
+
     def __str__(self):
         return self.name
 
@@ -374,8 +456,102 @@ class BrewingSession(models.Model):
         default=1, validators=[MinValueValidator(1)]
     )
     created_on = models.DateTimeField(auto_now_add=True)
+    modified_on = models.DateTimeField(auto_now=True)
     last_brewed_on = models.DateTimeField(null=True, blank=True)
     is_completed = models.BooleanField(default=False)
 
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["user", "-created_on", "-id"], name="session_user_created_idx"
+            ),
+            models.Index(
+                fields=["user", "modified_on"], name="session_user_modified_idx"
+            ),
+        ]
+
     def __str__(self):
         return str(self.id)
+
+
+class Tombstone(models.Model):
+    """
+    Model recording a deleted tea or brewing session, so that synced clients
+    can drop it. Old entries are removed by prune_tombstones command.
+    """
+
+    TEA = "tea"
+    BREWING_SESSION = "brewing_session"
+    MODELS = (
+        (TEA, TEA),
+        (BREWING_SESSION, BREWING_SESSION),
+    )
+
+    # Tombstones of a deleted user's teas are created while the user is
+    # deleted, so they aren't constrained and expire with retention instead
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, db_constraint=False)
+    model = models.CharField(max_length=20, choices=MODELS)
+    object_id = models.UUIDField()
+    deleted_on = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["user", "deleted_on"], name="tombstone_user_deleted_idx"
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.model} {self.object_id}"
+
+
+class ParserJob(models.Model):
+    """
+    Model defining a queued vision parser job.
+    Image data is dropped once the job is processed, result is stored as JSON.
+    Finished jobs are removed by prune_parser_jobs command.
+    """
+
+    PENDING = "PENDING"
+    RUNNING = "RUNNING"
+    DONE = "DONE"
+    FAILED = "FAILED"
+    STATUSES = (
+        (PENDING, PENDING),
+        (RUNNING, RUNNING),
+        (DONE, DONE),
+        (FAILED, FAILED),
+    )
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE)
+    status = models.CharField(max_length=10, choices=STATUSES, default=PENDING)
+    image = models.TextField(blank=True)
+    max_name_length = models.PositiveSmallIntegerField(null=True, blank=True)
+    result = models.TextField(blank=True)
+    error = models.CharField(max_length=255, blank=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    created_on = models.DateTimeField(auto_now_add=True)
+    started_on = models.DateTimeField(null=True, blank=True)
+    finished_on = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "created_on"], name="parserjob_status_idx")
+        ]
+
+    def __str__(self):
+        return str(self.id)
+
+
+class CacheVersion(models.Model):
+    """
+    Model defining the version of data cached by each process, shared by all
+    workers. A new version is set whenever the cached data changes.
+    """
+
+    key = models.CharField(max_length=100, primary_key=True)
+    version = models.UUIDField(default=uuid.uuid4)
+
+    def __str__(self):
+        return self.key
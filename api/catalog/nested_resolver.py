@@ -0,0 +1,245 @@
+from collections import defaultdict
+from functools import reduce
+from operator import or_
+
+from django.db import connection
+from django.db.models import Q
+
+from .brewing_cache import (
+    BREWING_FIELDS,
+    get_brewing_cache,
+    get_brewing_key,
+    get_instance_key,
+)
+from .models import Brewing, Origin, Subcategory, Vendor
+from .reference_cache import invalidate_reference_data
+
+# Models of user or public instances matched by name
+NAMED_MODELS = {"subcategory": Subcategory, "vendor": Vendor}
+
+
+def get_brewings_query(keys):
+    """ Returns a Q object matching brewings of any of the natural keys. """
+    return reduce(or_, (Q(**dict(zip(BREWING_FIELDS, key))) for key in keys))
+
+
+def get_origin_key(values):
+    """ Returns origin natural key from a dictionary of values. """
+    return (
+        values["country"],
+        values.get("region") or "",
+        values.get("locality") or "",
+    )
+
+
+def get_known_coordinates(keys, user):
+    """
+    Returns coordinates of places from public or user owned origins having
+    them, private origins of other users are left to them.
+
+    Args:
+        keys: Iterable of origin natural key tuples.
+        user: CustomUser instance or ID.
+
+    Returns:
+        Dictionary of (latitude, longitude) tuples by key, without unknown
+        places.
+    """
+    keys = set(keys)
+    if not keys:
+        return {}
+    query = reduce(
+        or_,
+        (
+            Q(country=country, region=region, locality=locality)
+            for country, region, locality in keys
+        ),
+    )
+    rows = (
+        Origin.objects.filter(query, latitude__isnull=False, longitude__isnull=False)
+        .owned_or_public(user)
+        .values_list("country", "region", "locality", "latitude", "longitude")
+    )
+    return {tuple(row[:3]): tuple(row[3:]) for row in rows}
+
+
+def set_known_coordinates(origins, user):
+    """
+    Sets coordinates of new origins of a user missing them if their place is
+    known to the user.
+    """
+    missing = [
+        origin
+        for origin in origins
+        if origin.latitude is None or origin.longitude is None
+    ]
+    coordinates = get_known_coordinates(
+        (get_origin_key(vars(origin)) for origin in missing), user
+    )
+    for origin in missing:
+        key = get_origin_key(vars(origin))
+        if key in coordinates:
+            origin.latitude, origin.longitude = coordinates[key]
+
+
+def create_instances(model, instances):
+    """
+    Inserts new instances in one query if the database returns their primary
+    keys, else one by one. Bulk inserts don't send post_save, so the private
+    reference lists of new subcategories and vendors owners are invalidated
+    here as reference_data_changed does. New instances aren't nested in teas
+    or sessions yet, there's no sync state to touch.
+    """
+    if not connection.features.can_return_rows_from_bulk_insert:
+        for instance in instances:
+            instance.save()
+        return instances
+
+    instances = model.objects.bulk_create(instances)
+    if model in NAMED_MODELS.values():
+        for user_id in {
+            None if instance.is_public else instance.user_id for instance in instances
+        }:
+            invalidate_reference_data(user_id)
+    return instances
+
+
+class NestedResolver:
+    """
+    Resolves nested brewings, origins, subcategories and vendors of tea and
+    brewing session writes. Natural keys are collected first, then existing
+    instances are fetched with one query per type and missing ones created
+    together. Resolved instances are cached, so that serializers sharing a
+    resolver, as in bulk uploads, look up each nested instance once.
+    """
+
+    def __init__(self, user):
+        self.user = user
+        self.cache = defaultdict(dict)
+
+    def get_key(self, kind, values):
+        """ Returns natural key of nested values for a given type. """
+        if kind == "brewing":
+            return get_brewing_key(values)
+        if kind == "origin":
+            return get_origin_key(values)
+        return values["name"]
+
+    def prefetch(self, entries):
+        """
+        Resolves all nested entries not cached yet.
+
+        Args:
+            entries: Iterable of (kind, values) tuples, where kind is one of
+                brewing, origin, subcategory and vendor, and values nested
+                validated data.
+        """
+        missing = defaultdict(dict)
+        for kind, values in entries:
+            key = self.get_key(kind, values)
+            if key not in self.cache[kind]:
+                missing[kind].setdefault(key, values)
+
+        for kind, values_by_key in missing.items():
+            if kind == "brewing":
+                self.cache[kind].update(self.resolve_brewings(values_by_key))
+            elif kind == "origin":
+                self.cache[kind].update(self.resolve_origins(values_by_key))
+            else:
+                self.cache[kind].update(
+                    self.resolve_named(NAMED_MODELS[kind], values_by_key)
+                )
+
+    def resolve(self, kind, values):
+        """
+        Returns nested instance of given values, from cache or database.
+        Cached origins missing coordinates are updated with given ones.
+        """
+        self.prefetch([(kind, values)])
+        instance = self.cache[kind][self.get_key(kind, values)]
+        if kind == "origin":
+            changed = False
+            for field in ("latitude", "longitude"):
+                if values.get(field) is not None and not getattr(instance, field):
+                    setattr(instance, field, values[field])
+                    changed = True
+            if changed:
+                instance.save()
+        return instance
+
+    def clear(self):
+        """ Drops cached instances, for example after a rollback. """
+        self.cache.clear()
+
+    def resolve_brewings(self, values_by_key):
+        """
+        Returns brewings by key from the process wide brewing cache, the others
+        are fetched and missing ones inserted ignoring conflicts with
+        concurrent writes, then fetched as well.
+        """
+        cache = get_brewing_cache()
+        found = cache.get_many(values_by_key)
+        missing = [key for key in values_by_key if key not in found]
+        if not missing:
+            return found
+
+        fetched = list(Brewing.objects.filter(get_brewings_query(missing)))
+        found.update((get_instance_key(instance), instance) for instance in fetched)
+        missing = [key for key in missing if key not in found]
+        if missing:
+            Brewing.objects.bulk_create(
+                [Brewing(**dict(zip(BREWING_FIELDS, key))) for key in missing],
+                ignore_conflicts=True,
+            )
+            created = list(Brewing.objects.filter(get_brewings_query(missing)))
+            found.update((get_instance_key(instance), instance) for instance in created)
+            fetched += created
+        cache.add_on_commit(fetched)
+        return found
+
+    def resolve_origins(self, values_by_key):
+        """
+        Returns origins by key, public ones first, then user owned ones.
+        Missing ones are created, with coordinates of known places.
+        """
+        query = reduce(
+            or_,
+            (
+                Q(country=country, region=region, locality=locality)
+                for country, region, locality in values_by_key
+            ),
+        )
+        found = {}
+        for instance in Origin.objects.filter(query).owned_or_public(self.user):
+            key = get_origin_key(vars(instance))
+            if instance.is_public or key not in found:
+                found[key] = instance
+
+        created = []
+        for key, values in values_by_key.items():
+            if key not in found:
+                found[key] = Origin(**{**values, "user": self.user})
+                created.append(found[key])
+        set_known_coordinates(created, self.user)
+        create_instances(Origin, created)
+        return found
+
+    def resolve_named(self, model, values_by_key):
+        """
+        Returns subcategories or vendors by name, public ones first, then user
+        owned ones. Missing ones are created.
+        """
+        found = {}
+        for instance in model.objects.filter(name__in=values_by_key).owned_or_public(
+            self.user
+        ):
+            if instance.is_public or instance.name not in found:
+                found[instance.name] = instance
+
+        created = []
+        for key, values in values_by_key.items():
+            if key not in found:
+                found[key] = model(**{**values, "user": self.user})
+                created.append(found[key])
+        create_instances(model, created)
+        return found
@@ -0,0 +1,144 @@
+import difflib
+import heapq
+import math
+from collections import Counter
+
+
+class NgramIndex:
+    """
+    Character n-gram inverted index over a list of names, used to narrow down
+    fuzzy match candidates before running difflib similarity scoring.
+
+    Candidates are filtered with a q-gram count bound: if difflib ratio between
+    two strings is at least the cutoff, their LCS distance is at most
+    (1 - cutoff) * (len(a) + len(b)) and every insertion or deletion breaks at
+    most n padded n-grams. Filtering is therefore lossless and results are the
+    same as difflib.get_close_matches over the full list. With the default 0.8
+    cutoff the bound only holds for bigrams, trigrams would discard nothing.
+
+    Attributes:
+        names: List of unique indexed names.
+        n: Integer n-gram length.
+        postings: Dictionary of (n-gram, occurrence) keys to dictionaries
+            of name lengths to lists of name positions.
+        compact_names: List of (name, name without spaces) tuples.
+
+    Usage example:
+        index = NgramIndex(["da hong pao", "long jing"])
+        matches = index.get_close_matches("da hong bao")
+    """
+
+    def __init__(self, names, n=2):
+        """
+        Builds the inverted index.
+
+        Args:
+            names: List of lowercase names as strings.
+            n: Optional; Integer n-gram length.
+        """
+        self.names = list(dict.fromkeys(names))
+        self.n = n
+        self.postings = {}
+        for position, name in enumerate(self.names):
+            for key in self.get_ngrams(name):
+                self.postings.setdefault(key, {}).setdefault(len(name), []).append(
+                    position
+                )
+        self.compact_names = [(name, name.replace(" ", "")) for name in self.names]
+
+    def __len__(self):
+        return len(self.names)
+
+    def __iter__(self):
+        return iter(self.names)
+
+    def get_ngrams(self, word):
+        """
+        Splits a word in padded n-grams. Repeated n-grams are numbered so that
+        shared n-grams between two words can be counted as a set intersection.
+
+        Args:
+            word: String to split.
+
+        Returns:
+            List of (n-gram characters tuple, occurrence) tuples.
+        """
+        padding = "\0" * (self.n - 1)
+        padded = padding + word + padding
+        seen = Counter()
+        keys = []
+        for gram in zip(*(padded[offset:] for offset in range(self.n))):
+            keys.append((gram, seen[gram]))
+            seen[gram] += 1
+        return keys
+
+    def get_candidates(self, word, cutoff=0.8):
+        """
+        Returns names that could have a similarity ratio with word
+        equal or above cutoff.
+
+        Args:
+            word: String to look up.
+            cutoff: Optional; Float minimum similarity ratio.
+
+        Returns:
+            List of names as strings.
+        """
+        length = len(word)
+        if not length:
+            # Only an empty name can match an empty word
+            return [name for name in self.names if not name]
+
+        # Lengths allowed by difflib real_quick_ratio
+        min_length = math.ceil(length * cutoff / (2 - cutoff) - 1e-9)
+        max_length = math.floor(length * (2 - cutoff) / cutoff + 1e-9)
+
+        # Count shared n-grams by name length
+        shared = {}
+        for key in self.get_ngrams(word):
+            by_length = self.postings.get(key)
+            if not by_length:
+                continue
+            for name_length, positions in by_length.items():
+                if min_length <= name_length <= max_length:
+                    if name_length not in shared:
+                        shared[name_length] = Counter()
+                    shared[name_length].update(positions)
+
+        candidates = []
+        for name_length, counter in shared.items():
+            max_distance = math.floor((1 - cutoff) * (length + name_length) + 1e-9)
+            min_shared = max(length, name_length) + self.n - 1 - self.n * max_distance
+            candidates += [
+                self.names[position]
+                for position, count in counter.items()
+                if count >= min_shared
+            ]
+        return candidates
+
+    def get_close_matches(self, word, n=3, cutoff=0.8):
+        """
+        Same as difflib.get_close_matches over the indexed names, scoring
+        only filtered candidates.
+
+        Args:
+            word: String to look up.
+            n: Optional; Maximum number of matches to return.
+            cutoff: Optional; Float minimum similarity ratio.
+
+        Returns:
+            List of best matches as strings, best first.
+        """
+        result = []
+        s = difflib.SequenceMatcher()
+        s.set_seq2(word)
+        for x in self.get_candidates(word, cutoff):
+            s.set_seq1(x)
+            if (
+                s.real_quick_ratio() >= cutoff
+                and s.quick_ratio() >= cutoff
+                and s.ratio() >= cutoff
+            ):
+                result.append((s.ratio(), x))
+        result = heapq.nlargest(n, result)
+        return [x for score, x in result]
@@ -0,0 +1,372 @@
+import hashlib
+import itertools
+import logging
+import os
+import threading
+from functools import partial
+
+import grpc
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+from google.api_core import exceptions
+from google.cloud import vision
+from google.protobuf import json_format
+
+from .images import prepare_ocr_image
+
+logger = logging.getLogger(__name__)
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+class OcrError(Exception):
+    """ Text detection error returned for an image, nothing to cache. """
+
+
+class BaseOcrBackend:
+    """
+    OCR backend interface used by the vision parser.
+
+    Attributes:
+        batch_size: Maximum number of images detected in one batch call.
+    """
+
+    batch_size = 1
+
+    def document_text_detection(self, content):
+        """
+        Detects text in an image.
+
+        Args:
+            content: Image data as bytes.
+
+        Returns:
+            Vision full_text_annotation document.
+
+        Raises:
+            OcrError: Text detection failed for the image.
+        """
+        raise NotImplementedError
+
+    def stats(self):
+        """ Returns backend counters, if any. """
+        return {}
+
+    def batch_document_text_detection(self, contents):
+        """
+        Detects text in several images, one call per image unless
+        the backend supports batches.
+
+        Args:
+            contents: List of images data as bytes, up to batch_size.
+
+        Returns:
+            List of Vision full_text_annotation documents, or OcrError
+            instances for failed images, in the same order.
+        """
+        documents = []
+        for content in contents:
+            try:
+                documents.append(self.document_text_detection(content))
+            except OcrError as e:
+                documents.append(e)
+        return documents
+
+
+class VisionOcrBackend(BaseOcrBackend):
+    """
+    Google Vision API backend, batches go through batch_annotate_images.
+    Images are downscaled to OCR_IMAGE_MAX_SIZE before being sent.
+    The client is created on first use and shared by all threads of the
+    process. Its channel connectivity is followed through gRPC state
+    notifications, so that checking it before each call costs nothing.
+    It's recreated in forked processes, when its channel is shut down or
+    failing to connect, and after calls failed on a broken channel.
+
+    Attributes:
+        client: ImageAnnotatorClient instance or None.
+        pid: Integer ID of the process the client was created in.
+        channel_state: Last grpc.ChannelConnectivity of the client channel,
+            None until notified.
+        clients_created: Integer number of clients created.
+        channel_failures: Integer number of unhealthy channels and calls
+            failed on a broken channel.
+    """
+
+    # Synchronous batch annotation accepts up to 16 images per request
+    batch_size = 16
+
+    # Errors raised by gRPC when the channel is broken or the service unreachable,
+    # deadlines aren't retried since the request may still be processed
+    channel_errors = (exceptions.ServiceUnavailable,)
+
+    # Channel states the client is recreated in rather than reused
+    unhealthy_states = (
+        grpc.ChannelConnectivity.TRANSIENT_FAILURE,
+        grpc.ChannelConnectivity.SHUTDOWN,
+    )
+
+    def __init__(self):
+        self.client = None
+        self.pid = None
+        self.channel_state = None
+        self.clients_created = 0
+        self.channel_failures = 0
+        self.lock = threading.Lock()
+
+    def create_client(self):
+        """ Returns a new Vision API client. """
+        return vision.ImageAnnotatorClient()
+
+    def is_current(self):
+        """
+        Returns True if the client exists, was created by this process
+        and its channel is healthy.
+        """
+        return (
+            self.client is not None
+            and self.pid == os.getpid()
+            and self.channel_state not in self.unhealthy_states
+        )
+
+    def get_client(self):
+        """
+        Returns the shared client, creating it on first use, if the current
+        one was inherited from a parent process or if its channel is unhealthy.
+
+        Returns:
+            ImageAnnotatorClient instance.
+        """
+        if not self.is_current():
+            with self.lock:
+                if not self.is_current():
+                    if self.channel_state in self.unhealthy_states:
+                        logger.warning(
+                            "Vision API channel is %s, recreating client",
+                            self.channel_state.name,
+                        )
+                        self.channel_failures += 1
+                    self.client = self.create_client()
+                    self.pid = os.getpid()
+                    self.channel_state = None
+                    self.clients_created += 1
+                    self.watch_channel(self.client)
+        return self.client
+
+    def watch_channel(self, client):
+        """ Subscribes to connectivity changes of a client channel, if any. """
+        channel = getattr(getattr(client, "transport", None), "channel", None)
+        if channel is not None:
+            channel.subscribe(
+                partial(self.set_channel_state, client), try_to_connect=False
+            )
+
+    def set_channel_state(self, client, state):
+        """ Records the connectivity state of a channel, if still in use. """
+        if client is self.client:
+            self.channel_state = state
+
+    def reset_client(self, client):
+        """ Drops a failed client, unless another thread already replaced it. """
+        with self.lock:
+            self.channel_failures += 1
+            if self.client is client:
+                self.client = None
+
+    def call(self, method, *args, **kwargs):
+        """
+        Calls a client method, retrying once with a new client
+        if the channel failed.
+
+        Args:
+            method: Client method name.
+            *args: Method positional arguments.
+            **kwargs: Method keyword arguments.
+
+        Returns:
+            Method response.
+        """
+        client = self.get_client()
+        try:
+            return getattr(client, method)(*args, **kwargs)
+        except self.channel_errors:
+            logger.warning("Vision API channel failed, recreating client")
+            self.reset_client(client)
+            return getattr(self.get_client(), method)(*args, **kwargs)
+
+    def document_text_detection(self, content):
+        """ Runs document_text_detection through Vision API. """
+        image = vision.types.Image(content=prepare_ocr_image(content))
+        response = self.call("document_text_detection", image=image)
+        if response.error.message:
+            raise OcrError(response.error.message)
+        return response.full_text_annotation
+
+    def batch_document_text_detection(self, contents):
+        """ Runs document text detection on several images in one request. """
+        feature = vision.types.Feature(
+            type=vision.enums.Feature.Type.DOCUMENT_TEXT_DETECTION
+        )
+        requests = [
+            vision.types.AnnotateImageRequest(
+                image=vision.types.Image(content=prepare_ocr_image(content)),
+                features=[feature],
+            )
+            for content in contents
+        ]
+        response = self.call("batch_annotate_images", requests)
+        return [
+            OcrError(r.error.message) if r.error.message else r.full_text_annotation
+            for r in response.responses
+        ]
+
+    def stats(self):
+        """ Returns client counters. """
+        return {
+            "clients_created": self.clients_created,
+            "channel_failures": self.channel_failures,
+        }
+
+
+class FixtureOcrBackend(BaseOcrBackend):
+    """
+    Offline backend replaying recorded full_text_annotation payloads, stored
+    as protobuf JSON files named after the SHA-256 of the image they belong to.
+    Meant for tests, benchmarks and profiling without network access.
+
+    Attributes:
+        directory: Path of the folder containing the JSON payloads.
+        cycle: If True images without a payload get the recorded ones
+            in turns, otherwise an empty document.
+        record: If True images without a payload go through Vision API
+            and the response is saved.
+        documents: Dictionary of loaded documents by image hash.
+        replay: Iterator over recorded image hashes used in cycle mode.
+        vision_backend: VisionOcrBackend instance used in record mode.
+    """
+
+    def __init__(self, directory=None, cycle=None, record=None):
+        """
+        Declares backend options, defaulting to OCR_FIXTURES_DIR,
+        OCR_FIXTURES_CYCLE and OCR_FIXTURES_RECORD settings.
+
+        Args:
+            directory: Optional; Path of the folder containing the JSON payloads.
+            cycle: Optional; Replays recorded payloads for unknown images.
+            record: Optional; Records Vision API payloads for unknown images.
+
+        Raises:
+            ImproperlyConfigured: No directory given and OCR_FIXTURES_DIR
+                setting isn't set.
+        """
+        self.directory = directory or getattr(settings, "OCR_FIXTURES_DIR", None)
+        if not self.directory:
+            raise ImproperlyConfigured(
+                "OCR_FIXTURES_DIR setting is required by FixtureOcrBackend."
+            )
+        self.cycle = (
+            cycle if cycle is not None else getattr(settings, "OCR_FIXTURES_CYCLE", 0)
+        )
+        self.record = (
+            record
+            if record is not None
+            else getattr(settings, "OCR_FIXTURES_RECORD", 0)
+        )
+        self.documents = {}
+        self.replay = None
+        self.vision_backend = None
+        self.lock = threading.Lock()
+
+    def get_path(self, key):
+        """ Returns JSON payload path for an image hash. """
+        return os.path.join(self.directory, f"{key}.json")
+
+    def load(self, key):
+        """
+        Loads a recorded document.
+
+        Args:
+            key: Image hash string.
+
+        Returns:
+            Vision full_text_annotation document or None if not recorded.
+        """
+        if key not in self.documents:
+            try:
+                with open(self.get_path(key)) as f:
+                    document = json_format.Parse(
+                        f.read(), vision.types.TextAnnotation()
+                    )
+            except FileNotFoundError:
+                return None
+            with self.lock:
+                self.documents[key] = document
+        return self.documents[key]
+
+    def get_replay_document(self):
+        """ Returns next recorded document in turns, empty one if none. """
+        with self.lock:
+            if self.replay is None:
+                keys = sorted(
+                    name[: -len(".json")]
+                    for name in os.listdir(self.directory)
+                    if name.endswith(".json")
+                )
+                self.replay = itertools.cycle(keys) if keys else iter(())
+            key = next(self.replay, None)
+        if key is None:
+            return vision.types.TextAnnotation()
+        return self.load(key)
+
+    def document_text_detection(self, content):
+        """ Returns the document recorded for the image. """
+        key = hashlib.sha256(content).hexdigest()
+        document = self.load(key)
+        if document is not None:
+            return document
+
+        if self.record:
+            if self.vision_backend is None:
+                self.vision_backend = VisionOcrBackend()
+            document = self.vision_backend.document_text_detection(content)
+            with open(self.get_path(key), "w") as f:
+                f.write(json_format.MessageToJson(document))
+            return document
+
+        if self.cycle:
+            return self.get_replay_document()
+
+        return vision.types.TextAnnotation()
+
+
+def get_ocr_backend():
+    """
+    Returns the process wide instance of the OCR backend configured
+    by OCR_BACKEND setting.
+
+    Returns:
+        BaseOcrBackend instance.
+    """
+    global _backend
+
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                backend = getattr(
+                    settings, "OCR_BACKEND", "catalog.ocr_backends.VisionOcrBackend"
+                )
+                _backend = import_string(backend)()
+    return _backend
+
+
+@receiver(setting_changed)
+def reset_ocr_backend(setting, **kwargs):
+    """ Drops the OCR backend instance when its settings change. """
+    global _backend
+
+    if setting.startswith("OCR_"):
+        _backend = None
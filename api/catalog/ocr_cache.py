@@ -0,0 +1,172 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+class OcrCache:
+    """
+    Cache of serialized text detection results keyed by image hash.
+    Entries expire after a timeout and the least recently used ones are
+    evicted once total size goes over the limit. If a Django cache alias is
+    given entries are stored there instead, and expiration and eviction are
+    left to that cache.
+
+    Attributes:
+        timeout: Seconds before an entry expires.
+        max_size: Maximum total size of local entries in bytes.
+        alias: Django cache alias name or None.
+        entries: OrderedDict of keys to (expiration time, value) tuples,
+            least recently used first.
+        size: Total size of local entries in bytes.
+        hits: Integer number of cache hits.
+        misses: Integer number of cache misses.
+        evictions: Integer number of entries evicted to free space.
+
+    Usage example:
+        cache = get_ocr_cache()
+        data = cache.get(image_hash)
+    """
+
+    def __init__(self, timeout=86400, max_size=64 * 1024 * 1024, alias=None):
+        """
+        Declares cache settings, storage and counters.
+
+        Args:
+            timeout: Optional; Seconds before an entry expires.
+            max_size: Optional; Maximum total size of local entries in bytes.
+            alias: Optional; Django cache alias to use instead of local storage.
+        """
+        self.timeout = timeout
+        self.max_size = max_size
+        self.alias = alias
+        self.entries = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    def get_key(self, key):
+        """ Returns namespaced key for Django cache. """
+        return f"catalog:ocr:{key}"
+
+    def get(self, key):
+        """
+        Returns cached value if present and not expired.
+
+        Args:
+            key: Image hash string.
+
+        Returns:
+            Value as bytes or None.
+        """
+        if self.alias:
+            value = caches[self.alias].get(self.get_key(key))
+            with self.lock:
+                if value is None:
+                    self.misses += 1
+                else:
+                    self.hits += 1
+            return value
+
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry and entry[0] < time.monotonic():
+                self.remove(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value):
+        """
+        Stores a value, evicting least recently used entries if needed.
+
+        Args:
+            key: Image hash string.
+            value: Bytes to store.
+        """
+        if self.alias:
+            caches[self.alias].set(self.get_key(key), value, self.timeout)
+            return
+
+        if len(value) > self.max_size:
+            return
+
+        with self.lock:
+            if key in self.entries:
+                self.remove(key)
+            self.entries[key] = (time.monotonic() + self.timeout, value)
+            self.size += len(value)
+            while self.size > self.max_size:
+                self.remove(next(iter(self.entries)))
+                self.evictions += 1
+
+    def remove(self, key):
+        """ Drops a local entry, expects lock to be held. """
+        _, value = self.entries.pop(key)
+        self.size -= len(value)
+
+    def stats(self):
+        """
+        Returns cache counters.
+
+        Returns:
+            Dictionary of counters, for example:
+            {
+                "hits": 10,
+                "misses": 4,
+                "evictions": 0,
+                "entries": 4,
+                "size": 10250,
+            }
+        """
+        with self.lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self.entries),
+                "size": self.size,
+            }
+
+
+def get_ocr_cache():
+    """
+    Returns the process wide OCR cache, configured by OCR_CACHE_TIMEOUT,
+    OCR_CACHE_MAX_SIZE and OCR_CACHE_ALIAS settings.
+
+    Returns:
+        OcrCache instance.
+    """
+    global _cache
+
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = OcrCache(
+                    timeout=getattr(settings, "OCR_CACHE_TIMEOUT", 86400),
+                    max_size=getattr(settings, "OCR_CACHE_MAX_SIZE", 64 * 1024 * 1024),
+                    alias=getattr(settings, "OCR_CACHE_ALIAS", None),
+                )
+    return _cache
+
+
+@receiver(setting_changed)
+def reset_ocr_cache(setting, **kwargs):
+    """ Drops the OCR cache instance when its settings change. """
+    global _cache
+
+    if setting.startswith("OCR_CACHE"):
+        _cache = None
@@ -0,0 +1,29 @@
+from django.conf import settings
+from rest_framework.fields import BooleanField
+from rest_framework.pagination import CursorPagination
+
+
+class CreatedOnCursorPagination(CursorPagination):
+    """
+    Cursor pagination over created_on and id, most recent first. Pages are
+    fetched by seeking from the cursor position through the user, created_on
+    and id index, so deep pages cost the same as the first one.
+    Page size defaults to API_PAGE_SIZE setting and can be changed with
+    a page_size query parameter, up to API_MAX_PAGE_SIZE. Unpaginated lists
+    can still be requested with paginate=false.
+    """
+
+    ordering = ("-created_on", "-id")
+    page_size_query_param = "page_size"
+    unpaginated_query_param = "paginate"
+
+    def __init__(self):
+        self.page_size = getattr(settings, "API_PAGE_SIZE", 50)
+        self.max_page_size = getattr(settings, "API_MAX_PAGE_SIZE", 200)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        """ Returns None if pagination is turned off by the request. """
+        paginate = request.query_params.get(self.unpaginated_query_param)
+        if paginate in BooleanField.FALSE_VALUES:
+            return None
+        return super().paginate_queryset(queryset, request, view)
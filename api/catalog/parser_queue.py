@@ -0,0 +1,266 @@
+import json
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import ParserJob
+from .ocr_backends import OcrError
+from .vision_parser import VisionParser
+
+logger = logging.getLogger(__name__)
+
+_queue = None
+_queue_lock = threading.Lock()
+
+
+def run_job(job):
+    """
+    Runs a claimed job through the vision parser and stores the outcome.
+    Image data is dropped once done.
+
+    Args:
+        job: ParserJob instance with RUNNING status.
+
+    Returns:
+        Updated ParserJob instance.
+    """
+    try:
+        parser = VisionParser(job.image)
+        tea_data = parser.get_tea_data(max_name_length=job.max_name_length)
+        job.result = json.dumps(tea_data)
+        job.status = ParserJob.DONE
+    except ValueError:
+        job.error = "Invalid image data"
+        job.status = ParserJob.FAILED
+    except OcrError:
+        job.error = "Text detection failed"
+        job.status = ParserJob.FAILED
+    except Exception as e:
+        logger.exception("Parser job %s failed", job.id)
+        job.error = str(e)[:255]
+        job.status = ParserJob.FAILED
+
+    job.image = ""
+    job.finished_on = timezone.now()
+    job.save(update_fields=["result", "error", "status", "image", "finished_on"])
+    return job
+
+
+class BaseParserQueue:
+    """
+    Parser jobs queue interface. Jobs are always stored as ParserJob rows,
+    backends decide how they get to a worker.
+    """
+
+    def enqueue(self, job):
+        """
+        Schedules a saved pending job for processing.
+
+        Args:
+            job: ParserJob instance.
+        """
+        raise NotImplementedError
+
+    def claim(self):
+        """
+        Marks the oldest pending job as running and returns it.
+
+        Returns:
+            ParserJob instance or None if no job is pending.
+        """
+        with transaction.atomic():
+            job = (
+                ParserJob.objects.select_for_update(skip_locked=True)
+                .filter(status=ParserJob.PENDING)
+                .order_by("created_on")
+                .first()
+            )
+            if not job:
+                return None
+
+            # Conditional update keeps claiming safe on databases without row locks
+            now = timezone.now()
+            claimed = ParserJob.objects.filter(
+                pk=job.pk, status=ParserJob.PENDING
+            ).update(
+                status=ParserJob.RUNNING, started_on=now, attempts=F("attempts") + 1
+            )
+            if not claimed:
+                return None
+
+        job.status = ParserJob.RUNNING
+        job.started_on = now
+        job.attempts += 1
+        return job
+
+    def recover(self):
+        """
+        Requeues jobs left running past PARSER_JOB_TIMEOUT seconds by a stopped
+        worker, failing the ones that used up PARSER_JOB_MAX_ATTEMPTS.
+
+        Returns:
+            Number of requeued jobs.
+        """
+        now = timezone.now()
+        timeout = getattr(settings, "PARSER_JOB_TIMEOUT", 300)
+        stale = ParserJob.objects.filter(
+            status=ParserJob.RUNNING, started_on__lt=now - timedelta(seconds=timeout)
+        )
+        max_attempts = getattr(settings, "PARSER_JOB_MAX_ATTEMPTS", 3)
+        stale.filter(attempts__gte=max_attempts).update(
+            status=ParserJob.FAILED, error="Job timed out", image="", finished_on=now
+        )
+        return stale.update(status=ParserJob.PENDING, started_on=None)
+
+
+class DatabaseParserQueue(BaseParserQueue):
+    """
+    Queue backed by the ParserJob table. Pending rows are picked up by
+    parser_worker management command processes, no extra service needed.
+    """
+
+    def enqueue(self, job):
+        """ Nothing to do, workers poll the table. """
+        pass
+
+    def work(self, poll_interval=1, stop_event=None):
+        """
+        Claims and runs jobs until stop_event is set. Stale jobs are requeued
+        whenever idle, at most once per PARSER_JOB_TIMEOUT.
+
+        Args:
+            poll_interval: Optional; Seconds to wait when no job is pending.
+            stop_event: Optional; threading.Event stopping the loop when set.
+        """
+        stop_event = stop_event or threading.Event()
+        timeout = getattr(settings, "PARSER_JOB_TIMEOUT", 300)
+        recovered_at = None
+        while not stop_event.is_set():
+            close_old_connections()
+            job = self.claim()
+            if job:
+                run_job(job)
+                continue
+            if recovered_at is None or time.monotonic() - recovered_at > timeout:
+                recovered_at = time.monotonic()
+                if self.recover():
+                    continue
+            stop_event.wait(poll_interval)
+
+
+class ThreadParserQueue(BaseParserQueue):
+    """
+    Queue running jobs in a thread pool within the web process,
+    no worker process needed.
+
+    Attributes:
+        executor: ThreadPoolExecutor running the jobs.
+    """
+
+    def __init__(self):
+        self.executor = ThreadPoolExecutor(
+            max_workers=getattr(settings, "PARSER_QUEUE_THREADS", 4),
+            thread_name_prefix="parser",
+        )
+
+    def enqueue(self, job):
+        """ Submits a job run once the transaction saving it is committed. """
+        transaction.on_commit(lambda: self.executor.submit(self.process))
+
+    def recover(self):
+        """
+        Requeues stale jobs and submits a run for every pending job, the ones
+        queued by a stopped process included.
+        """
+        requeued = super().recover()
+        for _ in range(ParserJob.objects.filter(status=ParserJob.PENDING).count()):
+            self.executor.submit(self.process)
+        return requeued
+
+    def process(self):
+        """ Claims and runs one job. """
+        try:
+            job = self.claim()
+            if job:
+                run_job(job)
+        finally:
+            close_old_connections()
+
+
+def get_parser_queue():
+    """
+    Returns the parser queue configured by PARSER_QUEUE_BACKEND setting.
+
+    Returns:
+        BaseParserQueue instance.
+    """
+    global _queue
+
+    if _queue is None:
+        with _queue_lock:
+            if _queue is None:
+                backend = getattr(
+                    settings,
+                    "PARSER_QUEUE_BACKEND",
+                    "catalog.parser_queue.ThreadParserQueue",
+                )
+                _queue = import_string(backend)()
+    return _queue
+
+
+def wait_for_job(job, timeout, poll_interval=0.5):
+    """
+    Waits for a job to be done or failed, up to timeout.
+
+    Args:
+        job: ParserJob instance.
+        timeout: Seconds to wait at most.
+        poll_interval: Optional; Seconds between status checks.
+
+    Returns:
+        Refreshed ParserJob instance.
+    """
+    deadline = time.monotonic() + timeout
+    while job.status in (ParserJob.PENDING, ParserJob.RUNNING):
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        time.sleep(min(poll_interval, remaining))
+        job.refresh_from_db()
+    return job
+
+
+def is_stale(job):
+    """
+    Returns True if a job is still pending or running PARSER_JOB_TIMEOUT
+    seconds after it was queued or claimed.
+    """
+    if job.status not in (ParserJob.PENDING, ParserJob.RUNNING):
+        return False
+    timeout = getattr(settings, "PARSER_JOB_TIMEOUT", 300)
+    since = job.started_on or job.created_on
+    return since < timezone.now() - timedelta(seconds=timeout)
+
+
+def prune_parser_jobs():
+    """
+    Deletes done and failed jobs finished more than PARSER_JOB_RETENTION
+    days ago.
+
+    Returns:
+        Number of deleted jobs.
+    """
+    retention = getattr(settings, "PARSER_JOB_RETENTION", 1)
+    deleted, _ = ParserJob.objects.filter(
+        status__in=(ParserJob.DONE, ParserJob.FAILED),
+        finished_on__lt=timezone.now() - timedelta(days=retention),
+    ).delete()
+    return deleted
@@ -0,0 +1,54 @@
+import json
+import mimetypes
+
+from django.utils.datastructures import MultiValueDict
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import DataAndFiles, FileUploadParser, MultiPartParser
+
+
+class ImageUploadParser(FileUploadParser):
+    """
+    Raw binary image body parser. The body is streamed in chunks through
+    Django upload handlers, so large images are spooled to a temporary file
+    instead of being kept in memory, and exposed as the image field.
+    A Content-Disposition filename is optional.
+    """
+
+    media_type = "image/*"
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        """ Returns uploaded file as the image field. """
+        result = super().parse(stream, media_type, parser_context)
+        return DataAndFiles({}, {"image": result.files["file"]})
+
+    def get_filename(self, stream, media_type, parser_context):
+        """ Returns given file name or a default one from content type. """
+        filename = super().get_filename(stream, media_type, parser_context)
+        if filename:
+            return filename
+        extension = mimetypes.guess_extension(media_type.split(";")[0]) or ""
+        return f"image{extension}"
+
+
+class MultiPartJsonParser(MultiPartParser):
+    """
+    Multipart form parser accepting nested data as a JSON encoded data field,
+    alongside uploaded files, which are streamed in chunks through Django
+    upload handlers. Form fields are used as is if there's no data field.
+    """
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        """ Decodes the data field and merges form files in it. """
+        result = super().parse(stream, media_type, parser_context)
+        if "data" not in result.data:
+            return result
+
+        try:
+            data = json.loads(result.data["data"])
+        except ValueError as e:
+            raise ParseError(f"Multipart data field parse error - {e}")
+        if not isinstance(data, dict):
+            raise ParseError("Multipart data field must be a JSON object")
+        # Files are merged here as single values, DRF would merge their lists
+        data.update(result.files.dict())
+        return DataAndFiles(data, MultiValueDict())
@@ -0,0 +1,389 @@
+import asyncio
+import html
+import json
+import re
+import threading
+import weakref
+
+import googlemaps
+import httpx
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIHandler
+from django.core.signals import setting_changed
+from django.db import close_old_connections, transaction
+from django.db.models import Q
+from django.dispatch import receiver
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+
+from .authentication import TokenUserAuthentication
+from .models import Origin
+from .nested_resolver import get_origin_key
+from .places_cache import get_places_cache, get_places_key
+from .reference_cache import invalidate_reference_data
+from .sync import touch_nested
+
+PLACES_API_URL = "https://maps.googleapis.com/maps/api/place/"
+
+# Places lookups by proxy view path
+PLACES_PATHS = {
+    "/api/places/autocomplete/": "autocomplete",
+    "/api/places/details/": "details",
+}
+
+# Address parts of adr_address, as parsed by the web client
+ADDRESS_PATTERN = re.compile(
+    r'<span class="(country-name|region|locality|extended-address)">([^<]*)</span>'
+)
+
+_client = None
+_client_lock = threading.Lock()
+_async_clients = weakref.WeakKeyDictionary()
+
+
+class PlacesError(Exception):
+    """ Places API error status, formatted as googlemaps ApiError. """
+
+    def __init__(self, status, message=None):
+        super().__init__(status, message)
+        self.status = status
+        self.message = message
+
+    def __str__(self):
+        if self.message is None:
+            return self.status
+        return f"{self.status} ({self.message})"
+
+
+def get_lookup_params(lookup, data):
+    """
+    Returns Places API query parameters of a lookup, as sent by googlemaps.
+
+    Args:
+        lookup: Lookup name, autocomplete or details.
+        data: Request data with input or place_id and token fields.
+
+    Returns:
+        Dictionary of query parameters.
+
+    Raises:
+        KeyError: A field is missing from data.
+    """
+    if lookup == "autocomplete":
+        return {
+            "input": data["input"],
+            "sessiontoken": data["token"],
+            "types": "(regions)",
+        }
+    return {
+        "placeid": data["place_id"],
+        "sessiontoken": data["token"],
+        "fields": "adr_address,geometry",
+    }
+
+
+def get_lookup_result(lookup, body):
+    """
+    Returns lookup results from a Places API response body, predictions for
+    autocomplete and the whole body for details, as googlemaps does.
+
+    Raises:
+        PlacesError: The API returned an error status.
+    """
+    status = body["status"]
+    if status not in ("OK", "ZERO_RESULTS"):
+        raise PlacesError(status, body.get("error_message"))
+    if lookup == "autocomplete":
+        return body.get("predictions", [])
+    return body
+
+
+def get_places_client():
+    """
+    Returns the process wide googlemaps client, reusing its HTTP connections
+    across requests.
+
+    Returns:
+        googlemaps.Client instance.
+    """
+    global _client
+
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = googlemaps.Client(
+                    key=settings.MAPS_API_KEY,
+                    timeout=getattr(settings, "PLACES_TIMEOUT", 10),
+                    queries_per_second=getattr(
+                        settings, "PLACES_QUERIES_PER_SECOND", 100
+                    ),
+                )
+    return _client
+
+
+def get_async_places_client():
+    """
+    Returns the HTTP client of the running event loop, pooling up to
+    PLACES_MAX_CONNECTIONS connections to the Places API for all lookups.
+
+    Returns:
+        httpx.AsyncClient instance.
+    """
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        max_connections = getattr(settings, "PLACES_MAX_CONNECTIONS", 100)
+        client = _async_clients[loop] = httpx.AsyncClient(
+            base_url=PLACES_API_URL,
+            timeout=getattr(settings, "PLACES_TIMEOUT", 10),
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_connections,
+            ),
+        )
+    return client
+
+
+def call_closing_connections(func, *args):
+    """
+    Returns the result of a function called from the event loop through
+    sync_to_async, closing the database connection it opened if any.
+    """
+    try:
+        return func(*args)
+    finally:
+        close_old_connections()
+
+
+def lookup_place(lookup, data):
+    """
+    Runs a Places lookup through the shared googlemaps client, unless its
+    results are cached.
+
+    Args:
+        lookup: Lookup name, autocomplete or details.
+        data: Request data with input or place_id and token fields.
+
+    Returns:
+        List of predictions for autocomplete, response data for details.
+    """
+    key = get_places_key(lookup, data)
+    results = get_places_cache().get(key)
+    if results is not None:
+        return results
+
+    gmaps = get_places_client()
+    if lookup == "autocomplete":
+        results = gmaps.places_autocomplete(
+            data["input"], session_token=data["token"], types=["(regions)"]
+        )
+    else:
+        results = gmaps.place(
+            data["place_id"],
+            session_token=data["token"],
+            fields=["adr_address", "geometry"],
+        )
+    get_places_cache().set(key, results)
+    return results
+
+
+async def call_places_cache(method, *args):
+    """
+    Calls a Places cache method from the event loop, in a worker thread if
+    the cache has a Django cache tier, whose backend may query the database.
+    """
+    if not get_places_cache().alias:
+        return method(*args)
+    return await sync_to_async(call_closing_connections)(method, *args)
+
+
+async def lookup_place_async(lookup, data):
+    """
+    Runs a Places lookup without blocking, same as lookup_place. Local cache
+    hits are returned from the event loop.
+    """
+    params = get_lookup_params(lookup, data)
+    key = get_places_key(lookup, data)
+    cache = get_places_cache()
+    results = cache.get_local(key)
+    if results is None:
+        results = await call_places_cache(cache.get_shared, key)
+    if results is not None:
+        return results
+
+    params["key"] = settings.MAPS_API_KEY
+    resp = await get_async_places_client().get(f"{lookup}/json", params=params)
+    resp.raise_for_status()
+    results = get_lookup_result(lookup, resp.json())
+    await call_places_cache(cache.set, key, results)
+    return results
+
+
+def get_places_result(request, lookup):
+    """
+    Returns results of a Places proxy request, looked up beforehand by
+    PlacesASGIHandler if served through ASGI, else now.
+
+    Args:
+        request: Request of a Places proxy view.
+        lookup: Lookup name, autocomplete or details.
+
+    Raises:
+        KeyError: A field is missing from request data.
+        PlacesError, googlemaps.exceptions.ApiError: The API returned an
+            error status.
+    """
+    scope = getattr(request._request, "scope", {})
+    if "places_result" not in scope:
+        return lookup_place(lookup, request.data)
+    if isinstance(scope["places_result"], Exception):
+        raise scope["places_result"]
+    return scope["places_result"]
+
+
+def get_place_origin(details):
+    """
+    Returns origin data of place details, parsed from adr_address as done
+    by the web client, or None if details have no country or location.
+
+    Args:
+        details: Places API details response data.
+
+    Returns:
+        Dictionary of country, region, locality, latitude and longitude.
+    """
+    result = details.get("result", {})
+    parts = {
+        name: html.unescape(value)
+        for name, value in ADDRESS_PATTERN.findall(result.get("adr_address", ""))
+    }
+    location = result.get("geometry", {}).get("location", {})
+    if "country-name" not in parts or "lat" not in location or "lng" not in location:
+        return None
+
+    locality = parts.get("locality", "")
+    if parts.get("extended-address"):
+        locality = parts["extended-address"].split(",")[0]
+    return {
+        "country": parts["country-name"],
+        "region": parts.get("region", "").replace(" Province", ""),
+        "locality": locality,
+        "latitude": location["lat"],
+        "longitude": location["lng"],
+    }
+
+
+def save_place_coordinates(details, user):
+    """
+    Saves coordinates of place details to public and user owned origins of
+    the same place missing them, so that they don't need a lookup anymore.
+    Origins are updated without signals, so nesting teas and sessions are
+    marked as modified and reference data invalidated here, only if some
+    were missing coordinates.
+
+    Args:
+        details: Places API details response data.
+        user: CustomUser instance or ID of the user looking up the place.
+
+    Returns:
+        Number of origins updated.
+    """
+    origin = get_place_origin(details)
+    if origin is None:
+        return 0
+    country, region, locality = get_origin_key(origin)
+    missing = dict(
+        Origin.objects.filter(
+            Q(latitude__isnull=True) | Q(longitude__isnull=True),
+            country=country,
+            region=region,
+            locality=locality,
+        )
+        .owned_or_public(user)
+        .values_list("id", "is_public")
+    )
+    if not missing:
+        return 0
+
+    with transaction.atomic():
+        updated = Origin.objects.filter(id__in=missing).update(
+            latitude=origin["latitude"], longitude=origin["longitude"]
+        )
+        touch_nested(Origin, list(missing))
+        if any(missing.values()):
+            invalidate_reference_data()
+        if not all(missing.values()):
+            invalidate_reference_data(getattr(user, "pk", user))
+    return updated
+
+
+async def is_authenticated(scope):
+    """
+    Returns if a scope has a valid access token of an active user, checked
+    as TokenUserAuthentication does, from token claims if JWT_TOKEN_USER
+    setting is on, else with a user query in a worker thread.
+    """
+    authentication = TokenUserAuthentication()
+    header = dict(scope["headers"]).get(b"authorization")
+    raw_token = header and authentication.get_raw_token(header)
+    if not raw_token:
+        return False
+    try:
+        validated_token = authentication.get_validated_token(raw_token)
+        await sync_to_async(call_closing_connections)(
+            authentication.get_user, validated_token
+        )
+    except (InvalidToken, AuthenticationFailed):
+        return False
+    return True
+
+
+class PlacesASGIHandler(ASGIHandler):
+    """
+    ASGI handler running Places proxy lookups on the event loop, so that
+    lookups in flight don't hold a thread. The result of an authenticated
+    proxy request is looked up before the request goes through Django and
+    its view, which returns it from the scope. Other requests, and lookups
+    failing to reach the API, are handled as usual.
+    """
+
+    async def __call__(self, scope, receive, send):
+        lookup = None
+        if scope["type"] == "http" and scope["method"] == "POST":
+            lookup = PLACES_PATHS.get(scope["path"])
+        if lookup is None or not await is_authenticated(scope):
+            return await super().__call__(scope, receive, send)
+
+        messages = []
+        more_body = True
+        while more_body:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                return
+            messages.append(message)
+            more_body = message.get("more_body", False)
+
+        try:
+            data = json.loads(
+                b"".join(message.get("body", b"") for message in messages)
+            )
+            scope = {**scope, "places_result": await lookup_place_async(lookup, data)}
+        except PlacesError as e:
+            scope = {**scope, "places_result": e}
+        except (ValueError, TypeError, KeyError, httpx.HTTPError):
+            pass
+
+        async def replay():
+            return messages.pop(0) if messages else await receive()
+
+        await super().__call__(scope, replay, send)
+
+
+@receiver(setting_changed)
+def reset_places_clients(setting, **kwargs):
+    """ Drops Places clients when their settings change. """
+    global _client
+
+    if setting.startswith("PLACES") or setting == "MAPS_API_KEY":
+        _client = None
+        _async_clients.clear()
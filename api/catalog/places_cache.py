@@ -0,0 +1,186 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_places_key(lookup, data):
+    """
+    Returns cache key of a Places lookup, from the input with case and
+    spaces normalized for autocomplete and from place_id for details.
+    Session tokens aren't part of the key, results are shared by sessions.
+
+    Raises:
+        KeyError: The looked up field is missing from data.
+    """
+    if lookup == "autocomplete":
+        return (lookup, " ".join(str(data["input"]).casefold().split()))
+    return (lookup, str(data["place_id"]))
+
+
+class PlacesCache:
+    """
+    Cache of Places lookup results shared by users, so that common inputs
+    and places are fetched once. Entries expire after a timeout and least
+    recently used ones are evicted over the limit. If a Django cache alias is
+    given it's used as a second tier behind local entries, so that workers of
+    a shared backend share lookups while local hits don't cost a round trip.
+    Lookups served from cache don't reach the API, session tokens are only
+    sent with uncached ones, the details lookup ending a session being billed
+    as usual when missed.
+
+    Attributes:
+        timeout: Seconds before an entry expires.
+        max_size: Maximum number of local entries.
+        alias: Django cache alias name or None.
+        entries: OrderedDict of keys to (expiration time, results) tuples,
+            least recently used first.
+        hits: Integer number of local cache hits.
+        shared_hits: Integer number of Django cache hits.
+        misses: Integer number of cache misses.
+
+    Usage example:
+        cache = get_places_cache()
+        results = cache.get(get_places_key("details", data))
+    """
+
+    def __init__(self, timeout=86400, max_size=10000, alias=None):
+        """
+        Declares cache settings, storage and counters.
+
+        Args:
+            timeout: Optional; Seconds before an entry expires.
+            max_size: Optional; Maximum number of local entries.
+            alias: Optional; Django cache alias to use behind local entries.
+        """
+        self.timeout = timeout
+        self.max_size = max_size
+        self.alias = alias
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get_key(self, key):
+        """
+        Returns namespaced key for Django cache, hashed so that inputs of
+        any length and characters make valid memcached keys.
+        """
+        digest = hashlib.sha1(key[1].encode()).hexdigest()
+        return f"catalog:places:{key[0]}:{digest}"
+
+    def get(self, key):
+        """
+        Returns cached results if present and not expired, from local entries
+        first, then from the Django cache if any.
+
+        Args:
+            key: Key tuple from get_places_key.
+
+        Returns:
+            Lookup results or None.
+        """
+        results = self.get_local(key)
+        if results is None:
+            results = self.get_shared(key)
+        return results
+
+    def get_local(self, key):
+        """ Returns results of a local entry, None if missing or expired. """
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry and entry[0] < time.monotonic():
+                del self.entries[key]
+                entry = None
+            if entry is None:
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def get_shared(self, key):
+        """
+        Returns results from the Django cache, kept as a local entry, None if
+        missing or if there's no alias. Counts a miss for lookups missing
+        both tiers.
+        """
+        results = None
+        if self.alias:
+            results = caches[self.alias].get(self.get_key(key))
+        if results is None:
+            with self.lock:
+                self.misses += 1
+            return None
+        with self.lock:
+            self.shared_hits += 1
+        self.set_local(key, results)
+        return results
+
+    def set(self, key, results):
+        """ Stores results locally, and in the Django cache if any. """
+        self.set_local(key, results)
+        if self.alias:
+            caches[self.alias].set(self.get_key(key), results, self.timeout)
+
+    def set_local(self, key, results):
+        """ Stores a local entry, evicting least recently used ones if needed. """
+        with self.lock:
+            self.entries[key] = (time.monotonic() + self.timeout, results)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def stats(self):
+        """
+        Returns cache counters.
+
+        Returns:
+            Dictionary of counters, for example:
+            {"hits": 10, "shared_hits": 2, "misses": 4, "entries": 4}
+        """
+        with self.lock:
+            return {
+                "hits": self.hits,
+                "shared_hits": self.shared_hits,
+                "misses": self.misses,
+                "entries": len(self.entries),
+            }
+
+
+def get_places_cache():
+    """
+    Returns the process wide Places cache, configured by PLACES_CACHE_TIMEOUT,
+    PLACES_CACHE_MAX_SIZE and PLACES_CACHE_ALIAS settings.
+
+    Returns:
+        PlacesCache instance.
+    """
+    global _cache
+
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = PlacesCache(
+                    timeout=getattr(settings, "PLACES_CACHE_TIMEOUT", 86400),
+                    max_size=getattr(settings, "PLACES_CACHE_MAX_SIZE", 10000),
+                    alias=getattr(settings, "PLACES_CACHE_ALIAS", None),
+                )
+    return _cache
+
+
+@receiver(setting_changed)
+def reset_places_cache(setting, **kwargs):
+    """ Drops the Places cache instance when its settings change. """
+    global _cache
+
+    if setting.startswith("PLACES_CACHE"):
+        _cache = None
@@ -0,0 +1,144 @@
+import os
+import threading
+
+import psycopg2
+from django.conf import settings
+from django.db.backends.postgresql import base
+from psycopg2.pool import ThreadedConnectionPool
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+class BlockingConnectionPool(ThreadedConnectionPool):
+    """
+    Thread safe pool whose getconn waits for a connection to be returned when
+    all maxconn connections are borrowed, instead of raising PoolError.
+
+    Attributes:
+        semaphore: BoundedSemaphore counting connections left to borrow.
+    """
+
+    def __init__(self, minconn, maxconn, *args, **kwargs):
+        super().__init__(minconn, maxconn, *args, **kwargs)
+        self.semaphore = threading.BoundedSemaphore(maxconn)
+
+    def getconn(self, timeout=None):
+        """
+        Borrows a connection, waiting for one if all are borrowed.
+
+        Args:
+            timeout: Optional; Seconds to wait, forever by default.
+
+        Returns:
+            psycopg2 connection.
+
+        Raises:
+            psycopg2.OperationalError: No connection returned in time.
+        """
+        if not self.semaphore.acquire(timeout=timeout):
+            raise psycopg2.OperationalError(
+                "Timed out waiting for a pooled database connection"
+            )
+        try:
+            return super().getconn()
+        except Exception:
+            self.semaphore.release()
+            raise
+
+    def putconn(self, conn, close=False):
+        """ Returns a borrowed connection, waking up a waiting thread. """
+        try:
+            super().putconn(conn, close=close)
+        finally:
+            self.semaphore.release()
+
+
+def get_pool(alias, conn_params):
+    """
+    Returns the connection pool of a database alias and its connection
+    parameters in the current process, keeping up to DB_POOL_MIN_SIZE idle
+    connections and opening up to DB_POOL_MAX_SIZE connections. Pools are
+    created on first use, so that forked workers don't share connections,
+    and per parameters, so that a test database gets its own.
+
+    Args:
+        alias: Database alias.
+        conn_params: Dictionary of psycopg2 connection parameters.
+
+    Returns:
+        BlockingConnectionPool instance.
+    """
+    key = (
+        alias,
+        os.getpid(),
+        tuple(sorted((name, str(value)) for name, value in conn_params.items())),
+    )
+    pool = _pools.get(key)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(key)
+            if pool is None:
+                pool = _pools[key] = BlockingConnectionPool(
+                    getattr(settings, "DB_POOL_MIN_SIZE", 4),
+                    getattr(settings, "DB_POOL_MAX_SIZE", 16),
+                    **conn_params,
+                )
+    return pool
+
+
+def is_connection_usable(connection):
+    """
+    Returns if a pooled connection is open and, with DB_HEALTH_CHECKS
+    setting on, answers a query.
+    """
+    if connection.closed:
+        return False
+    if not getattr(settings, "DB_HEALTH_CHECKS", False):
+        return True
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1")
+    except psycopg2.Error:
+        return False
+    return True
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """
+    PostgreSQL backend borrowing connections from a per-process pool, so that
+    threaded workers share a few open connections instead of opening one per
+    request or keeping one per thread. Closing a connection, at the end of
+    requests with CONN_MAX_AGE 0, returns it to the pool, rolled back.
+    Threads wait up to DB_POOL_TIMEOUT seconds for a connection when all of
+    them are borrowed.
+    """
+
+    pool = None
+
+    def get_new_connection(self, conn_params):
+        """ Borrows a usable connection, dropping broken ones. """
+        pool = get_pool(self.alias, conn_params)
+        timeout = getattr(settings, "DB_POOL_TIMEOUT", 30)
+        connection = pool.getconn(timeout)
+        while not is_connection_usable(connection):
+            pool.putconn(connection, close=True)
+            connection = pool.getconn(timeout)
+        self.pool = pool
+
+        # Same as the parent, which opens a connection itself
+        options = self.settings_dict["OPTIONS"]
+        try:
+            self.isolation_level = options["isolation_level"]
+        except KeyError:
+            self.isolation_level = connection.isolation_level
+        else:
+            if self.isolation_level != connection.isolation_level:
+                connection.set_session(isolation_level=self.isolation_level)
+        return connection
+
+    def _close(self):
+        """ Returns the connection to the pool, broken ones are closed. """
+        if self.connection is not None:
+            with self.wrap_database_errors:
+                self.pool.putconn(self.connection, close=bool(self.connection.closed))
@@ -0,0 +1,63 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .versions import bump_version, get_version
+
+VERSION_KEY = "catalog:reference"
+
+
+def get_user_version_key(user_id):
+    """ Returns the key of a user private reference data version. """
+    return f"{VERSION_KEY}:{user_id}"
+
+
+def get_reference_etag(name, user_id=None):
+    """
+    Returns a strong ETag for a reference list, from the shared version of
+    public data and the user one of private data, identical on all workers
+    and costing a primary key query per version.
+
+    Args:
+        name: Reference list name.
+        user_id: Optional; User ID if the list has private rows.
+
+    Returns:
+        Quoted ETag string.
+    """
+    versions = [name, get_version(VERSION_KEY)]
+    if user_id is not None:
+        versions.append(get_version(get_user_version_key(user_id)))
+    return '"%s"' % hashlib.sha1(":".join(versions).encode()).hexdigest()
+
+
+def get_public_data(name, build):
+    """
+    Returns serialized public rows of a reference list, cached by version in
+    the default cache for REFERENCE_CACHE_TIMEOUT seconds.
+
+    Args:
+        name: Reference list name.
+        build: Function returning the list of serialized public rows.
+
+    Returns:
+        List of serialized rows.
+    """
+    key = f"catalog:reference:{name}:{get_version(VERSION_KEY)}"
+    data = cache.get(key)
+    if data is None:
+        data = list(build())
+        cache.set(key, data, getattr(settings, "REFERENCE_CACHE_TIMEOUT", 86400))
+    return data
+
+
+def invalidate_reference_data(user_id=None):
+    """
+    Bumps the shared version of public reference data, or the one of a user
+    private data if a user ID is given, in the transaction changing them.
+    """
+    if user_id is None:
+        bump_version(VERSION_KEY)
+    else:
+        bump_version(get_user_version_key(user_id))
@@ -1,4 +1,5 @@
-from datetime import timedelta
+import json
+from functools import partial
 
 from django.conf import settings
 from django.contrib.auth import authenticate, get_user_model
@@ -6,11 +7,26 @@ from django.contrib.auth.password_validation import (
     get_password_validators,
     validate_password,
 )
+from django.core.files.uploadedfile import UploadedFile
+from django.db import transaction
 from drf_extra_fields.fields import Base64ImageField
+from PIL import Image
 from rest_framework import serializers
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
 
-from .models import Brewing, BrewingSession, Category, Origin, Subcategory, Tea, Vendor
+from .brewing_cache import get_brewing_cache
+from .images import get_thumbnails_urls, process_image, save_thumbnails
+from .models import (
+    Brewing,
+    BrewingSession,
+    Category,
+    Origin,
+    ParserJob,
+    Subcategory,
+    Tea,
+    Vendor,
+)
+from .nested_resolver import NestedResolver, set_known_coordinates
 
 
 class UserSerializer(serializers.ModelSerializer):
@@ -97,38 +113,55 @@ class LoginSerializer(TokenObtainPairSerializer):
     def validate(self, attrs):
         """
         Checks user authentication and returns a new pair of tokens.
+        Authenticates and signs tokens once, password hashing being most of
+        the login cost, instead of relying on the parent validation.
         """
-        user = authenticate(username=attrs["email"], password=attrs["password"])
-        if not user:
+        credentials = {"username": attrs["email"], "password": attrs["password"]}
+        if "request" in self.context:
+            credentials["request"] = self.context["request"]
+        self.user = authenticate(**credentials)
+        if not self.user or not self.user.is_active:
             raise serializers.ValidationError("Incorrect email or password.")
 
-        data = super().validate(attrs)
-
         refresh = self.get_token(self.user)
+        return {"refresh": str(refresh), "access": str(refresh.access_token)}
 
-        data["refresh"] = str(refresh)
-        data["access"] = str(refresh.access_token)
 
-        return data
+class NestedResolverMixin:
+    """
+    Serializer mixin resolving nested instances in batch through a
+    NestedResolver, shared by serializers given the same nested_resolver
+    context, as in bulk uploads.
+    """
+
+    # Nested field names and their resolver type
+    nested_fields = {}
+
+    def get_resolver(self, user):
+        """ Returns context nested resolver or a new one for the user. """
+        resolver = self.context.get("nested_resolver")
+        if resolver is None:
+            resolver = NestedResolver(user)
+        return resolver
+
+    def get_nested_entries(self, validated_data):
+        """
+        Returns (kind, values) entries of nested validated data, without
+        null values, as expected by NestedResolver.prefetch.
+        """
+        return [
+            (kind, {k: v for k, v in validated_data[field].items() if v is not None})
+            for field, kind in self.nested_fields.items()
+            if validated_data.get(field) is not None
+        ]
 
 
 def get_or_create_brewing(validated_data):
     """
-    Sets defaults for missing input values then returns instance if existing
-    or creates a new one.
+    Sets defaults for missing input values then returns instance if existing,
+    from the brewing cache if known, or creates a new one.
     """
-    if "temperature" not in validated_data or not validated_data["temperature"]:
-        validated_data["temperature"] = 0
-    if "weight" not in validated_data or not validated_data["weight"]:
-        validated_data["weight"] = 0
-    if "initial" not in validated_data or not validated_data["initial"]:
-        validated_data["initial"] = timedelta(seconds=0)
-    if "increments" not in validated_data or not validated_data["increments"]:
-        validated_data["increments"] = timedelta(seconds=0)
-
-    instance, _ = Brewing.objects.get_or_create(**validated_data)
-
-    return instance
+    return get_brewing_cache().get_or_create(validated_data)
 
 
 class BrewingSerializer(serializers.ModelSerializer):
@@ -173,17 +206,20 @@ def get_or_create_origin(validated_data):
         except Origin.DoesNotExist:
             instance = None
 
-    if not instance:  # Create new
+    changed = not instance
+    if not instance:  # Create new, with coordinates of the place if known
         instance = Origin(**validated_data)
+        set_known_coordinates([instance], validated_data["user"])
 
-    # Add latitude and longitude if any as instance might be missing them
-    if "latitude" in validated_data and not instance.latitude:
-        instance.latitude = validated_data["latitude"]
+    # Add latitude and longitude if any as instance might be missing them,
+    # existing ones are saved only then as teas nesting them get modified
+    for field in ("latitude", "longitude"):
+        if field in validated_data and not getattr(instance, field):
+            setattr(instance, field, validated_data[field])
+            changed = True
 
-    if "longitude" in validated_data and not instance.longitude:
-        instance.longitude = validated_data["longitude"]
-
-    instance.save()
+    if changed:
+        instance.save()
 
     return instance
 
@@ -193,7 +229,7 @@ class OriginSerializer(serializers.ModelSerializer):
     Origin model serializer, user based.
     """
 
-    user = serializers.ReadOnlyField(source="user.pk")
+    user = serializers.ReadOnlyField(source="user_id")
 
     class Meta:
         model = Origin
@@ -256,7 +292,7 @@ class SubcategorySerializer(serializers.ModelSerializer):
     brewings and origin.
     """
 
-    user = serializers.ReadOnlyField(source="user.pk")
+    user = serializers.ReadOnlyField(source="user_id")
     gongfu_brewing = BrewingSerializer(required=False, allow_null=True)
     western_brewing = BrewingSerializer(required=False, allow_null=True)
     origin = OriginSerializer(required=False, allow_null=True)
@@ -279,7 +315,7 @@ class VendorSerializer(serializers.ModelSerializer):
     Vendor serializer, user based.
     """
 
-    user = serializers.ReadOnlyField(source="user.pk")
+    user = serializers.ReadOnlyField(source="user_id")
 
     class Meta:
         model = Vendor
@@ -294,14 +330,80 @@ class VendorSerializer(serializers.ModelSerializer):
         return custom_get_or_create(Vendor, validated_data)
 
 
-class TeaSerializer(serializers.ModelSerializer):
+class SelectableFieldsMixin:
+    """
+    Model serializer mixin for field selection. If an expand context list
+    is given, nested objects not listed in it are returned as IDs, read from
+    foreign keys without query, and output is restricted to the fields context
+    list unless None.
+    """
+
+    def get_fields(self):
+        """ Returns selected fields, with nested ones as IDs unless expanded. """
+        fields = super().get_fields()
+        if "expand" not in self.context:
+            return fields
+
+        selected = self.context.get("fields")
+        if selected is not None:
+            for name in list(fields):
+                if name not in selected:
+                    fields.pop(name)
+        for name, field in fields.items():
+            if isinstance(field, serializers.BaseSerializer):
+                if name not in self.context["expand"]:
+                    fields[name] = serializers.ReadOnlyField(source=f"{name}_id")
+        return fields
+
+
+class UploadedImageField(Base64ImageField):
+    """
+    Image field accepting either base64 image data or an uploaded file.
+    Images are normalized, downscaled and recompressed before storage.
+    """
+
+    def to_internal_value(self, data):
+        """ Validates uploaded files as is, without base64 decoding. """
+        if isinstance(data, UploadedFile):
+            image = serializers.ImageField.to_internal_value(self, data)
+        else:
+            image = super().to_internal_value(data)
+        if image is None:
+            return None
+
+        image.seek(0)
+        try:
+            return process_image(image.read())
+        except (OSError, ValueError, Image.DecompressionBombError):
+            self.fail("invalid_image")
+
+
+def save_thumbnails_on_commit(field_file, image):
+    """
+    Saves thumbnails of a stored image once the transaction saving it
+    commits, so that rolled back writes don't leave thumbnails behind.
+    """
+    transaction.on_commit(partial(save_thumbnails, field_file, image))
+
+
+class TeaSerializer(
+    SelectableFieldsMixin, NestedResolverMixin, serializers.ModelSerializer
+):
     """
     Tea serializer. User based with nested brewings, origin, subcategory
-    and vendor. Expects image data as base64.
+    and vendor. Expects image data as base64 or an uploaded file.
     """
 
-    user = serializers.ReadOnlyField(source="user.pk")
-    image = Base64ImageField(required=False, allow_null=True)
+    nested_fields = {
+        "gongfu_brewing": "brewing",
+        "western_brewing": "brewing",
+        "origin": "origin",
+        "subcategory": "subcategory",
+        "vendor": "vendor",
+    }
+
+    user = serializers.ReadOnlyField(source="user_id")
+    image = UploadedImageField(required=False, allow_null=True)
     gongfu_brewing = BrewingSerializer(required=False, allow_null=True)
     western_brewing = BrewingSerializer(required=False, allow_null=True)
     origin = OriginSerializer(required=False, allow_null=True)
@@ -314,10 +416,11 @@ class TeaSerializer(serializers.ModelSerializer):
         read_only_fields = ("user",)
 
     def to_representation(self, instance):
-        """ Returns image relative path. """
+        """ Returns image and thumbnails relative paths. """
         response = super(TeaSerializer, self).to_representation(instance)
-        if instance.image:
+        if "image" in response and instance.image:
             response["image"] = instance.image.url
+            response["thumbnails"] = get_thumbnails_urls(instance.image)
         return response
 
     def extract_nested_fields(self, validated_data):
@@ -382,51 +485,48 @@ class TeaSerializer(serializers.ModelSerializer):
 
         return validated_data, nested_data
 
-    def assign_nested_data(self, instance, nested_data):
+    def assign_nested_data(self, instance, nested_data, user):
         """
-        Creates separate instances for nested fields and assigns them
+        Resolves instances of nested fields in batch and assigns them
         to the provided tea instance.
 
         Args:
             instance: Tea instance.
             nested_data: Dictionary containing nested objects.
+            user: CustomUser instance owning the tea.
         Returns:
             Saved tea instance with nested objects.
         """
-        if "gongfu" in nested_data:
-            instance.gongfu_brewing = get_or_create_brewing(nested_data["gongfu"])
-
-        if "western" in nested_data:
-            instance.western_brewing = get_or_create_brewing(nested_data["western"])
-
-        if "origin" in nested_data:
-            instance.origin = get_or_create_origin(nested_data["origin"])
-
-        if "subcategory" in nested_data:
-            instance.subcategory = custom_get_or_create(
-                Subcategory, nested_data["subcategory"]
-            )
-
-        if "vendor" in nested_data:
-            instance.vendor = custom_get_or_create(Vendor, nested_data["vendor"])
+        fields = {"gongfu": "gongfu_brewing", "western": "western_brewing"}
+        resolver = self.get_resolver(user)
+        entries = {
+            fields.get(key, key): (self.nested_fields[fields.get(key, key)], values)
+            for key, values in nested_data.items()
+        }
+        resolver.prefetch(entries.values())
+        for field, (kind, values) in entries.items():
+            setattr(instance, field, resolver.resolve(kind, values))
 
         instance.save()
         return instance
 
     def create(self, validated_data):
         """
-        Nested create, removes null nested entries and creates separate instances
-        before feeding them to the tea instance.
+        Nested create, removes null nested entries and resolves nested instances
+        before saving the tea instance once.
         """
         unnested_data, nested_data = self.extract_nested_fields(validated_data)
 
-        instance = Tea.objects.create(**unnested_data)
-
-        return self.assign_nested_data(instance, nested_data)
+        instance = self.assign_nested_data(
+            Tea(**unnested_data), nested_data, unnested_data["user"]
+        )
+        if unnested_data.get("image"):
+            save_thumbnails_on_commit(instance.image, unnested_data["image"].image)
+        return instance
 
     def update(self, instance, validated_data):
         """
-        Nested update, removes null nested entries and creates separate instances
+        Nested update, removes null nested entries and resolves nested instances
         before feeding them to the tea instance.
         """
         unnested_data, nested_data = self.extract_nested_fields(validated_data)
@@ -434,15 +534,22 @@ class TeaSerializer(serializers.ModelSerializer):
         for k, v in unnested_data.items():
             setattr(instance, k, v)
 
-        return self.assign_nested_data(instance, nested_data)
+        instance = self.assign_nested_data(instance, nested_data, unnested_data["user"])
+        if unnested_data.get("image"):
+            save_thumbnails_on_commit(instance.image, unnested_data["image"].image)
+        return instance
 
 
-class BrewingSessionSerializer(serializers.ModelSerializer):
+class BrewingSessionSerializer(
+    SelectableFieldsMixin, NestedResolverMixin, serializers.ModelSerializer
+):
     """
     BrewingSession serializer. User based with nested brewing.
     """
 
-    user = serializers.ReadOnlyField(source="user.pk")
+    nested_fields = {"brewing": "brewing"}
+
+    user = serializers.ReadOnlyField(source="user_id")
     brewing = BrewingSerializer(required=False, allow_null=True)
 
     class Meta:
@@ -452,26 +559,28 @@ class BrewingSessionSerializer(serializers.ModelSerializer):
 
     def create(self, validated_data):
         """
-        Nested create, removes null brewing entries and creates a brewing instance
-        before feeding it to the tea instance.
+        Nested create, removes null brewing entries and resolves the brewing
+        instance before saving the session once.
         """
         brewing = {}
 
         if "brewing" in validated_data and validated_data["brewing"] is not None:
             brewing = validated_data.pop("brewing")
 
-        instance = BrewingSession.objects.create(**validated_data)
+        instance = BrewingSession(**validated_data)
 
         if brewing:
-            instance.brewing = get_or_create_brewing(brewing)
+            instance.brewing = self.get_resolver(validated_data["user"]).resolve(
+                "brewing", brewing
+            )
 
         instance.save()
         return instance
 
     def update(self, instance, validated_data):
         """
-        Nested update, removes null brewing entries and creates a brewing instance
-        before feeding it to the tea instance.
+        Nested update, removes null brewing entries and resolves the brewing
+        instance before feeding it to the session instance.
         """
         brewing = {}
 
@@ -482,7 +591,26 @@ class BrewingSessionSerializer(serializers.ModelSerializer):
             setattr(instance, k, v)
 
         if brewing:
-            instance.brewing = get_or_create_brewing(brewing)
+            instance.brewing = self.get_resolver(validated_data["user"]).resolve(
+                "brewing", brewing
+            )
 
         instance.save()
         return instance
+
+
+class ParserJobSerializer(serializers.ModelSerializer):
+    """
+    Parser job serializer, returns result as extracted tea data.
+    """
+
+    class Meta:
+        model = ParserJob
+        fields = ("id", "status", "result", "error", "created_on", "finished_on")
+        read_only_fields = fields
+
+    def to_representation(self, instance):
+        """ Decodes JSON result. """
+        response = super().to_representation(instance)
+        response["result"] = json.loads(instance.result) if instance.result else None
+        return response
@@ -0,0 +1,187 @@
+from django.conf import settings
+from django.core.signals import request_started
+from django.db import connections
+from django.db.models.signals import post_delete, post_init, post_save, pre_delete
+from django.utils import timezone
+from django_cleanup.signals import cleanup_pre_delete
+
+from .brewing_cache import get_brewing_cache
+from .images import delete_thumbnails
+from .lookup_index import invalidate_lookup_index
+from .models import (
+    Brewing,
+    BrewingSession,
+    Category,
+    CategoryName,
+    Origin,
+    Subcategory,
+    SubcategoryName,
+    Tea,
+    Tombstone,
+    Vendor,
+    VendorTrademark,
+)
+from .reference_cache import invalidate_reference_data
+from .sync import NESTED_LOOKUPS, get_nested_values, touch_nested
+
+LOOKUP_INDEX_MODELS = (
+    Category,
+    CategoryName,
+    Subcategory,
+    SubcategoryName,
+    Vendor,
+    VendorTrademark,
+)
+
+
+def catalog_names_changed(sender, instance, created=False, **kwargs):
+    """
+    Invalidates the vision parser lookup index when catalog names change.
+    The shared version is bumped in the same transaction as the change.
+    New private subcategories and vendors aren't indexed, so they're skipped.
+    """
+    if created and not getattr(instance, "is_public", True):
+        return
+    invalidate_lookup_index()
+
+
+for model in LOOKUP_INDEX_MODELS:
+    post_save.connect(catalog_names_changed, sender=model)
+    post_delete.connect(catalog_names_changed, sender=model)
+
+
+def brewing_changed(sender, instance, created=False, **kwargs):
+    """
+    Drops a changed or deleted brewing from the brewing caches of all
+    workers, new brewings don't affect them.
+    """
+    if not created:
+        get_brewing_cache().discard(instance.pk)
+
+
+post_save.connect(brewing_changed, sender=Brewing)
+post_delete.connect(brewing_changed, sender=Brewing)
+
+
+def brewings_expired(**kwargs):
+    """
+    Has the brewing cache check the shared version once per request, for
+    brewings changed by other workers since the previous one.
+    """
+    get_brewing_cache().expire()
+
+
+request_started.connect(brewings_expired)
+
+
+def image_deleted(sender, file, **kwargs):
+    """
+    Deletes thumbnails along with replaced images and images of deleted
+    instances, as django_cleanup deletes the image itself.
+    """
+    delete_thumbnails(file)
+
+
+cleanup_pre_delete.connect(image_deleted)
+
+
+REFERENCE_MODELS = (Category, Subcategory, Vendor)
+
+# Models nested in reference lists, new instances aren't referenced yet
+REFERENCE_NESTED_MODELS = (Brewing, Origin)
+
+
+def reference_data_changed(sender, instance, created=False, **kwargs):
+    """
+    Invalidates cached reference lists when categories, subcategories, vendors
+    or their nested brewings and origins change. New private instances only
+    invalidate their user lists, other changes might affect public ones.
+    """
+    if created and sender in REFERENCE_NESTED_MODELS:
+        return
+    is_public = getattr(instance, "is_public", True)
+    if not is_public:
+        invalidate_reference_data(instance.user_id)
+    if is_public or not created:
+        invalidate_reference_data()
+
+
+for model in REFERENCE_MODELS + REFERENCE_NESTED_MODELS:
+    post_save.connect(reference_data_changed, sender=model)
+    post_delete.connect(reference_data_changed, sender=model)
+
+
+def nested_loaded(sender, instance, **kwargs):
+    """ Keeps field values of a nested instance to compare them on save. """
+    instance._nested_values = get_nested_values(instance)
+
+
+def nested_changed(sender, instance, created=False, **kwargs):
+    """
+    Marks teas and brewing sessions nesting a changed instance as modified
+    for delta syncs, only if a field changed since it was loaded or saved,
+    as public instances are nested by teas of every user. New instances
+    aren't nested yet.
+    """
+    values = get_nested_values(instance)
+    if not created and values != instance._nested_values:
+        touch_nested(sender, [instance.pk])
+    instance._nested_values = values
+
+
+def nested_deleting(sender, instance, **kwargs):
+    """ Marks teas and brewing sessions nesting a deleted instance as modified. """
+    touch_nested(sender, [instance.pk])
+
+
+for model in NESTED_LOOKUPS:
+    post_init.connect(nested_loaded, sender=model)
+    post_save.connect(nested_changed, sender=model)
+    pre_delete.connect(nested_deleting, sender=model)
+
+
+def tea_deleting(sender, instance, **kwargs):
+    """ Marks sessions of a deleted tea as modified, they lose their tea. """
+    BrewingSession.objects.filter(tea=instance).update(modified_on=timezone.now())
+
+
+pre_delete.connect(tea_deleting, sender=Tea)
+
+# Tombstone model choices by synced model
+TOMBSTONE_MODELS = {Tea: Tombstone.TEA, BrewingSession: Tombstone.BREWING_SESSION}
+
+
+def synced_deleted(sender, instance, **kwargs):
+    """
+    Records a tombstone for synced clients whenever a tea or brewing session
+    is deleted, from the API, the admin or a cascade.
+    """
+    Tombstone.objects.create(
+        user_id=instance.user_id,
+        model=TOMBSTONE_MODELS[sender],
+        object_id=instance.pk,
+    )
+
+
+for model in TOMBSTONE_MODELS:
+    post_delete.connect(synced_deleted, sender=model)
+
+
+def check_connections(**kwargs):
+    """
+    Closes persistent database connections which don't answer anymore before
+    a request, if DB_HEALTH_CHECKS setting is on, so that it opens a new one
+    instead of failing on a connection dropped by the server.
+    """
+    if not getattr(settings, "DB_HEALTH_CHECKS", False):
+        return
+    for conn in connections.all():
+        if (
+            conn.connection is not None
+            and not conn.in_atomic_block
+            and not conn.is_usable()
+        ):
+            conn.close()
+
+
+request_started.connect(check_connections)
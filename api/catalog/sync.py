@@ -0,0 +1,153 @@
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.core import signing
+from django.utils import timezone
+
+from .models import Brewing, BrewingSession, Origin, Subcategory, Tea, Tombstone, Vendor
+
+TOKEN_SALT = "catalog.sync"
+
+# Synced models by response key
+SYNC_MODELS = {
+    "teas": (Tea, Tombstone.TEA),
+    "brewing_sessions": (BrewingSession, Tombstone.BREWING_SESSION),
+}
+
+# Lookups from synced models to the nested instances they serialize
+NESTED_LOOKUPS = {
+    Brewing: (
+        (Tea, "gongfu_brewing"),
+        (Tea, "western_brewing"),
+        (Tea, "subcategory__gongfu_brewing"),
+        (Tea, "subcategory__western_brewing"),
+        (BrewingSession, "brewing"),
+    ),
+    Origin: ((Tea, "origin"), (Tea, "subcategory__origin")),
+    Subcategory: ((Tea, "subcategory"),),
+    Vendor: ((Tea, "vendor"),),
+}
+
+
+def get_nested_values(instance):
+    """
+    Returns loaded field values of a nested instance, all serialized in the
+    synced models representation. Deferred fields are left out.
+    """
+    return {
+        field.attname: instance.__dict__[field.attname]
+        for field in instance._meta.concrete_fields
+        if field.attname in instance.__dict__
+    }
+
+
+def touch_nested(model, pks):
+    """
+    Marks teas and brewing sessions nesting changed or deleted instances as
+    modified, so that delta syncs return their new representation.
+
+    Args:
+        model: Nested model class, one of NESTED_LOOKUPS keys.
+        pks: List of changed instances primary keys.
+    """
+    if not pks:
+        return
+    now = timezone.now()
+    for synced_model, lookup in NESTED_LOOKUPS.get(model, ()):
+        synced_model.objects.filter(**{f"{lookup}__in": pks}).update(modified_on=now)
+
+
+def get_sync_token(user, watermark):
+    """
+    Returns a signed opaque token for a user watermark datetime, so that
+    a token left by another user on a shared client leads to a full sync.
+    """
+    return signing.dumps(
+        {"user": str(user.pk), "watermark": watermark.isoformat()}, salt=TOKEN_SALT
+    )
+
+
+def get_token_watermark(user, token):
+    """
+    Returns the watermark datetime of a sync token.
+
+    Args:
+        user: CustomUser instance syncing.
+        token: Token string from a previous sync.
+
+    Returns:
+        Watermark datetime or None if the token belongs to another user.
+
+    Raises:
+        signing.BadSignature: If the token is invalid.
+    """
+    value = signing.loads(token, salt=TOKEN_SALT)
+    try:
+        if value["user"] != str(user.pk):
+            return None
+        return datetime.fromisoformat(value["watermark"])
+    except (KeyError, TypeError, ValueError):
+        raise signing.BadSignature("Invalid sync token")
+
+
+def get_changes(user, since=None, keys=None):
+    """
+    Returns user teas and brewing sessions changed since a watermark, and
+    the ones deleted. The next watermark goes back by SYNC_OVERLAP seconds so
+    that rows committed late with an earlier timestamp aren't missed, clients
+    may get a few rows twice. Without watermark, or if it's older than
+    tombstones retention, everything is returned with a full flag.
+
+    Args:
+        user: CustomUser instance.
+        since: Optional; Watermark datetime.
+        keys: Optional; List of SYNC_MODELS keys to sync, all by default.
+
+    Returns:
+        Dictionary of changed querysets and deleted IDs lists by key, along
+        with full flag and next watermark, for example:
+        {
+            "full": False,
+            "teas": <QuerySet>,
+            "brewing_sessions": <QuerySet>,
+            "deleted": {"teas": [UUID(...)], "brewing_sessions": []},
+            "watermark": datetime(...),
+        }
+    """
+    now = timezone.now()
+    retention = timedelta(days=getattr(settings, "SYNC_TOMBSTONE_RETENTION", 30))
+    full = since is None or since < now - retention
+
+    changes = {"full": full, "deleted": {}}
+    for key in keys or SYNC_MODELS:
+        model, tombstone_model = SYNC_MODELS[key]
+        queryset = model.objects.filter(user=user)
+        tombstones = Tombstone.objects.filter(user=user, model=tombstone_model)
+        if full:
+            deleted = []
+        else:
+            queryset = queryset.filter(modified_on__gte=since)
+            deleted = list(
+                tombstones.filter(deleted_on__gte=since).values_list(
+                    "object_id", flat=True
+                )
+            )
+        changes[key] = queryset.order_by("modified_on")
+        changes["deleted"][key] = deleted
+
+    changes["watermark"] = now - timedelta(seconds=getattr(settings, "SYNC_OVERLAP", 5))
+    return changes
+
+
+def prune_tombstones():
+    """
+    Deletes tombstones older than SYNC_TOMBSTONE_RETENTION days.
+
+    Returns:
+        Integer number of deleted tombstones.
+    """
+    retention = timedelta(days=getattr(settings, "SYNC_TOMBSTONE_RETENTION", 30))
+    deleted, _ = Tombstone.objects.filter(
+        deleted_on__lt=timezone.now() - retention
+    ).delete()
+    return deleted
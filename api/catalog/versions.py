@@ -0,0 +1,33 @@
+import uuid
+
+from .models import CacheVersion
+
+
+def get_version(key):
+    """
+    Returns the shared version of cached data, initializing it if missing.
+
+    Args:
+        key: Cached data key.
+
+    Returns:
+        Version string.
+    """
+    version = (
+        CacheVersion.objects.filter(key=key).values_list("version", flat=True).first()
+    )
+    if version is None:
+        version = CacheVersion.objects.get_or_create(key=key)[0].version
+    return version.hex
+
+
+def bump_version(key):
+    """
+    Sets a new shared version of cached data. Bumped in the transaction
+    changing the data, other workers see both on commit. Missing versions
+    were never handed out, nothing to invalidate, so they aren't created.
+
+    Args:
+        key: Cached data key.
+    """
+    CacheVersion.objects.filter(key=key).update(version=uuid.uuid4())
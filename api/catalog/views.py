@@ -1,12 +1,26 @@
+import json
+import logging
+import uuid
+from binascii import a2b_base64, b2a_base64
+
 import googlemaps
 from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import UploadedFile
 from django.core.mail import EmailMultiAlternatives
-from django.db.models import Q
+from django.core.signing import BadSignature
+from django.db import DatabaseError, transaction
 from django.dispatch import receiver
+from django.http import StreamingHttpResponse
 from django.template.loader import render_to_string
+from django.urls import reverse
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.utils.http import parse_etags
 from django_rest_passwordreset.signals import reset_password_token_created
 from rest_framework import status
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.fields import BooleanField
 from rest_framework.generics import (
     CreateAPIView,
     ListAPIView,
@@ -14,26 +28,54 @@ from rest_framework.generics import (
     RetrieveAPIView,
     UpdateAPIView,
 )
-from rest_framework.permissions import AllowAny
+from rest_framework.parsers import JSONParser
+from rest_framework.permissions import SAFE_METHODS, AllowAny, IsAdminUser
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework.viewsets import ModelViewSet
 from rest_framework_simplejwt.views import TokenObtainPairView
 
-from .models import Brewing, BrewingSession, Category, Origin, Subcategory, Tea, Vendor
+from .batch_parser import BatchParser
+from .models import (
+    Brewing,
+    BrewingSession,
+    Category,
+    Origin,
+    ParserJob,
+    Subcategory,
+    Tea,
+    Vendor,
+)
+from .nested_resolver import NestedResolver
+from .ocr_backends import OcrError, get_ocr_backend
+from .ocr_cache import get_ocr_cache
+from .pagination import CreatedOnCursorPagination
+from .parser_queue import get_parser_queue, is_stale, wait_for_job
+from .parsers import ImageUploadParser, MultiPartJsonParser
+from .places import PlacesError, get_places_result, save_place_coordinates
+from .reference_cache import get_public_data, get_reference_etag
 from .serializers import (
     BrewingSerializer,
     BrewingSessionSerializer,
     CategorySerializer,
     LoginSerializer,
     OriginSerializer,
+    ParserJobSerializer,
     SubcategorySerializer,
     TeaSerializer,
     UserSerializer,
     VendorSerializer,
 )
+from .sync import (
+    SYNC_MODELS,
+    get_changes,
+    get_sync_token,
+    get_token_watermark,
+)
 from .vision_parser import VisionParser
 
+logger = logging.getLogger(__name__)
+
 
 class RegisterView(CreateAPIView):
     """
@@ -149,59 +191,323 @@ class OriginDetailView(RetrieveAPIView):
     serializer_class = OriginSerializer
 
 
-class CategoryView(ListAPIView):
+class CachedReferenceMixin:
+    """
+    List view mixin serving reference data from a versioned cache of public
+    rows, merged with user private ones ordered by ID. Responses carry
+    a strong ETag from cache versions, so that If-None-Match requests are
+    answered with 304 Not Modified without any catalog query.
+    """
+
+    # Reference list name, ID of the cached public data
+    reference_name = None
+
+    def get_public_queryset(self):
+        """ Returns public rows shared by all users. """
+        return self.get_queryset().filter(is_public=True)
+
+    def get_private_queryset(self):
+        """ Returns user private rows, or None if the list has none. """
+        return self.get_queryset().filter(user=self.request.user, is_public=False)
+
+    def list(self, request, *args, **kwargs):
+        """ Returns cached reference list or 304 if not modified. """
+        private = self.get_private_queryset()
+        etag = get_reference_etag(
+            self.reference_name, None if private is None else request.user.pk
+        )
+        if etag in parse_etags(request.META.get("HTTP_IF_NONE_MATCH", "")):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            data = get_public_data(
+                self.reference_name,
+                lambda: self.get_serializer(self.get_public_queryset(), many=True).data,
+            )
+            if private is not None:
+                data = sorted(
+                    data + self.get_serializer(private, many=True).data,
+                    key=lambda item: item["id"],
+                )
+            response = Response(data)
+
+        response["ETag"] = etag
+        patch_cache_control(response, private=True, no_cache=True)
+        patch_vary_headers(response, ("Authorization",))
+        return response
+
+
+class CategoryView(CachedReferenceMixin, ListAPIView):
     """
     List categories view.
     """
 
-    queryset = Category.objects.all()
+    queryset = Category.objects.select_related("gongfu_brewing", "western_brewing")
     serializer_class = CategorySerializer
+    reference_name = "category"
 
+    def get_public_queryset(self):
+        """ Categories are all public. """
+        return self.get_queryset()
 
-class SubcategoryView(ListCreateAPIView):
+    def get_private_queryset(self):
+        """ Categories are all public. """
+        return None
+
+
+class SubcategoryView(CachedReferenceMixin, ListCreateAPIView):
     """
     List and create subcategories view.
     """
 
     serializer_class = SubcategorySerializer
+    reference_name = "subcategory"
 
     def get_queryset(self):
         """ Lists only user owned and public subcategories. """
-        return Subcategory.objects.filter(Q(user=self.request.user) | Q(is_public=True))
+        return Subcategory.objects.owned_or_public(self.request.user).select_related(
+            "origin", "gongfu_brewing", "western_brewing"
+        )
 
     def perform_create(self, serializer):
         """ Passes current user to serializer on create. """
         serializer.save(user=self.request.user)
 
 
-class VendorView(ListCreateAPIView):
+class VendorView(CachedReferenceMixin, ListCreateAPIView):
     """
     List and create vendors view.
     """
 
     serializer_class = VendorSerializer
+    reference_name = "vendor"
 
     def get_queryset(self):
-        """ Lists only user owned and public subcategories. """
-        return Vendor.objects.filter(Q(user=self.request.user) | Q(is_public=True))
+        """ Lists only user owned and public vendors. """
+        return Vendor.objects.owned_or_public(self.request.user)
 
     def perform_create(self, serializer):
         """ Passes current user to serializer on create. """
         serializer.save(user=self.request.user)
 
 
-class TeaViewSet(ModelViewSet):
+class BulkUpsertMixin:
+    """
+    Model view set mixin adding a bulk action, creating or updating a list
+    of user instances at once. Items are validated together, their nested
+    instances resolved in batch, then written in a single transaction,
+    and a status is reported for each of them.
+    """
+
+    @action(detail=False, methods=["post"])
+    def bulk(self, request):
+        """
+        Creates items without ID and updates the ones with the ID of a user
+        instance, up to BULK_MAX_ITEMS. Items the database fails to save get
+        a 503 status, clients may retry them.
+
+        Args:
+            request: Request data, expects a list of instances data.
+
+        Returns:
+            Response object with a list of results in the same order, either
+            instance data or errors, for example:
+            [
+                {"status": 201, "data": {"id": "...", "name": "Foo bar tea"}},
+                {"status": 400, "errors": {"name": ["This field is required."]}},
+                {"status": 404, "errors": {"id": "Not found"}}
+            ]
+            or error info if the list is invalid.
+        """
+        items = request.data
+        if not isinstance(items, list) or not items:
+            return Response(
+                data={"non_field_errors": "Expects a list of instances"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        max_items = getattr(settings, "BULK_MAX_ITEMS", 100)
+        if len(items) > max_items:
+            return Response(
+                data={"non_field_errors": f"Too many instances, {max_items} max"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        # Fetch instances to update in one query
+        ids = set()
+        for item in items:
+            if isinstance(item, dict) and item.get("id"):
+                try:
+                    ids.add(uuid.UUID(str(item["id"])))
+                except ValueError:
+                    pass
+        instances = {
+            str(instance.id): instance
+            for instance in self.get_queryset().filter(id__in=ids)
+        }
+
+        context = self.get_serializer_context()
+        context["nested_resolver"] = resolver = NestedResolver(request.user)
+        results = []
+        valid = []
+        for position, item in enumerate(items):
+            if not isinstance(item, dict):
+                results.append(
+                    {
+                        "status": status.HTTP_400_BAD_REQUEST,
+                        "errors": {"non_field_errors": "Expects an object"},
+                    }
+                )
+                continue
+
+            instance = None
+            if item.get("id"):
+                instance = instances.get(str(item["id"]))
+                if instance is None:
+                    results.append(
+                        {
+                            "status": status.HTTP_404_NOT_FOUND,
+                            "errors": {"id": "Not found"},
+                        }
+                    )
+                    continue
+
+            serializer = self.get_serializer_class()(
+                instance, data=item, context=context
+            )
+            if serializer.is_valid():
+                results.append(None)
+                valid.append((position, serializer))
+            else:
+                results.append(
+                    {
+                        "status": status.HTTP_400_BAD_REQUEST,
+                        "errors": serializer.errors,
+                    }
+                )
+
+        with transaction.atomic():
+            resolver.prefetch(
+                entry
+                for _, serializer in valid
+                for entry in serializer.get_nested_entries(serializer.validated_data)
+            )
+            for position, serializer in valid:
+                created = serializer.instance is None
+                try:
+                    with transaction.atomic():
+                        serializer.save(user=request.user)
+                except DatabaseError:
+                    logger.exception("Bulk item %s failed to save", position)
+                    # Nested instances created in the rolled back savepoint are gone
+                    resolver.clear()
+                    results[position] = {
+                        "status": status.HTTP_503_SERVICE_UNAVAILABLE,
+                        "errors": {"non_field_errors": "Could not save, retry later"},
+                    }
+                    continue
+                code = status.HTTP_201_CREATED if created else status.HTTP_200_OK
+                results[position] = {"status": code, "data": serializer.data}
+
+        return Response(results)
+
+
+class FieldSelectionMixin:
+    """
+    Model view set mixin letting reads select output fields with a comma
+    separated fields query parameter. Nested objects are then returned as IDs
+    unless listed in a comma separated expand query parameter. Only selected
+    columns and expanded relations are loaded.
+    """
+
+    # Relations joined for nested objects, the first name being the field
+    related_fields = ()
+
+    # Fields always loaded, needed by pagination
+    required_fields = ("id", "created_on")
+
+    def initial(self, request, *args, **kwargs):
+        """ Reads field selection of safe requests. """
+        super().initial(request, *args, **kwargs)
+        self.selected_fields = self.expanded_fields = None
+        params = request.query_params
+        if request.method not in SAFE_METHODS:
+            return
+        if "fields" not in params and "expand" not in params:
+            return
+
+        def split(name):
+            return [value for value in params.get(name, "").split(",") if value]
+
+        available = self.get_serializer_class()().fields
+        if "fields" in params:
+            self.selected_fields = split("fields")
+        self.expanded_fields = split("expand")
+        unknown = [
+            name
+            for name in (self.selected_fields or []) + self.expanded_fields
+            if name not in available
+        ]
+        if unknown:
+            raise ValidationError({"fields": f"Unknown fields: {', '.join(unknown)}"})
+
+    def select_fields(self, queryset):
+        """ Returns queryset loading only selected columns and relations. """
+        if self.expanded_fields is None:
+            return queryset.select_related(*self.related_fields)
+
+        selected = self.selected_fields
+        related = [
+            name
+            for name in self.related_fields
+            if name.split("__")[0] in self.expanded_fields
+            and (selected is None or name.split("__")[0] in selected)
+        ]
+        queryset = queryset.select_related(*related)
+        if selected is not None:
+            columns = {field.name for field in queryset.model._meta.concrete_fields}
+            queryset = queryset.only(
+                *self.required_fields, *(name for name in selected if name in columns)
+            )
+        return queryset
+
+    def get_serializer_context(self):
+        """ Passes field selection to serializers. """
+        context = super().get_serializer_context()
+        if getattr(self, "expanded_fields", None) is not None:
+            context["fields"] = self.selected_fields
+            context["expand"] = self.expanded_fields
+        return context
+
+
+# Nested relations serialized with teas
+TEA_RELATED_FIELDS = (
+    "gongfu_brewing",
+    "western_brewing",
+    "origin",
+    "subcategory__origin",
+    "subcategory__gongfu_brewing",
+    "subcategory__western_brewing",
+    "vendor",
+)
+
+
+class TeaViewSet(FieldSelectionMixin, BulkUpsertMixin, ModelViewSet):
     """
-    Tea view set.
+    Tea view set, lists are paginated and output fields can be selected.
     """
 
     lookup_field = "id"
+    related_fields = TEA_RELATED_FIELDS
     serializer_class = TeaSerializer
+    parser_classes = (JSONParser, MultiPartJsonParser)
+    pagination_class = CreatedOnCursorPagination
     http_method_names = ["get", "post", "head", "put", "delete", "options"]
 
     def get_queryset(self):
-        """ Allows access only to user instances. """
-        return Tea.objects.filter(user=self.request.user)
+        """
+        Allows access only to user instances, joining the nested graph of
+        selected fields so that lists take a single query whatever their size.
+        """
+        return self.select_fields(Tea.objects.filter(user=self.request.user))
 
     def perform_create(self, serializer):
         """ Passes current user to serializer on create. """
@@ -214,41 +520,185 @@ class TeaViewSet(ModelViewSet):
 
 class VisionParserView(APIView):
     """
-    Extract tea data view.
+    Extract tea data view. Accepts base64 image data in JSON, a multipart
+    image file or a raw image body.
     """
 
+    parser_classes = (JSONParser, MultiPartJsonParser, ImageUploadParser)
+
     def post(self, request):
         """
-        On post runs base64 image data through vision parser to extract tea info.
+        On post runs image data through vision parser to extract tea info.
+        If async is requested the image is queued instead and a job is returned
+        right away, to be polled through the parser job view at its Location.
 
         Args:
             request: Request data, expects an image field as a base64 image data string
+                or an uploaded file and an optional async boolean field, also
+                accepted as a query parameter.
 
         Returns:
-            Response object with extracted tea data or error info.
+            Response object with extracted tea data, queued job or error info.
+            Text detection errors aren't cached and return a 502.
         """
         try:
-            image_data = request.data["image"].split(",")[1]
+            image = request.data["image"]
+        except KeyError:
+            return Response(
+                data={"image": "Missing image field"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        try:
+            is_async = BooleanField().to_internal_value(
+                request.data.get("async", request.query_params.get("async", False))
+            )
+        except ValidationError:
+            return Response(
+                data={"async": "Must be a valid boolean"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        # Only reading and decoding the image make it invalid, parsing
+        # errors aren't the client's
+        try:
+            if isinstance(image, UploadedFile):
+                image_data = image.read()
+            else:
+                image_data = a2b_base64(image.split(",")[1])
             if not image_data:
                 raise ValueError
-            parser = VisionParser(image_data)
-            tea_data = parser.get_tea_data(max_name_length=50)
-            return Response(tea_data)
-        except (ValueError, IndexError):
+        except (ValueError, IndexError, AttributeError):
             return Response(
                 data={"image": "Invalid image data"}, status=status.HTTP_400_BAD_REQUEST
             )
-        except KeyError as e:
-            key = str(e).strip("'")
+
+        if is_async:
+            job = ParserJob.objects.create(
+                user=request.user,
+                image=b2a_base64(image_data, newline=False).decode(),
+                max_name_length=50,
+            )
+            get_parser_queue().enqueue(job)
             return Response(
-                data={key: f"Missing {key} field"}, status=status.HTTP_400_BAD_REQUEST
+                ParserJobSerializer(job).data,
+                status=status.HTTP_202_ACCEPTED,
+                headers={"Location": reverse("parser_job", kwargs={"id": job.id})},
+            )
+        try:
+            tea_data = VisionParser(image_data).get_tea_data(max_name_length=50)
+        except OcrError:
+            return Response(
+                data={"image": "Text detection failed"},
+                status=status.HTTP_502_BAD_GATEWAY,
+            )
+        return Response(tea_data)
+
+
+class BatchVisionParserView(APIView):
+    """
+    Extract tea data from several images view.
+    """
+
+    def post(self, request):
+        """
+        On post runs a list of base64 images data through the vision parser,
+        up to PARSER_BATCH_MAX_IMAGES. Results are streamed as newline
+        delimited JSON objects, one per image as soon as it's parsed,
+        not necessarily in the same order.
+
+        Args:
+            request: Request data, expects an images field as a list of
+                base64 image data strings.
+
+        Returns:
+            Streaming response of objects with image position and either
+            extracted tea data or error info, for example:
+            {"position": 0, "data": {"name": "Foo bar tea", ...}}
+            {"position": 1, "error": "Invalid image data"}
+            or an error response if the images list is invalid.
+        """
+        images = request.data.get("images")
+        if not images or not isinstance(images, list):
+            return Response(
+                data={"images": "Missing images field"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        max_images = getattr(settings, "PARSER_BATCH_MAX_IMAGES", 50)
+        if len(images) > max_images:
+            return Response(
+                data={"images": f"Too many images, {max_images} max"},
+                status=status.HTTP_400_BAD_REQUEST,
             )
 
+        images_data = []
+        for image in images:
+            try:
+                images_data.append(image.split(",")[1])
+            except (AttributeError, IndexError):
+                images_data.append("")
+
+        parser = BatchParser(images_data, max_name_length=50)
+
+        def stream():
+            for position, tea_data, error in parser.parse():
+                if error:
+                    line = {"position": position, "error": error}
+                else:
+                    line = {"position": position, "data": tea_data}
+                yield json.dumps(line) + "\n"
+
+        return StreamingHttpResponse(stream(), content_type="application/x-ndjson")
+
+
+class ParserJobView(RetrieveAPIView):
+    """
+    Retrieve parser job view. Supports short polling waits with a wait query
+    parameter, in seconds, capped by PARSER_JOB_MAX_WAIT setting.
+    Stale jobs are requeued when polled.
+    """
+
+    lookup_field = "id"
+    serializer_class = ParserJobSerializer
+
+    def get_queryset(self):
+        """ Allows access only to user instances. """
+        return ParserJob.objects.filter(user=self.request.user)
+
+    def get_object(self):
+        """ Waits for the job to be processed if requested. """
+        job = super().get_object()
+        if is_stale(job):
+            get_parser_queue().recover()
+            job.refresh_from_db()
+        try:
+            wait = float(self.request.query_params.get("wait", 0))
+        except ValueError:
+            wait = 0
+        max_wait = getattr(settings, "PARSER_JOB_MAX_WAIT", 2)
+        return wait_for_job(job, min(max(wait, 0), max_wait))
+
+
+class ParserStatsView(APIView):
+    """
+    Vision parser statistics view, staff only. Counters are per process.
+    """
+
+    permission_classes = (IsAdminUser,)
+
+    def get(self, request):
+        """ Returns OCR cache and backend counters. """
+        return Response(
+            {
+                "ocr_cache": get_ocr_cache().stats(),
+                "ocr_backend": get_ocr_backend().stats(),
+            }
+        )
+
 
 class PlacesAutocompleteView(APIView):
     """
     Wrapper view around Places API autocomplete. Groups requests
-    on the same session based on token.
+    on the same session based on token. Served through ASGI, the lookup
+    runs on the event loop before the view.
     """
 
     def post(self, request):
@@ -263,14 +713,9 @@ class PlacesAutocompleteView(APIView):
             Response object with the regions results or error info.
         """
         try:
-            gmaps = googlemaps.Client(key=settings.MAPS_API_KEY)
-            results = gmaps.places_autocomplete(
-                request.data["input"],
-                session_token=request.data["token"],
-                types=["(regions)"],
-            )
+            results = get_places_result(request, "autocomplete")
             return Response(results)
-        except googlemaps.exceptions.ApiError as e:
+        except (googlemaps.exceptions.ApiError, PlacesError) as e:
             return Response(
                 data={"no_field_error": str(e).strip("'")},
                 status=status.HTTP_400_BAD_REQUEST,
@@ -285,7 +730,9 @@ class PlacesAutocompleteView(APIView):
 class PlacesDetailsView(APIView):
     """
     Wrapper view around Places API details. Groups requests
-    on the same session based on token.
+    on the same session based on token. Served through ASGI, the lookup
+    runs on the event loop before the view. Coordinates are saved to
+    public and user owned origins of the place missing them.
     """
 
     def post(self, request):
@@ -301,14 +748,10 @@ class PlacesDetailsView(APIView):
             geometry or error info.
         """
         try:
-            gmaps = googlemaps.Client(key=settings.MAPS_API_KEY)
-            results = gmaps.place(
-                request.data["place_id"],
-                session_token=request.data["token"],
-                fields=["adr_address", "geometry"],
-            )
+            results = get_places_result(request, "details")
+            save_place_coordinates(results, request.user)
             return Response(results)
-        except googlemaps.exceptions.ApiError as e:
+        except (googlemaps.exceptions.ApiError, PlacesError) as e:
             return Response(
                 data={"no_field_error": str(e).strip("'")},
                 status=status.HTTP_400_BAD_REQUEST,
@@ -320,18 +763,21 @@ class PlacesDetailsView(APIView):
             )
 
 
-class BrewingSessionViewSet(ModelViewSet):
+class BrewingSessionViewSet(FieldSelectionMixin, BulkUpsertMixin, ModelViewSet):
     """
-    Brewing session view set.
+    Brewing session view set, lists are paginated and output fields can be
+    selected.
     """
 
     lookup_field = "id"
+    related_fields = ("brewing",)
     serializer_class = BrewingSessionSerializer
+    pagination_class = CreatedOnCursorPagination
     http_method_names = ["get", "post", "head", "put", "delete", "options"]
 
     def get_queryset(self):
-        """ Allows access only to user instances. """
-        return BrewingSession.objects.filter(user=self.request.user)
+        """ Allows access only to user instances, joining brewing if needed. """
+        return self.select_fields(BrewingSession.objects.filter(user=self.request.user))
 
     def perform_create(self, serializer):
         """ Passes current user to serializer on create. """
@@ -340,3 +786,62 @@ class BrewingSessionViewSet(ModelViewSet):
     def perform_update(self, serializer):
         """ Passes current user to serializer on update. """
         serializer.save(user=self.request.user)
+
+
+class SyncView(APIView):
+    """
+    Delta sync view, returns user teas and brewing sessions changed or deleted
+    since the token given by a previous sync.
+    """
+
+    def get(self, request):
+        """
+        Returns changes since the since query parameter token, or everything
+        if missing or invalid. Synced lists can be restricted with a comma
+        separated types query parameter, teas and brewing_sessions by default.
+
+        Args:
+            request: Request with optional since and types query parameters.
+
+        Returns:
+            Response object with changed instances, deleted IDs, a full flag
+            telling if local data should be replaced and the next token,
+            for example:
+            {
+                "full": false,
+                "teas": [{...}],
+                "brewing_sessions": [],
+                "deleted": {"teas": ["..."], "brewing_sessions": []},
+                "token": "..."
+            }
+            or error info.
+        """
+        since = None
+        if request.query_params.get("since"):
+            try:
+                since = get_token_watermark(request.user, request.query_params["since"])
+            except BadSignature:
+                # Tokens signed with a rotated key lead to a full sync
+                since = None
+
+        keys = list(SYNC_MODELS)
+        if request.query_params.get("types"):
+            keys = request.query_params["types"].split(",")
+            if any(key not in SYNC_MODELS for key in keys):
+                return Response(
+                    data={"types": f"Expects {', '.join(SYNC_MODELS)}"},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+
+        changes = get_changes(request.user, since, keys)
+        data = {"full": changes["full"], "deleted": changes["deleted"]}
+        if "teas" in changes:
+            teas = changes["teas"].select_related(*TEA_RELATED_FIELDS)
+            data["teas"] = TeaSerializer(teas, many=True).data
+        if "brewing_sessions" in changes:
+            sessions = changes["brewing_sessions"].select_related("brewing")
+            data["brewing_sessions"] = BrewingSessionSerializer(
+                sessions, many=True
+            ).data
+        data["token"] = get_sync_token(request.user, changes["watermark"])
+        return Response(data)
@@ -1,57 +1,139 @@
 import difflib
+import hashlib
 import re
+import struct
+import zlib
+from array import array
 from binascii import a2b_base64
 
-from google.cloud import vision
+from .lookup_index import get_lookup_index
+from .ocr_backends import get_ocr_backend
+from .ocr_cache import get_ocr_cache
 
-from .models import (
-    Category,
-    CategoryName,
-    Subcategory,
-    SubcategoryName,
-    Vendor,
-    VendorTrademark,
-)
+
+class FlatDocument:
+    """
+    Text detection document flattened to per word arrays, so that parsing
+    stages don't need to walk the Vision response again.
+
+    Attributes:
+        words: List of words as strings.
+        areas: Array of words bounding box areas as floats.
+        confidences: Array of words confidences as floats, 1 if not available.
+        breaks: Array of flags, 1 if the word is followed by an end of line.
+        paragraphs: Array of words paragraph indexes.
+        blocks: Array of words block indexes.
+        block_count: Integer number of blocks in the document.
+    """
+
+    def __init__(self):
+        """
+        Declares empty arrays.
+        """
+        self.words = []
+        self.areas = array("d")
+        self.confidences = array("d")
+        self.breaks = array("b")
+        self.paragraphs = array("i")
+        self.blocks = array("i")
+        self.block_count = 0
+
+    def serialize(self):
+        """
+        Packs the document in a compressed binary format.
+
+        Returns:
+            Serialized document as bytes.
+        """
+        words = "\0".join(self.words).encode()
+        data = b"".join(
+            [
+                struct.pack("<III", len(self.words), self.block_count, len(words)),
+                words,
+                self.areas.tobytes(),
+                self.confidences.tobytes(),
+                self.breaks.tobytes(),
+                self.paragraphs.tobytes(),
+                self.blocks.tobytes(),
+            ]
+        )
+        return zlib.compress(data)
+
+    @classmethod
+    def deserialize(cls, data):
+        """
+        Unpacks a document serialized with the serialize method.
+
+        Args:
+            data: Serialized document as bytes.
+
+        Returns:
+            FlatDocument instance.
+        """
+        data = zlib.decompress(data)
+        flat = cls()
+        count, flat.block_count, words_length = struct.unpack_from("<III", data)
+        offset = struct.calcsize("<III")
+        end = offset + words_length
+        flat.words = data[offset:end].decode().split("\0") if count else []
+        offset = end
+        for values in (
+            flat.areas,
+            flat.confidences,
+            flat.breaks,
+            flat.paragraphs,
+            flat.blocks,
+        ):
+            end = offset + count * values.itemsize
+            values.frombytes(data[offset:end])
+            offset = end
+        return flat
 
 
 class VisionParser:
     """
-    Gets text from an image through Vision API and extracts tea data from it.
+    Gets text from an image through an OCR backend, Vision API by default,
+    and extracts tea data from it.
 
     Attributes:
-        client: Vision API client.
-        image: Vision client image.
+        backend: OCR backend instance.
+        image: Image data as bytes.
         document: Detected text document
+        flat_document: FlatDocument with detected words data.
+        phrases: List of lowercase unique phrases of 1 to 4 words.
+        reduced_data: Reduced version of Vision text detection.
         category: Integer ID of found category.
         subcategory: Integer ID of found subcategory.
         vendor: Integer ID of found vendor.
         tea_data: Dictionary containing all found tea data as well as
             a reduced version of Vision text detection.
-        categories: List of Category instances.
-        categories_names: List of alternative categories names
-            as CategoryName objects.
-        subcategories: List of public Subcategory instances.
-        subcategories_names: List of alternative subcategories names
-            as SubcategoryName objects.
-        vendors: List of Vendor instances.
+        index: Process wide LookupIndex with categories, subcategories
+            and vendors names.
 
     Usage example:
         parser = VisionParser(image_data)
         tea_data = parser.get_tea_data()
     """
 
-    def __init__(self, data):
+    def __init__(self, data, backend=None, index=None):
         """
-        Declares vision client, image and response data attributes,
-        loads relevant objects lists.
+        Declares OCR backend, image and response data attributes,
+        gets the catalog lookup index.
 
         Args:
-            data: Image data as base64 string.
+            data: Image data as base64 string or bytes.
+            backend: Optional; OCR backend instance, defaults to the one
+                configured by OCR_BACKEND setting.
+            index: Optional; LookupIndex instance, defaults to the process
+                wide one.
         """
-        self.client = vision.ImageAnnotatorClient()
-        self.image = vision.types.Image(content=a2b_base64(data))
+        self.backend = backend or get_ocr_backend()
+        self.image = data if isinstance(data, bytes) else a2b_base64(data)
 
         self.document = None
+        self.flat_document = None
+        self.phrases = None
+        self.reduced_data = None
 
         self.category = None
         self.subcategory = None
@@ -59,11 +141,7 @@ class VisionParser:
 
         self.tea_data = {}
 
-        self.categories = Category.objects.all()
-        self.categories_names = CategoryName.objects.all()
-        self.subcategories = Subcategory.objects.filter(is_public=True)
-        self.subcategories_names = SubcategoryName.objects.all()
-        self.vendors = Vendor.objects.filter(is_public=True)
+        self.index = index or get_lookup_index()
 
     def get_tea_data(self, max_name_length=None):
         """
@@ -94,19 +172,18 @@ class VisionParser:
             }
         """
 
-        # Extract tea data
-        self.document = self.document_text_detection()
+        # Extract tea data, unless text detection was already provided
+        if self.flat_document is None:
+            self.flat_document = self.detect_text()
 
         # Reduce detected text data to a more readable format
         self.tea_data["dtd"] = self.reduced_data_parser()
 
-        # Build lists of names to look for
+        # List of categories names to look for in vendor names
         category_names = self.get_categories_lookup()
-        subcategory_names = self.get_subcategories_lookup()
-        vendor_names = self.get_vendors_lookup()
 
         # Search for vendor
-        vendor_match, vendor_confidence = self.find_match(vendor_names)
+        vendor_match, vendor_confidence = self.find_match(self.index.vendor_matcher)
         if vendor_match:
             # Vendor found
             self.vendor = self.get_vendor_from_name(vendor_match)
@@ -123,7 +200,9 @@ class VisionParser:
                 self.tea_data["vendor_confidence"] = vendor_confidence
 
         # Search for a category from the list in the document
-        category_match, category_confidence = self.find_match(category_names)
+        category_match, category_confidence = self.find_match(
+            self.index.category_matcher
+        )
         if category_match:
             # Category found
             self.category = self.get_category_from_name(category_match)
@@ -135,7 +214,9 @@ class VisionParser:
                 self.category = None
 
         # Search for a subcategory from the list in the document
-        subcategory_match, subcategory_confidence = self.find_match(subcategory_names)
+        subcategory_match, subcategory_confidence = self.find_match(
+            self.index.subcategory_matcher
+        )
         if subcategory_match:
             # Subcategory found
             self.subcategory = self.get_subcategory_from_name(subcategory_match)
@@ -180,31 +261,127 @@ class VisionParser:
 
     def document_text_detection(self):
         """
-        Runs document_text_detection through Vision API.
+        Runs document_text_detection through the OCR backend.
 
         Returns:
             Vision client full_text_annotation document.
         """
-        response = self.client.document_text_detection(image=self.image)
-        return response.full_text_annotation
+        return self.backend.document_text_detection(self.image)
 
-    def get_text_detection_word_list(self):
+    def detect_text(self):
         """
-        Returns a list of all words from detected text.
+        Returns flattened text detection of the image. Results are cached by
+        image hash so that a repeated image skips Vision API.
 
         Returns:
-            List of single words as strings.
+            FlatDocument instance.
         """
-        word_list = []
+        flat = self.get_cached_text()
+        if flat is None:
+            flat = self.set_document(self.document_text_detection())
+        return flat
+
+    def get_image_hash(self):
+        """ Returns SHA-256 hex digest of the image. """
+        return hashlib.sha256(self.image).hexdigest()
+
+    def get_cached_text(self):
+        """
+        Returns cached text detection of the image, if any.
+
+        Returns:
+            FlatDocument instance or None.
+        """
+        cached = get_ocr_cache().get(self.get_image_hash())
+        if cached is None:
+            return None
+        return FlatDocument.deserialize(cached)
+
+    def set_document(self, document):
+        """
+        Flattens a text detection document of the image and caches it.
+
+        Args:
+            document: Vision full_text_annotation document.
+
+        Returns:
+            FlatDocument instance.
+        """
+        self.document = document
+        flat = self.flatten_document()
+        get_ocr_cache().set(self.get_image_hash(), flat.serialize())
+        return flat
+
+    def flatten_document(self):
+        """
+        Walks the text detection document once and stores words with
+        their areas, confidences, end of line breaks and positions.
+
+        Returns:
+            FlatDocument instance.
+        """
+        flat = FlatDocument()
+        paragraph_index = 0
         for page in self.document.pages:
             for block in page.blocks:
                 for paragraph in block.paragraphs:
                     for word in paragraph.words:
                         word_string = ""
+                        end_of_phrase = False
                         for symbol in word.symbols:
                             word_string += symbol.text
-                        word_list.append(word_string)
-        return word_list
+                            if symbol.property.detected_break.type in (3, 5):
+                                end_of_phrase = True
+                        flat.words.append(word_string)
+                        flat.areas.append(
+                            self.get_area_from_bounding_box(word.bounding_box)
+                        )
+                        flat.confidences.append(word.confidence or 1)
+                        flat.breaks.append(end_of_phrase)
+                        flat.paragraphs.append(paragraph_index)
+                        flat.blocks.append(flat.block_count)
+                    paragraph_index += 1
+                flat.block_count += 1
+        return flat
+
+    def get_flat_document(self):
+        """
+        Returns the flattened text detection document, flattening it on first use.
+
+        Returns:
+            FlatDocument instance.
+        """
+        if self.flat_document is None:
+            self.flat_document = self.flatten_document()
+        return self.flat_document
+
+    def get_text_detection_word_list(self):
+        """
+        Returns a list of all words from detected text.
+
+        Returns:
+            List of single words as strings.
+        """
+        return self.get_flat_document().words
+
+    def get_phrases(self):
+        """
+        Returns lowercase phrases to match catalog names against, built on first use.
+
+        Returns:
+            List of unique phrases of 1 to 4 words as strings.
+        """
+        if self.phrases is None:
+            words = [word.lower() for word in self.get_text_detection_word_list()]
+            self.phrases = list(
+                dict.fromkeys(
+                    words
+                    + self.combine_words_list(words, 2)
+                    + self.combine_words_list(words, 3)
+                    + self.combine_words_list(words, 4)
+                )
+            )
+        return self.phrases
 
     def combine_words_list(self, word_list, length):
         """
@@ -230,7 +407,7 @@ class VisionParser:
         Returns best match and score ratio if any.
 
         Args:
-            items: List of strings with items to search for.
+            items: NgramIndex of strings with items to search for.
 
         Returns:
             If a match is found it returns a tuple with the matched string and
@@ -238,22 +415,13 @@ class VisionParser:
 
             ("foo bar", 0.8)
         """
-        single_words_list = self.get_text_detection_word_list()
-        combined_words_list = (
-            single_words_list
-            + self.combine_words_list(single_words_list, 2)
-            + self.combine_words_list(single_words_list, 3)
-            + self.combine_words_list(single_words_list, 4)
-        )
-        no_spaces_text = "".join(single_words_list)
-
         # First search for a match in words combos
         highest_score = 0
         best_match = ""
-        for name in combined_words_list:
-            match = difflib.get_close_matches(name.lower(), items, cutoff=0.8)
+        for name in self.get_phrases():
+            match = items.get_close_matches(name, cutoff=0.8)
             if match:
-                score = difflib.SequenceMatcher(None, name.lower(), match[0]).ratio()
+                score = difflib.SequenceMatcher(None, name, match[0]).ratio()
                 if score > highest_score:
                     highest_score = score
                     best_match = match[0]
@@ -263,10 +431,9 @@ class VisionParser:
 
         # If no match then try with no spaces strings
         if highest_score == 0:
-            for item in items:
-                if item.replace(" ", "").lower() in no_spaces_text.lower() and len(
-                    item
-                ) > len(best_match):
+            no_spaces_text = "".join(self.get_text_detection_word_list()).lower()
+            for item, compact_item in items.compact_names:
+                if compact_item in no_spaces_text and len(item) > len(best_match):
                     best_match = item
                     highest_score = 1
 
@@ -330,7 +497,8 @@ class VisionParser:
     def reduced_data_parser(self):
         """
         Reduces text_detection response data structure to help processing the tea name.
-        Determines phrases as chunks with an end of line and drops paragraphs/pages
+        Determines phrases as chunks with an end of line and drops paragraphs/pages.
+        Built once from the flattened document and reused afterwards.
 
         Returns:
             Reduced data structure, for example:
@@ -351,45 +519,42 @@ class VisionParser:
                 ]
             }
         """
-        blocks = []
-
-        for page in self.document.pages:
-            for block in page.blocks:
-                phrases = []
-                for paragraph in block.paragraphs:
-                    phrase_words = []
-                    phrase_area = 0
-                    phrase_confidence = 0
-                    for word in paragraph.words:
-                        end_of_phrase = False
-                        word_area = self.get_area_from_bounding_box(word.bounding_box)
-                        word_string = ""
-                        for symbol in word.symbols:
-                            word_string += symbol.text
-                            if symbol.property.detected_break.type in (3, 5):
-                                end_of_phrase = True
-                        if word.confidence:
-                            phrase_confidence += word.confidence
-                        else:
-                            phrase_confidence += 1
-                        phrase_words.append(word_string)
-                        phrase_area += word_area
-                        if end_of_phrase:
-                            font_size = phrase_area / len("".join(phrase_words))
-                            confidence = phrase_confidence / len(phrase_words)
-                            phrases.append(
-                                {
-                                    "words": phrase_words,
-                                    "font_size": font_size,
-                                    "confidence": confidence,
-                                }
-                            )
-                            phrase_words = []
-                            phrase_area = 0
-                            phrase_confidence = 0
-                blocks.append({"phrases": phrases})
-
-        return {"blocks": blocks}
+        if self.reduced_data is not None:
+            return self.reduced_data
+
+        flat = self.get_flat_document()
+        blocks = [{"phrases": []} for _ in range(flat.block_count)]
+
+        phrase_words = []
+        phrase_area = 0
+        phrase_confidence = 0
+        paragraph = None
+        for i, word_string in enumerate(flat.words):
+            # Phrases don't span across paragraphs
+            if flat.paragraphs[i] != paragraph:
+                paragraph = flat.paragraphs[i]
+                phrase_words = []
+                phrase_area = 0
+                phrase_confidence = 0
+            phrase_confidence += flat.confidences[i]
+            phrase_words.append(word_string)
+            phrase_area += flat.areas[i]
+            if flat.breaks[i]:
+                font_size = phrase_area / len("".join(phrase_words))
+                confidence = phrase_confidence / len(phrase_words)
+                blocks[flat.blocks[i]]["phrases"].append(
+                    {
+                        "words": phrase_words,
+                        "font_size": font_size,
+                        "confidence": confidence,
+                    }
+                )
+                phrase_words = []
+                phrase_area = 0
+                phrase_confidence = 0
+
+        self.reduced_data = {"blocks": blocks}
+        return self.reduced_data
 
     def cleaned_data_parser(self, data):
         """
@@ -431,9 +596,9 @@ class VisionParser:
             vendor_name = re.split(r"(\W)", self.vendor.name.lower())
             vendor_name.append("".join(vendor_name))
             vendor_name.append(self.vendor.name.lower())
-            vendor_trademarks = VendorTrademark.objects.filter(vendor=self.vendor)
+            vendor_trademarks = self.index.vendor_trademarks.get(self.vendor.id)
             if vendor_trademarks:
-                trademark_phrases = [t.name.lower() for t in vendor_trademarks]
+                trademark_phrases = [t.lower() for t in vendor_trademarks]
                 for tp in trademark_phrases:
                     for tw in tp.split(" "):
                         trademark_words.append(tw)
@@ -593,10 +758,9 @@ class VisionParser:
 
         # Change word if similar to subcategory name
         if self.subcategory:
-            alternative_names = SubcategoryName.objects.filter(
-                subcategory__id=self.subcategory.id
+            subcategory_names = list(
+                self.index.subcategory_alternative_names.get(self.subcategory.id, [])
             )
-            subcategory_names = [alt.name for alt in alternative_names]
             subcategory_names += [
                 self.subcategory.name,
                 self.subcategory.translated_name,
@@ -654,40 +818,33 @@ class VisionParser:
 
     def get_subcategories_lookup(self):
         """
-        Builds list of subcategories names to use in match lookup,
+        Returns list of subcategories names to use in match lookup,
         using standard, translated and alternative subcategories names.
 
         Returns:
             List of strings with possible subcategories names.
         """
-        lookup_names = [s.name.lower() for s in self.subcategories]
-        lookup_names += [s.translated_name.lower() for s in self.subcategories]
-        lookup_names += [s.name.lower() for s in self.subcategories_names]
-        return lookup_names
+        return self.index.subcategory_lookup
 
     def get_categories_lookup(self):
         """
-        Builds list of categories names to use in match lookup,
+        Returns list of categories names to use in match lookup,
         using standard and alternative categories names.
 
         Returns:
             List of strings with possible categories names.
         """
-        lookup_names = [c.name.lower() for c in self.categories]
-        lookup_names += [c.name.lower() for c in self.categories_names]
-        return lookup_names
+        return self.index.category_lookup
 
     def get_vendors_lookup(self):
         """
-        Builds list of vendors names to use in match lookup,
+        Returns list of vendors names to use in match lookup,
         using vendors names and websites.
 
         Returns:
             List of strings with possible vendor names.
         """
-        lookup_names = [v.name.lower() for v in self.vendors]
-        lookup_names += [v.website.lower() for v in self.vendors]
-        return lookup_names
+        return self.index.vendor_lookup
 
     def get_subcategory_from_name(self, name):
         """
@@ -698,20 +855,7 @@ class VisionParser:
         Returns:
             Subcategory object.
         """
-        sub = next(
-            (s.subcategory for s in self.subcategories_names if s.name.lower() == name),
-            None,
-        )
-        if not sub:
-            sub = next(
-                (
-                    s
-                    for s in self.subcategories
-                    if s.name.lower() == name or s.translated_name.lower() == name
-                ),
-                None,
-            )
-        return sub
+        return self.index.get_subcategory(name)
 
     def get_category_from_name(self, name):
         """
@@ -722,12 +866,7 @@ class VisionParser:
         Returns:
             Category object.
         """
-        sub = next(
-            (c.category for c in self.categories_names if c.name.lower() == name), None,
-        )
-        if not sub:
-            sub = next((c for c in self.categories if c.name.lower() == name), None,)
-        return sub
+        return self.index.get_category(name)
 
     def get_vendor_from_name(self, name):
         """
@@ -738,12 +877,4 @@ class VisionParser:
         Returns:
             Vendor object.
         """
-        sub = next(
-            (
-                v
-                for v in self.vendors
-                if v.name.lower() == name or v.website.lower() == name
-            ),
-            None,
-        )
-        return sub
+        return self.index.get_vendor(name)
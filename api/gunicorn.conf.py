@@ -0,0 +1,18 @@
+"""
+Gunicorn settings, loaded from the working directory. Workers run requests
+in GUNICORN_THREADS threads if more than one, sharing the database pool of
+catalog.postgresql_pool SQL_ENGINE, see SQL_POOL_MIN_SIZE and
+SQL_POOL_MAX_SIZE. The pool must allow a connection per thread.
+"""
+import os
+
+workers = int(os.environ.get("GUNICORN_WORKERS", default=1))
+threads = int(os.environ.get("GUNICORN_THREADS", default=1))
+worker_class = "gthread" if threads > 1 else "sync"
+
+if os.environ.get("SQL_ENGINE") == "catalog.postgresql_pool":
+    pool_max_size = int(os.environ.get("SQL_POOL_MAX_SIZE", default=16))
+    if threads > pool_max_size:
+        raise RuntimeError(
+            f"GUNICORN_THREADS ({threads}) exceeds SQL_POOL_MAX_SIZE ({pool_max_size})"
+        )
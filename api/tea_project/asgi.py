@@ -2,6 +2,8 @@
 ASGI config for tea_project project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Places proxy lookups run on the event loop, see catalog.places.PlacesASGIHandler.
+Served with gunicorn -k uvicorn.workers.UvicornWorker tea_project.asgi:application
 
 For more information on this file, see
 https://docs.djangoproject.com/en/3.0/howto/deployment/asgi/
@@ -9,8 +11,12 @@ https://docs.djangoproject.com/en/3.0/howto/deployment/asgi/
 
 import os
 
-from django.core.asgi import get_asgi_application
+import django
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "tea_project.settings")
 
-application = get_asgi_application()
+django.setup(set_prefix=False)
+
+from catalog.places import PlacesASGIHandler  # noqa: E402
+
+application = PlacesASGIHandler()
@@ -112,9 +112,32 @@ DATABASES = {
         "PASSWORD": SQL_PASSWORD,
         "HOST": os.environ.get("SQL_HOST"),
         "PORT": os.environ.get("SQL_PORT"),
+        # Seconds to keep connections open between requests
+        "CONN_MAX_AGE": int(os.environ.get("SQL_CONN_MAX_AGE", default=0)),
     }
 }
 
+# Check reused connections before requests, and pooled ones when borrowed
+DB_HEALTH_CHECKS = int(os.environ.get("SQL_HEALTH_CHECKS", default=0))
+
+# Per-process pool of catalog.postgresql_pool SQL_ENGINE, for threaded workers,
+# keeping up to DB_POOL_MIN_SIZE idle connections out of DB_POOL_MAX_SIZE
+DB_POOL_MIN_SIZE = int(os.environ.get("SQL_POOL_MIN_SIZE", default=4))
+DB_POOL_MAX_SIZE = int(os.environ.get("SQL_POOL_MAX_SIZE", default=16))
+# Seconds threads wait for a pooled connection when all are borrowed
+DB_POOL_TIMEOUT = int(os.environ.get("SQL_POOL_TIMEOUT", default=30))
+
+# Local memory cache of each process, and a cache shared by all workers
+# through the database, its table is created by catalog migrations
+CACHES = {
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+    "shared": {
+        "BACKEND": "django.core.cache.backends.db.DatabaseCache",
+        "LOCATION": "catalog_cache",
+        "OPTIONS": {"MAX_ENTRIES": 10000},
+    },
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/3.0/ref/settings/#auth-password-validators
@@ -152,6 +175,17 @@ MEDIA_URL = "/media/"
 STATIC_ROOT = os.path.join(BASE_DIR, "static")
 MEDIA_ROOT = os.path.join(BASE_DIR, "media")
 
+# Uploaded images above this size are streamed to a temporary file
+FILE_UPLOAD_MAX_MEMORY_SIZE = int(
+    os.environ.get("FILE_UPLOAD_MAX_MEMORY_SIZE", default=512 * 2 ** 10)
+)
+
+# Stored images are oriented, downscaled and recompressed, with thumbnails
+IMAGE_FORMAT = "JPEG"
+IMAGE_QUALITY = 85
+IMAGE_MAX_SIZE = 2048
+IMAGE_THUMBNAIL_SIZES = (128, 512)
+
 PROJECT_ID = os.environ.get("PROJECT_ID")
 
 if PROJECT_ID:
@@ -165,18 +199,82 @@ if PROJECT_ID:
 
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": (
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
+        "catalog.authentication.TokenUserAuthentication",
         "rest_framework.authentication.SessionAuthentication",
     ),
     "DEFAULT_PERMISSION_CLASSES": ("rest_framework.permissions.IsAuthenticated",),
 }
 
+# Cursor pagination of teas and brewing sessions lists
+API_PAGE_SIZE = 50
+API_MAX_PAGE_SIZE = 200
+
+# Bulk uploads of teas and brewing sessions
+BULK_MAX_ITEMS = 100
+
+# Brewings interned by each process, by unique_brewing fields
+BREWING_CACHE_MAX_SIZE = int(os.environ.get("BREWING_CACHE_MAX_SIZE", default=1024))
+
+# Public categories, subcategories and vendors lists, cached until changed
+REFERENCE_CACHE_TIMEOUT = 86400
+
+# Delta sync, deletions older than retention days require a full sync
+SYNC_TOMBSTONE_RETENTION = 30
+SYNC_OVERLAP = 5
+
 SIMPLE_JWT = {
     "ACCESS_TOKEN_LIFETIME": datetime.timedelta(minutes=5),
     "REFRESH_TOKEN_LIFETIME": datetime.timedelta(days=1),
     "USER_ID_CLAIM": "id",
 }
 
+# Places API proxy, connections are shared by lookups of each process
+PLACES_TIMEOUT = 10
+PLACES_MAX_CONNECTIONS = int(os.environ.get("PLACES_MAX_CONNECTIONS", default=100))
+PLACES_QUERIES_PER_SECOND = 100
+
+# Places lookup results shared by users in each process, least recently used
+# evicted over PLACES_CACHE_MAX_SIZE entries. A cache alias, as shared, adds
+# a second tier shared by workers, queried on local misses
+PLACES_CACHE_TIMEOUT = int(os.environ.get("PLACES_CACHE_TIMEOUT", default=86400))
+PLACES_CACHE_MAX_SIZE = int(os.environ.get("PLACES_CACHE_MAX_SIZE", default=10000))
+PLACES_CACHE_ALIAS = os.environ.get("PLACES_CACHE_ALIAS")
+
+# Authenticate API requests from access token claims, without user query
+JWT_TOKEN_USER = int(os.environ.get("JWT_TOKEN_USER", default=0))
+
+# Vision parser jobs queue, runs jobs in web processes threads by default,
+# DatabaseParserQueue needs parser_worker processes running
+PARSER_QUEUE_BACKEND = os.environ.get(
+    "PARSER_QUEUE_BACKEND", "catalog.parser_queue.ThreadParserQueue"
+)
+PARSER_QUEUE_THREADS = int(os.environ.get("PARSER_QUEUE_THREADS", default=4))
+PARSER_JOB_MAX_WAIT = 2
+# Running jobs are requeued after timeout seconds, finished ones are deleted
+# after retention days by prune_parser_jobs command
+PARSER_JOB_TIMEOUT = 300
+PARSER_JOB_MAX_ATTEMPTS = 3
+PARSER_JOB_RETENTION = 1
+
+# Batch parser endpoint limits, threads bound concurrent text detection calls
+PARSER_BATCH_MAX_IMAGES = 50
+PARSER_BATCH_THREADS = int(os.environ.get("PARSER_BATCH_THREADS", default=8))
+
+# Vision text detection cache, local to each process unless a cache alias is set
+OCR_CACHE_TIMEOUT = int(os.environ.get("OCR_CACHE_TIMEOUT", default=86400))
+OCR_CACHE_MAX_SIZE = int(os.environ.get("OCR_CACHE_MAX_SIZE", default=64 * 2 ** 20))
+OCR_CACHE_ALIAS = os.environ.get("OCR_CACHE_ALIAS")
+
+# Text detection backend, catalog.ocr_backends.FixtureOcrBackend replays
+# recorded Vision responses from OCR_FIXTURES_DIR, required, for offline use
+OCR_BACKEND = os.environ.get("OCR_BACKEND", "catalog.ocr_backends.VisionOcrBackend")
+OCR_FIXTURES_DIR = os.environ.get("OCR_FIXTURES_DIR")
+OCR_FIXTURES_CYCLE = int(os.environ.get("OCR_FIXTURES_CYCLE", default=0))
+OCR_FIXTURES_RECORD = int(os.environ.get("OCR_FIXTURES_RECORD", default=0))
+
+# Vision text detection doesn't need more, larger images are downscaled
+OCR_IMAGE_MAX_SIZE = 1600
+
 EMAIL_HOST = "smtp.sendgrid.net"
 EMAIL_HOST_USER = "apikey"
 EMAIL_HOST_PASSWORD = SENDGRID_API_KEY
@@ -19,6 +19,7 @@ from rest_framework import routers
 from rest_framework_simplejwt.views import TokenRefreshView
 
 from catalog.views import (
+    BatchVisionParserView,
     BrewingCreateView,
     BrewingDetailView,
     BrewingSessionViewSet,
@@ -26,10 +27,13 @@ from catalog.views import (
     LoginView,
     OriginCreateView,
     OriginDetailView,
+    ParserJobView,
+    ParserStatsView,
     PlacesAutocompleteView,
     PlacesDetailsView,
     RegisterView,
     SubcategoryView,
+    SyncView,
     TeaViewSet,
     UpdatePasswordView,
     UserView,
@@ -63,7 +67,11 @@ urlpatterns = [
     path("api/subcategory/", SubcategoryView.as_view(), name="subcategory_list_create"),
     path("api/vendor/", VendorView.as_view(), name="vendor_list_create"),
     path("api/", include(router.urls)),
+    path("api/sync/", SyncView.as_view(), name="sync"),
     path("api/parser/", VisionParserView.as_view(), name="parser"),
+    path("api/parser/batch/", BatchVisionParserView.as_view(), name="parser_batch"),
+    path("api/parser/<uuid:id>/", ParserJobView.as_view(), name="parser_job"),
+    path("api/parser/stats/", ParserStatsView.as_view(), name="parser_stats"),
     path(
         "api/places/autocomplete/",
         PlacesAutocompleteView.as_view(),
@@ -0,0 +1,131 @@
+import base64
+import hashlib
+import json
+
+import pytest
+from django.test import override_settings
+from google.cloud import vision
+
+from catalog.batch_parser import BatchParser
+from catalog.ocr_backends import FixtureOcrBackend, VisionOcrBackend
+from catalog.ocr_cache import get_ocr_cache
+
+from .test_ocr_backends import catalog, encoded_image, fixture_settings  # noqa: F401
+from .test_views import auth_override
+
+
+@pytest.fixture(scope="function")
+@pytest.mark.django_db
+def token(client):
+    resp = client.post(
+        "/api/register/",
+        {"email": "test@test.com", "password1": "pAzzw0rd!", "password2": "pAzzw0rd!"},
+        content_type="application/json",
+    )
+    resp = client.post(
+        "/api/login/",
+        {"email": "test@test.com", "password": "pAzzw0rd!"},
+        content_type="application/json",
+    )
+    return resp.data["access"]
+
+
+class CountingBackend(FixtureOcrBackend):
+    batch_size = 2
+
+    def __init__(self):
+        super().__init__("tests/test_media/ocr", cycle=True, record=False)
+        self.batches = []
+
+    def batch_document_text_detection(self, contents):
+        self.batches.append(len(contents))
+        return super().batch_document_text_detection(contents)
+
+
+class FailingFirstImageClient:
+    def batch_annotate_images(self, requests):
+        response = vision.types.BatchAnnotateImagesResponse()
+        for i, _ in enumerate(requests):
+            image_response = response.responses.add()
+            if i == 0:
+                image_response.error.message = "Bad image data"
+        return response
+
+
+class FailingFirstImageBackend(VisionOcrBackend):
+    def create_client(self):
+        return FailingFirstImageClient()
+
+
+@override_settings(REST_FRAMEWORK=auth_override, **fixture_settings)
+@pytest.mark.django_db
+def test_batch_parser_view_streams_results(client, token, catalog):  # noqa: F811
+    image = "data:image/jpeg;base64," + encoded_image("tests/test_media/test_image.jpg")
+    resp = client.post(
+        "/api/parser/batch/",
+        {"images": [image, "data:image/png;base64,", image, "foo"]},
+        content_type="application/json",
+        HTTP_AUTHORIZATION=f"Bearer {token}",
+    )
+    assert resp.status_code == 200
+    assert resp["Content-Type"] == "application/x-ndjson"
+    lines = [
+        json.loads(line)
+        for line in b"".join(resp.streaming_content).decode().splitlines()
+    ]
+    results = {line["position"]: line for line in lines}
+    assert sorted(results) == [0, 1, 2, 3]
+    assert results[1]["error"] == "Invalid image data"
+    assert results[3]["error"] == "Invalid image data"
+    assert results[0]["data"]["name"] == "Undercover Dhp"
+    assert results[0]["data"] == results[2]["data"]
+    # Identical images share one text detection
+    assert get_ocr_cache().stats()["entries"] == 1
+
+
+@override_settings(REST_FRAMEWORK=auth_override, PARSER_BATCH_MAX_IMAGES=1)
+@pytest.mark.django_db
+def test_batch_parser_view_invalid_images(client, token):
+    for data in ({}, {"images": "foo"}, {"images": ["foo", "bar"]}):
+        resp = client.post(
+            "/api/parser/batch/",
+            data,
+            content_type="application/json",
+            HTTP_AUTHORIZATION=f"Bearer {token}",
+        )
+        assert resp.status_code == 400
+        assert "images" in resp.data
+
+
+@override_settings(**fixture_settings)
+@pytest.mark.django_db
+def test_batch_parser_fans_out_batches(catalog):  # noqa: F811
+    backend = CountingBackend()
+    images = [base64.b64encode(f"image {i}".encode()).decode() for i in range(3)]
+    results = list(BatchParser(images, backend=backend).parse())
+    assert sorted(position for position, _, _ in results) == [0, 1, 2]
+    assert all(error is None for _, _, error in results)
+    assert sorted(backend.batches) == [1, 2]
+
+    # Text detection is cached for the next batch
+    results = list(BatchParser(images, backend=backend).parse())
+    assert len(results) == 3
+    assert sorted(backend.batches) == [1, 2]
+
+
+@pytest.mark.django_db
+def test_batch_parser_reports_failed_images(catalog):  # noqa: F811
+    images = [
+        base64.b64encode(f"failing image {i}".encode()).decode() for i in range(2)
+    ]
+    results = {
+        position: (tea_data, error)
+        for position, tea_data, error in BatchParser(
+            images, backend=FailingFirstImageBackend()
+        ).parse()
+    }
+    assert results[0] == (None, "Text detection failed")
+    assert results[1][1] is None
+    # Failed images aren't cached
+    assert get_ocr_cache().get(hashlib.sha256(b"failing image 0").hexdigest()) is None
+    assert get_ocr_cache().get(hashlib.sha256(b"failing image 1").hexdigest())
@@ -0,0 +1,82 @@
+from datetime import timedelta
+
+import pytest
+from django.core.signals import request_started
+from django.db import connection, transaction
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+
+from catalog.brewing_cache import BrewingCache, get_brewing_cache
+from catalog.models import Brewing
+from catalog.serializers import get_or_create_brewing
+
+
+@override_settings(BREWING_CACHE_MAX_SIZE=2)
+@pytest.mark.django_db(transaction=True)
+def test_brewing_cache_interns_brewings():
+    brewing = get_or_create_brewing({"temperature": 95, "weight": 5.04})
+    assert brewing.weight == 5.0
+
+    # Identical brewings, after weight truncation, don't cost any query
+    with CaptureQueriesContext(connection) as context:
+        for weight in (5, 5.0, 5.01):
+            values = {"temperature": 95, "weight": weight}
+            assert get_or_create_brewing(values) == brewing
+    assert len(context) == 0
+    assert get_brewing_cache().stats() == {"hits": 3, "misses": 1, "entries": 1}
+
+    # The shared version is checked once per request
+    request_started.send(sender=None)
+    with CaptureQueriesContext(connection) as context:
+        get_or_create_brewing({"temperature": 95, "weight": 5})
+        get_or_create_brewing({"temperature": 95, "weight": 5})
+    assert len(context) == 1
+    assert "catalog_cacheversion" in context.captured_queries[0]["sql"]
+
+    # Least recently used brewing is evicted
+    get_or_create_brewing({"temperature": 90})
+    get_or_create_brewing({"initial": timedelta(seconds=20)})
+    assert get_brewing_cache().stats()["entries"] == 2
+    with CaptureQueriesContext(connection) as context:
+        get_or_create_brewing({"temperature": 95, "weight": 5})
+    assert len(context) == 1
+
+    # Deleted brewings are dropped
+    brewing.delete()
+    assert get_or_create_brewing({"temperature": 95, "weight": 5}).pk != brewing.pk
+
+
+@pytest.mark.django_db(transaction=True)
+def test_brewing_cache_ignores_rolled_back_brewings():
+    cache = BrewingCache()
+    with pytest.raises(RuntimeError):
+        with transaction.atomic():
+            cache.get_or_create({"temperature": 80})
+            raise RuntimeError
+    assert cache.stats()["entries"] == 0
+    assert not Brewing.objects.exists()
+
+    with transaction.atomic():
+        brewing = cache.get_or_create({"temperature": 80})
+        assert cache.stats()["entries"] == 0
+    assert cache.get_many([(80, 0.0, timedelta(0), timedelta(0))]) == {
+        (80, 0.0, timedelta(0), timedelta(0)): brewing
+    }
+
+
+@pytest.mark.django_db(transaction=True)
+def test_brewing_cache_drops_brewings_changed_by_other_workers():
+    cache = BrewingCache()
+    brewing = cache.get_or_create({"temperature": 80})
+    key = (80, 0.0, timedelta(0), timedelta(0))
+    assert cache.get_many([key]) == {key: brewing}
+
+    # Deleted through the process wide cache, as by another worker
+    Brewing.objects.get(pk=brewing.pk).delete()
+    assert cache.entries
+    assert cache.get_many([key]) == {key: brewing}
+
+    # Dropped once the next request checks the version
+    cache.expire()
+    assert cache.get_many([key]) == {}
+    assert cache.get_or_create({"temperature": 80}).pk != brewing.pk
@@ -0,0 +1,143 @@
+import pytest
+from django.db import DatabaseError, connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+
+from catalog.models import (
+    Brewing,
+    BrewingSession,
+    Category,
+    CustomUser,
+    Origin,
+    Subcategory,
+    Tea,
+    Vendor,
+)
+from catalog.serializers import BrewingSessionSerializer
+
+from .test_views import auth_override
+
+
+@pytest.fixture(scope="function")
+@pytest.mark.django_db
+def token(client):
+    resp = client.post(
+        "/api/register/",
+        {"email": "test@test.com", "password1": "pAzzw0rd!", "password2": "pAzzw0rd!"},
+        content_type="application/json",
+    )
+    resp = client.post(
+        "/api/login/",
+        {"email": "test@test.com", "password": "pAzzw0rd!"},
+        content_type="application/json",
+    )
+    return resp.data["access"]
+
+
+@override_settings(REST_FRAMEWORK=auth_override)
+@pytest.mark.django_db
+def test_tea_bulk_upsert(client, token):
+    category = Category.objects.create(name="OOLONG")
+    user = CustomUser.objects.get(email="test@test.com")
+    origin = Origin.objects.create(user=user, country="China", is_public=True)
+    Subcategory.objects.create(
+        user=user, name="Test subcategory", origin=origin, is_public=True
+    )
+    resp = client.post(
+        "/api/tea/",
+        {"name": "Existing tea"},
+        content_type="application/json",
+        HTTP_AUTHORIZATION=f"Bearer {token}",
+    )
+    existing_id = resp.data["id"]
+
+    items = [
+        {
+            "name": "Tea 1",
+            "category": category.id,
+            "gongfu_brewing": {"temperature": 95},
+            "subcategory": {"name": "Test subcategory", "origin": {"country": "China"}},
+            "vendor": {"name": "Test vendor"},
+        },
+        {
+            "name": "Tea 2",
+            "gongfu_brewing": {"temperature": 95},
+            "subcategory": {"name": "Test subcategory", "origin": {"country": "China"}},
+            "vendor": {"name": "Test vendor"},
+        },
+        {"id": existing_id, "name": "Updated tea"},
+        {"name": ""},
+        {"id": "11111111-1111-1111-1111-111111111111", "name": "Unknown tea"},
+        "foo",
+    ]
+    resp = client.post(
+        "/api/tea/bulk/",
+        items,
+        content_type="application/json",
+        HTTP_AUTHORIZATION=f"Bearer {token}",
+    )
+    assert resp.status_code == 200
+    assert [r["status"] for r in resp.data] == [201, 201, 200, 400, 404, 400]
+    assert resp.data[0]["data"]["vendor"]["id"] == resp.data[1]["data"]["vendor"]["id"]
+    assert resp.data[2]["data"]["name"] == "Updated tea"
+    assert "name" in resp.data[3]["errors"]
+    assert Tea.objects.count() == 3
+    assert Vendor.objects.count() == 1
+    assert Subcategory.objects.count() == 1
+    assert Origin.objects.count() == 1
+    assert Brewing.objects.filter(temperature=95).count() == 1
+
+
+@override_settings(REST_FRAMEWORK=auth_override, BULK_MAX_ITEMS=2)
+@pytest.mark.django_db
+def test_bulk_invalid_lists(client, token):
+    for data in ({"name": "foo"}, [], [{}, {}, {}]):
+        resp = client.post(
+            "/api/brewing_session/bulk/",
+            data,
+            content_type="application/json",
+            HTTP_AUTHORIZATION=f"Bearer {token}",
+        )
+        assert resp.status_code == 400
+
+
+@override_settings(REST_FRAMEWORK=auth_override)
+@pytest.mark.django_db
+def test_brewing_session_bulk_upsert_shares_nested_instances(client, token):
+    items = [{"brewing": {"temperature": 90, "weight": 5}} for _ in range(10)]
+    with CaptureQueriesContext(connection) as context:
+        resp = client.post(
+            "/api/brewing_session/bulk/",
+            items,
+            content_type="application/json",
+            HTTP_AUTHORIZATION=f"Bearer {token}",
+        )
+    assert [r["status"] for r in resp.data] == [201] * 10
+    assert BrewingSession.objects.count() == 10
+    brewing_queries = [
+        q for q in context.captured_queries if 'FROM "catalog_brewing"' in q["sql"]
+    ]
+    # One lookup and one fetch of the brewing inserted for all sessions
+    assert len(brewing_queries) == 2
+
+
+@override_settings(REST_FRAMEWORK=auth_override)
+@pytest.mark.django_db
+def test_bulk_database_errors_are_retryable(client, token, monkeypatch):
+    create = BrewingSessionSerializer.create
+
+    def failing_create(self, validated_data):
+        if validated_data.get("name") == "Failing":
+            raise DatabaseError("secret details")
+        return create(self, validated_data)
+
+    monkeypatch.setattr(BrewingSessionSerializer, "create", failing_create)
+    resp = client.post(
+        "/api/brewing_session/bulk/",
+        [{"name": "Failing"}, {"name": "Saved"}],
+        content_type="application/json",
+        HTTP_AUTHORIZATION=f"Bearer {token}",
+    )
+    assert [r["status"] for r in resp.data] == [503, 201]
+    assert "secret" not in str(resp.data[0]["errors"])
+    assert BrewingSession.objects.get().name == "Saved"
@@ -0,0 +1,57 @@
+import threading
+
+import psycopg2
+import pytest
+from django.core.signals import request_started
+from django.db import connection
+from django.test import override_settings
+
+from catalog.postgresql_pool.base import BlockingConnectionPool, get_pool
+
+
+@pytest.mark.django_db(transaction=True)
+def test_health_checks_close_unusable_connections(monkeypatch):
+    closed = []
+    connection.ensure_connection()
+    # Persistent connection, not closed at the end of requests
+    monkeypatch.setattr(connection, "close_at", None)
+    monkeypatch.setattr(connection, "is_usable", lambda: False)
+    monkeypatch.setattr(connection, "close", lambda: closed.append(connection.alias))
+
+    with override_settings(DB_HEALTH_CHECKS=0):
+        request_started.send(sender=None)
+    assert closed == []
+
+    with override_settings(DB_HEALTH_CHECKS=1):
+        request_started.send(sender=None)
+    assert closed == ["default"]
+
+
+class FakeConnection:
+    closed = 0
+
+    def close(self):
+        self.closed = 1
+
+
+def test_pool_waits_for_returned_connections(monkeypatch):
+    monkeypatch.setattr(psycopg2, "connect", lambda *args, **kwargs: FakeConnection())
+    pool = BlockingConnectionPool(0, 1)
+    borrowed = pool.getconn()
+
+    # All connections borrowed, instead of PoolError
+    with pytest.raises(psycopg2.OperationalError):
+        pool.getconn(timeout=0.01)
+
+    timer = threading.Timer(0.05, pool.putconn, [borrowed])
+    timer.start()
+    assert pool.getconn(timeout=5) is not borrowed
+    timer.join()
+
+
+def test_pools_are_kept_by_connection_parameters(monkeypatch):
+    monkeypatch.setattr(psycopg2, "connect", lambda *args, **kwargs: FakeConnection())
+    with override_settings(DB_POOL_MIN_SIZE=0):
+        pool = get_pool("default", {"database": "tea"})
+        assert get_pool("default", {"database": "tea"}) is pool
+        assert get_pool("default", {"database": "test_tea"}) is not pool
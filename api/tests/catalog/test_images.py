@@ -0,0 +1,170 @@
+import base64
+import os
+import shutil
+from io import BytesIO, StringIO
+
+import pytest
+from django.conf import settings
+from django.core.management import call_command
+from django.db import transaction
+from django.test import override_settings
+from PIL import Image
+
+from catalog.images import prepare_ocr_image, process_image
+from catalog.models import CustomUser, Tea
+from catalog.serializers import TeaSerializer
+
+from .test_views import auth_override
+
+
+@pytest.fixture(scope="function")
+@pytest.mark.django_db
+def token(client):
+    resp = client.post(
+        "/api/register/",
+        {"email": "test@test.com", "password1": "pAzzw0rd!", "password2": "pAzzw0rd!"},
+        content_type="application/json",
+    )
+    resp = client.post(
+        "/api/login/",
+        {"email": "test@test.com", "password": "pAzzw0rd!"},
+        content_type="application/json",
+    )
+    return resp.data["access"]
+
+
+def make_image(size, image_format="PNG", orientation=None):
+    image = Image.new("RGB", size, "white")
+    output = BytesIO()
+    if orientation:
+        exif = Image.Exif()
+        exif[0x0112] = orientation
+        image.save(output, format=image_format, exif=exif)
+    else:
+        image.save(output, format=image_format)
+    return output.getvalue()
+
+
+def test_prepare_ocr_image():
+    content = make_image((3200, 1000))
+    image = Image.open(BytesIO(prepare_ocr_image(content)))
+    assert image.format == "JPEG"
+    assert image.size == (1600, 500)
+
+    content = make_image((800, 600))
+    assert prepare_ocr_image(content) is content
+    assert prepare_ocr_image(b"foo") == b"foo"
+
+    # Rotated images are oriented even if small enough
+    content = make_image((800, 600), "JPEG", orientation=6)
+    image = Image.open(BytesIO(prepare_ocr_image(content)))
+    assert image.size == (600, 800)
+
+
+@override_settings(IMAGE_MAX_SIZE=1000)
+def test_process_image():
+    image_file = process_image(make_image((2000, 1500)))
+    assert image_file.name.endswith(".jpeg")
+    image = Image.open(image_file)
+    assert image.format == "JPEG"
+    assert image.size == (1000, 750)
+
+
+@override_settings(REST_FRAMEWORK=auth_override, IMAGE_THUMBNAIL_SIZES=(64,))
+@pytest.mark.django_db(transaction=True)
+def test_tea_image_thumbnails(client, token):
+    image = base64.b64encode(make_image((300, 200))).decode()
+    resp = client.post(
+        "/api/tea/",
+        {"name": "Test tea", "image": f"data:image/png;base64,{image}"},
+        content_type="application/json",
+        HTTP_AUTHORIZATION=f"Bearer {token}",
+    )
+    assert resp.status_code == 201
+    tea = Tea.objects.get(id=resp.data["id"])
+    path = os.path.join(settings.MEDIA_ROOT, tea.image.name)
+    assert resp.data["image"].endswith(".jpeg")
+    assert resp.data["thumbnails"]["64"] == resp.data["image"][:-5] + "_64.jpeg"
+    thumbnail = Image.open(path[:-5] + "_64.jpeg")
+    assert thumbnail.size == (64, 43)
+    shutil.rmtree(os.path.dirname(path))
+
+
+@override_settings(IMAGE_THUMBNAIL_SIZES=(64,))
+@pytest.mark.django_db(transaction=True)
+def test_tea_image_thumbnails_saved_on_commit():
+    user = CustomUser.objects.create_user("test@test.com", "pAzzw0rd!")
+    image = base64.b64encode(make_image((300, 200))).decode()
+    serializer = TeaSerializer(
+        data={"name": "Test tea", "image": f"data:image/png;base64,{image}"}
+    )
+    assert serializer.is_valid()
+    with pytest.raises(RuntimeError):
+        with transaction.atomic():
+            tea = serializer.save(user=user)
+            raise RuntimeError
+    path = os.path.join(settings.MEDIA_ROOT, tea.image.name)
+    assert not os.path.exists(path[:-5] + "_64.jpeg")
+    shutil.rmtree(os.path.dirname(path))
+
+
+@override_settings(REST_FRAMEWORK=auth_override, IMAGE_THUMBNAIL_SIZES=(64,))
+@pytest.mark.django_db(transaction=True)
+def test_make_thumbnails_command(client, token):
+    image = base64.b64encode(make_image((300, 200))).decode()
+    resp = client.post(
+        "/api/tea/",
+        {"name": "Test tea", "image": f"data:image/png;base64,{image}"},
+        content_type="application/json",
+        HTTP_AUTHORIZATION=f"Bearer {token}",
+    )
+    assert resp.status_code == 201
+    path = os.path.join(settings.MEDIA_ROOT, Tea.objects.get().image.name)
+    Tea.objects.create(user=Tea.objects.get().user, name="No image")
+
+    # Thumbnails of a size added after upload are missing
+    with override_settings(IMAGE_THUMBNAIL_SIZES=(64, 32)):
+        output = StringIO()
+        call_command("make_thumbnails", stdout=output)
+        assert output.getvalue() == "Saved 1 thumbnails\n"
+        assert Image.open(path[:-5] + "_32.jpeg").size == (32, 21)
+
+        output = StringIO()
+        call_command("make_thumbnails", stdout=output)
+        assert output.getvalue() == "Saved 0 thumbnails\n"
+    shutil.rmtree(os.path.dirname(path))
+
+
+@override_settings(REST_FRAMEWORK=auth_override, IMAGE_THUMBNAIL_SIZES=(64,))
+@pytest.mark.django_db(transaction=True)
+def test_tea_image_thumbnails_deleted(client, token):
+    image = base64.b64encode(make_image((300, 200))).decode()
+    resp = client.post(
+        "/api/tea/",
+        {"name": "Test tea", "image": f"data:image/png;base64,{image}"},
+        content_type="application/json",
+        HTTP_AUTHORIZATION=f"Bearer {token}",
+    )
+    _id = resp.data["id"]
+    path = os.path.join(settings.MEDIA_ROOT, Tea.objects.get(id=_id).image.name)
+    assert os.path.exists(path[:-5] + "_64.jpeg")
+
+    # Replaced image thumbnails are deleted
+    image = base64.b64encode(make_image((200, 300))).decode()
+    resp = client.put(
+        f"/api/tea/{_id}/",
+        {"name": "Test tea", "image": f"data:image/png;base64,{image}"},
+        content_type="application/json",
+        HTTP_AUTHORIZATION=f"Bearer {token}",
+    )
+    assert resp.status_code == 200
+    assert not os.path.exists(path)
+    assert not os.path.exists(path[:-5] + "_64.jpeg")
+    new_path = os.path.join(settings.MEDIA_ROOT, Tea.objects.get(id=_id).image.name)
+    assert Image.open(new_path[:-5] + "_64.jpeg").size == (43, 64)
+
+    # And so are deleted tea ones
+    resp = client.delete(f"/api/tea/{_id}/", HTTP_AUTHORIZATION=f"Bearer {token}")
+    assert resp.status_code == 204
+    assert not os.path.exists(new_path[:-5] + "_64.jpeg")
+    shutil.rmtree(os.path.dirname(path))
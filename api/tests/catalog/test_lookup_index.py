@@ -0,0 +1,94 @@
+import uuid
+
+import pytest
+
+from catalog.lookup_index import (
+    VERSION_KEY,
+    get_lookup_index,
+    invalidate_lookup_index,
+)
+from catalog.models import (
+    CacheVersion,
+    Category,
+    CategoryName,
+    CustomUser,
+    Subcategory,
+    SubcategoryName,
+    Vendor,
+    VendorTrademark,
+)
+
+
+@pytest.fixture(scope="function")
+@pytest.mark.django_db
+def catalog():
+    invalidate_lookup_index()
+    user = CustomUser(email="test@test.com")
+    user.save()
+    category = Category(name="OOLONG")
+    category.save()
+    CategoryName(name="Wulong", category=category).save()
+    subcategory = Subcategory(
+        user=user,
+        is_public=True,
+        name="Da Hong Pao",
+        translated_name="Big Red Robe",
+        category=category,
+    )
+    subcategory.save()
+    SubcategoryName(name="DHP", subcategory=subcategory).save()
+    vendor = Vendor(user=user, is_public=True, name="Mei Leaf", website="meileaf.com")
+    vendor.save()
+    VendorTrademark(name="Mei Leaf Tea", vendor=vendor).save()
+    Vendor(user=user, name="Private vendor").save()
+    return category, subcategory, vendor
+
+
+@pytest.mark.django_db
+def test_lookup_index_maps(catalog):
+    category, subcategory, vendor = catalog
+    index = get_lookup_index()
+    assert index.category_lookup == ["oolong", "wulong"]
+    assert index.subcategory_lookup == ["da hong pao", "big red robe", "dhp"]
+    assert index.vendor_lookup == ["mei leaf", "meileaf.com"]
+    assert index.get_category("wulong") == category
+    assert index.get_subcategory("big red robe") == subcategory
+    assert index.get_subcategory("dhp").category == category
+    assert index.get_vendor("meileaf.com") == vendor
+    assert index.get_vendor("private vendor") is None
+    assert index.subcategory_alternative_names[subcategory.id] == ["DHP"]
+    assert index.vendor_trademarks[vendor.id] == ["Mei Leaf Tea"]
+
+
+@pytest.mark.django_db
+def test_lookup_index_reused(catalog, django_assert_num_queries):
+    index = get_lookup_index()
+    with django_assert_num_queries(1):
+        assert get_lookup_index() is index
+
+
+@pytest.mark.django_db
+def test_lookup_index_rebuilt_on_shared_version_change(catalog):
+    index = get_lookup_index()
+    # Bumped by another worker process
+    CacheVersion.objects.filter(key=VERSION_KEY).update(version=uuid.uuid4())
+    updated_index = get_lookup_index()
+    assert updated_index is not index
+    assert updated_index.version != index.version
+
+
+@pytest.mark.django_db
+def test_lookup_index_invalidated_on_save_and_delete(catalog):
+    category, subcategory, vendor = catalog
+    index = get_lookup_index()
+
+    vendor.name = "Teasenz"
+    vendor.save()
+    updated_index = get_lookup_index()
+    assert updated_index is not index
+    assert updated_index.version != index.version
+    assert updated_index.get_vendor("teasenz") == vendor
+    assert updated_index.get_vendor("mei leaf") is None
+
+    subcategory.delete()
+    assert get_lookup_index().get_subcategory("da hong pao") is None
@@ -400,3 +400,18 @@ def test_brewing_session_model_validators():
         session.full_clean()
         session.save()
     assert len(BrewingSession.objects.all()) == 0
+
+
+@pytest.mark.django_db
+def test_owned_or_public_queryset():
+    user = CustomUser.objects.create_user("test@test.com", "pAzzw0rd!")
+    other = CustomUser.objects.create_user("other@test.com", "pAzzw0rd!")
+    Vendor.objects.create(user=other, name="Other private")
+    public = Vendor.objects.create(user=other, name="Public", is_public=True)
+    owned = Vendor.objects.create(user=user, name="Owned")
+    owned_public = Vendor.objects.create(user=user, name="Owned public", is_public=True)
+
+    vendors = Vendor.objects.owned_or_public(user)
+    assert list(vendors) == [public, owned, owned_public]
+    assert list(vendors.filter(name__startswith="Owned")) == [owned, owned_public]
+    assert list(Vendor.objects.filter(name="Public").owned_or_public(user)) == [public]
@@ -0,0 +1,36 @@
+import difflib
+import random
+
+from catalog.ngram_index import NgramIndex
+
+
+def random_word(rng, max_length=14):
+    return "".join(rng.choice("abdeghilnoprstu .-") for _ in range(max_length))[
+        : rng.randint(1, max_length)
+    ]
+
+
+def test_ngram_index_close_matches():
+    index = NgramIndex(["da hong pao", "long jing", "dan cong", "bai hao yin zhen"])
+    assert index.get_close_matches("da hong bao") == ["da hong pao"]
+    assert index.get_close_matches("long jin") == ["long jing"]
+    assert index.get_close_matches("tie guan yin") == []
+    assert index.get_close_matches("") == []
+
+
+def test_ngram_index_same_as_difflib():
+    rng = random.Random(0)
+    names = list(dict.fromkeys(random_word(rng) for _ in range(1000)))
+    index = NgramIndex(names)
+    for _ in range(1000):
+        word = list(rng.choice(names))
+        for _ in range(rng.randint(0, 3)):
+            word[rng.randrange(len(word))] = rng.choice("abdeghilnoprstu .-")
+        word = "".join(word)
+        assert index.get_close_matches(word) == difflib.get_close_matches(
+            word, names, cutoff=0.8
+        )
+        word = random_word(rng)
+        assert index.get_close_matches(word) == difflib.get_close_matches(
+            word, names, cutoff=0.8
+        )
@@ -0,0 +1,221 @@
+import base64
+from types import SimpleNamespace
+
+import grpc
+import pytest
+from django.core.exceptions import ImproperlyConfigured
+from django.test import override_settings
+from google.api_core import exceptions
+from google.cloud import vision
+
+from catalog.lookup_index import invalidate_lookup_index
+from catalog.models import Category, CustomUser, Subcategory, SubcategoryName, Vendor
+from catalog.ocr_backends import (
+    FixtureOcrBackend,
+    OcrError,
+    VisionOcrBackend,
+    get_ocr_backend,
+)
+from catalog.ocr_cache import get_ocr_cache
+from catalog.vision_parser import VisionParser
+
+from .test_views import auth_override
+
+fixture_settings = {
+    "OCR_BACKEND": "catalog.ocr_backends.FixtureOcrBackend",
+    "OCR_FIXTURES_DIR": "tests/test_media/ocr",
+    "OCR_FIXTURES_CYCLE": 0,
+    "OCR_FIXTURES_RECORD": 0,
+}
+
+
+@pytest.fixture(scope="function")
+@pytest.mark.django_db
+def token(client):
+    resp = client.post(
+        "/api/register/",
+        {"email": "test@test.com", "password1": "pAzzw0rd!", "password2": "pAzzw0rd!"},
+        content_type="application/json",
+    )
+    resp = client.post(
+        "/api/login/",
+        {"email": "test@test.com", "password": "pAzzw0rd!"},
+        content_type="application/json",
+    )
+    return resp.data["access"]
+
+
+@pytest.fixture(scope="function")
+@pytest.mark.django_db
+def catalog():
+    invalidate_lookup_index()
+    user = CustomUser(email="admin@test.com")
+    user.save()
+    category = Category(name="OOLONG")
+    category.save()
+    subcategory = Subcategory(
+        user=user, is_public=True, name="Da Hong Pao", category=category
+    )
+    subcategory.save()
+    SubcategoryName(name="DHP", subcategory=subcategory).save()
+    vendor = Vendor(user=user, is_public=True, name="Mei Leaf", website="meileaf.com")
+    vendor.save()
+    return category, subcategory, vendor
+
+
+def encoded_image(path):
+    with open(path, "rb") as image:
+        return base64.b64encode(image.read()).decode()
+
+
+@override_settings(REST_FRAMEWORK=auth_override, **fixture_settings)
+@pytest.mark.django_db
+def test_vision_parser_with_fixture_backend(client, token, catalog):
+    category, subcategory, vendor = catalog
+    assert isinstance(get_ocr_backend(), FixtureOcrBackend)
+    resp = client.post(
+        "/api/parser/",
+        {
+            "image": "data:image/jpeg;base64,"
+            + encoded_image("tests/test_media/test_image.jpg")
+        },
+        content_type="application/json",
+        HTTP_AUTHORIZATION=f"Bearer {token}",
+    )
+    assert resp.status_code == 200
+    assert resp.data["name"] == "Undercover Dhp"
+    assert resp.data["category"] == category.id
+    assert resp.data["subcategory"] == subcategory.id
+    assert resp.data["vendor"] == vendor.id
+    assert resp.data["year"] == 2019
+
+
+@override_settings(**fixture_settings)
+@pytest.mark.django_db
+def test_vision_parser_reuses_cached_text_detection(catalog):
+    image_data = encoded_image("tests/test_media/test_image.jpg")
+    first = VisionParser(image_data).get_tea_data()
+    parser = VisionParser(image_data)
+    second = parser.get_tea_data()
+    assert parser.document is None
+    assert first == second
+    assert parser.backend is get_ocr_backend()
+
+
+@override_settings(OCR_FIXTURES_DIR=None)
+def test_fixture_backend_requires_directory():
+    with pytest.raises(ImproperlyConfigured):
+        FixtureOcrBackend()
+
+
+def test_fixture_backend_cycle():
+    backend = FixtureOcrBackend("tests/test_media/ocr", cycle=False, record=False)
+    assert not backend.document_text_detection(b"foo").pages
+    backend = FixtureOcrBackend("tests/test_media/ocr", cycle=True, record=False)
+    assert backend.document_text_detection(b"foo").pages
+    assert backend.document_text_detection(b"bar").pages
+
+
+class FakeChannel:
+    def subscribe(self, callback, try_to_connect=False):
+        self.callback = callback
+
+    def notify(self, state):
+        self.callback(state)
+
+
+class FakeClient:
+    def __init__(self, failures=0, error="", exception=exceptions.ServiceUnavailable):
+        self.failures = failures
+        self.error = error
+        self.exception = exception
+        self.transport = SimpleNamespace(channel=FakeChannel())
+
+    def document_text_detection(self, image):
+        if self.failures:
+            self.failures -= 1
+            raise self.exception("Socket closed")
+        response = vision.types.AnnotateImageResponse()
+        response.error.message = self.error
+        return response
+
+
+class FakeVisionOcrBackend(VisionOcrBackend):
+    def __init__(self, failures=0, error=""):
+        super().__init__()
+        self.failures = failures
+        self.error = error
+
+    def create_client(self):
+        client = FakeClient(self.failures, self.error)
+        self.failures = 0
+        return client
+
+
+def test_vision_backend_reuses_client():
+    backend = FakeVisionOcrBackend()
+    assert not backend.is_current()
+    backend.document_text_detection(b"foo")
+    client = backend.client
+    backend.document_text_detection(b"bar")
+    assert backend.client is client
+    assert backend.stats() == {"clients_created": 1, "channel_failures": 0}
+
+    # Client inherited from a parent process is recreated
+    backend.pid = -1
+    assert not backend.is_current()
+    backend.document_text_detection(b"foo")
+    assert backend.client is not client
+    assert backend.stats()["clients_created"] == 2
+
+
+def test_vision_backend_recreates_failed_client():
+    backend = FakeVisionOcrBackend(failures=1)
+    backend.document_text_detection(b"foo")
+    assert backend.stats() == {"clients_created": 2, "channel_failures": 1}
+
+    # Only one retry with a new client
+    backend.client.failures = 1
+    backend.failures = 1
+    with pytest.raises(exceptions.ServiceUnavailable):
+        backend.document_text_detection(b"foo")
+
+
+def test_vision_errors_are_not_cached():
+    backend = FakeVisionOcrBackend(error="Bad image data")
+    parser = VisionParser(b"foo", backend=backend, index=object())
+    with pytest.raises(OcrError):
+        parser.detect_text()
+    assert get_ocr_cache().get(parser.get_image_hash()) is None
+
+
+def test_vision_backend_recreates_client_of_unhealthy_channel():
+    backend = FakeVisionOcrBackend()
+    backend.document_text_detection(b"foo")
+    client = backend.client
+    client.transport.channel.notify(grpc.ChannelConnectivity.READY)
+    backend.document_text_detection(b"foo")
+    assert backend.client is client
+
+    # Checked from the last state notified, without call
+    client.transport.channel.notify(grpc.ChannelConnectivity.TRANSIENT_FAILURE)
+    assert not backend.is_current()
+    backend.document_text_detection(b"foo")
+    assert backend.client is not client
+    assert backend.stats() == {"clients_created": 2, "channel_failures": 1}
+
+    # States of replaced clients channels are ignored
+    client.transport.channel.notify(grpc.ChannelConnectivity.SHUTDOWN)
+    assert backend.is_current()
+
+
+def test_vision_backend_keeps_client_on_deadline():
+    backend = FakeVisionOcrBackend()
+    backend.document_text_detection(b"foo")
+    client = backend.client
+    client.failures = 1
+    client.exception = exceptions.DeadlineExceeded
+    with pytest.raises(exceptions.DeadlineExceeded):
+        backend.document_text_detection(b"foo")
+    assert backend.client is client
+    assert backend.stats() == {"clients_created": 1, "channel_failures": 0}
@@ -0,0 +1,60 @@
+from catalog import ocr_cache
+from catalog.ocr_cache import OcrCache
+from catalog.vision_parser import FlatDocument
+
+
+def test_ocr_cache_hits_and_misses():
+    cache = OcrCache()
+    assert cache.get("foo") is None
+    cache.set("foo", b"bar")
+    assert cache.get("foo") == b"bar"
+    assert cache.stats() == {
+        "hits": 1,
+        "misses": 1,
+        "evictions": 0,
+        "entries": 1,
+        "size": 3,
+    }
+
+
+def test_ocr_cache_expiration(monkeypatch):
+    now = 1000
+    monkeypatch.setattr(ocr_cache.time, "monotonic", lambda: now)
+    cache = OcrCache(timeout=10)
+    cache.set("foo", b"bar")
+    now = 1005
+    assert cache.get("foo") == b"bar"
+    now = 1011
+    assert cache.get("foo") is None
+    assert cache.stats()["size"] == 0
+
+
+def test_ocr_cache_size_eviction():
+    cache = OcrCache(max_size=10)
+    cache.set("a", b"1234")
+    cache.set("b", b"1234")
+    assert cache.get("a") == b"1234"
+    cache.set("c", b"1234")
+    assert cache.get("b") is None
+    assert cache.get("a") == b"1234"
+    assert cache.get("c") == b"1234"
+    assert cache.stats()["evictions"] == 1
+    cache.set("d", b"12345678901")
+    assert cache.get("d") is None
+
+
+def test_flat_document_serialization():
+    flat = FlatDocument()
+    for i, word in enumerate(["Da", "Hong", "Pao", "大红袍"]):
+        flat.words.append(word)
+        flat.areas.append(10.5 * i)
+        flat.confidences.append(0.9)
+        flat.breaks.append(i % 2)
+        flat.paragraphs.append(i // 2)
+        flat.blocks.append(0)
+    flat.block_count = 1
+    loaded = FlatDocument.deserialize(flat.serialize())
+    assert loaded.__dict__ == flat.__dict__
+
+    empty = FlatDocument.deserialize(FlatDocument().serialize())
+    assert empty.__dict__ == FlatDocument().__dict__
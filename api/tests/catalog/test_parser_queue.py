@@ -0,0 +1,150 @@
+from datetime import timedelta
+
+import pytest
+from django.test import override_settings
+from django.utils import timezone
+
+from catalog.models import CustomUser, ParserJob
+from catalog.parser_queue import DatabaseParserQueue, prune_parser_jobs
+
+from .test_views import auth_override
+
+
+@pytest.fixture(scope="function")
+@pytest.mark.django_db
+def token(client):
+    resp = client.post(
+        "/api/register/",
+        {"email": "test@test.com", "password1": "pAzzw0rd!", "password2": "pAzzw0rd!"},
+        content_type="application/json",
+    )
+    resp = client.post(
+        "/api/login/",
+        {"email": "test@test.com", "password": "pAzzw0rd!"},
+        content_type="application/json",
+    )
+    return resp.data["access"]
+
+
+@override_settings(REST_FRAMEWORK=auth_override)
+@pytest.mark.django_db
+def test_user_can_queue_and_view_parser_job(client, token):
+    resp = client.post(
+        "/api/parser/",
+        {"image": "data:image/png;base64,Zm9v", "async": True},
+        content_type="application/json",
+        HTTP_AUTHORIZATION=f"Bearer {token}",
+    )
+    assert resp.status_code == 202
+    assert resp.data["status"] == ParserJob.PENDING
+    assert resp.data["result"] is None
+    _id = resp.data["id"]
+    assert resp["Location"] == f"/api/parser/{_id}/"
+    assert ParserJob.objects.get(id=_id).image == "Zm9v"
+
+    resp = client.get(
+        f"/api/parser/{_id}/?wait=0.1", HTTP_AUTHORIZATION=f"Bearer {token}"
+    )
+    assert resp.status_code == 200
+    assert resp.data["status"] == ParserJob.PENDING
+
+    ParserJob.objects.filter(id=_id).update(
+        status=ParserJob.DONE, result='{"name": "Test tea"}'
+    )
+    resp = client.get(f"/api/parser/{_id}/", HTTP_AUTHORIZATION=f"Bearer {token}")
+    assert resp.data["status"] == ParserJob.DONE
+    assert resp.data["result"] == {"name": "Test tea"}
+
+
+@override_settings(REST_FRAMEWORK=auth_override)
+@pytest.mark.django_db
+def test_users_cannot_view_others_parser_jobs(client, token):
+    user = CustomUser(email="test2@test.com")
+    user.save()
+    job = ParserJob.objects.create(user=user, image="Zm9v")
+    resp = client.get(f"/api/parser/{job.id}/", HTTP_AUTHORIZATION=f"Bearer {token}")
+    assert resp.status_code == 404
+
+
+@pytest.mark.django_db
+def test_database_queue_claims_jobs_once():
+    user = CustomUser(email="test@test.com")
+    user.save()
+    first = ParserJob.objects.create(user=user, image="Zm9v")
+    second = ParserJob.objects.create(user=user, image="YmFy")
+    queue = DatabaseParserQueue()
+
+    claimed = queue.claim()
+    assert claimed.id == first.id
+    assert claimed.status == ParserJob.RUNNING
+    assert ParserJob.objects.get(id=first.id).started_on
+    assert queue.claim().id == second.id
+    assert queue.claim() is None
+
+
+@pytest.mark.django_db
+def test_database_queue_requeues_stale_jobs():
+    user = CustomUser(email="test@test.com")
+    user.save()
+    stale = timezone.now() - timedelta(seconds=301)
+    job = ParserJob.objects.create(
+        user=user, image="Zm9v", status=ParserJob.RUNNING, started_on=stale, attempts=1
+    )
+    failed = ParserJob.objects.create(
+        user=user, image="YmFy", status=ParserJob.RUNNING, started_on=stale, attempts=3
+    )
+    running = ParserJob.objects.create(
+        user=user, image="YmF6", status=ParserJob.RUNNING, started_on=timezone.now()
+    )
+    queue = DatabaseParserQueue()
+
+    assert queue.recover() == 1
+    job.refresh_from_db()
+    assert job.status == ParserJob.PENDING
+    assert job.started_on is None
+    failed.refresh_from_db()
+    assert failed.status == ParserJob.FAILED
+    assert failed.image == ""
+    assert ParserJob.objects.get(id=running.id).status == ParserJob.RUNNING
+
+    claimed = queue.claim()
+    assert claimed.id == job.id
+    assert claimed.attempts == 2
+    assert ParserJob.objects.get(id=job.id).attempts == 2
+
+
+@override_settings(
+    REST_FRAMEWORK=auth_override,
+    PARSER_QUEUE_BACKEND="catalog.parser_queue.DatabaseParserQueue",
+)
+@pytest.mark.django_db
+def test_polling_stale_parser_job_requeues_it(client, token, monkeypatch):
+    monkeypatch.setattr("catalog.parser_queue._queue", None)
+    user = CustomUser.objects.get(email="test@test.com")
+    job = ParserJob.objects.create(
+        user=user,
+        image="Zm9v",
+        status=ParserJob.RUNNING,
+        started_on=timezone.now() - timedelta(seconds=301),
+    )
+    resp = client.get(f"/api/parser/{job.id}/", HTTP_AUTHORIZATION=f"Bearer {token}")
+    assert resp.data["status"] == ParserJob.PENDING
+
+
+@pytest.mark.django_db
+def test_prune_parser_jobs():
+    user = CustomUser(email="test@test.com")
+    user.save()
+    old = timezone.now() - timedelta(days=2)
+    ParserJob.objects.create(user=user, status=ParserJob.DONE, finished_on=old)
+    ParserJob.objects.create(user=user, status=ParserJob.FAILED, finished_on=old)
+    recent = ParserJob.objects.create(
+        user=user, status=ParserJob.DONE, finished_on=timezone.now()
+    )
+    pending = ParserJob.objects.create(user=user, image="Zm9v")
+
+    assert prune_parser_jobs() == 2
+    assert set(ParserJob.objects.values_list("id", flat=True)) == {
+        recent.id,
+        pending.id,
+    }
@@ -0,0 +1,153 @@
+import base64
+import json
+import os
+import shutil
+
+import pytest
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import override_settings
+
+from catalog.models import Category, ParserJob, Tea
+from catalog.vision_parser import VisionParser
+
+from .test_ocr_backends import catalog, fixture_settings  # noqa: F401
+from .test_views import auth_override
+
+
+@pytest.fixture(scope="function")
+@pytest.mark.django_db
+def token(client):
+    resp = client.post(
+        "/api/register/",
+        {"email": "test@test.com", "password1": "pAzzw0rd!", "password2": "pAzzw0rd!"},
+        content_type="application/json",
+    )
+    resp = client.post(
+        "/api/login/",
+        {"email": "test@test.com", "password": "pAzzw0rd!"},
+        content_type="application/json",
+    )
+    return resp.data["access"]
+
+
+def read_image():
+    with open("tests/test_media/test_image.jpg", "rb") as f:
+        return f.read()
+
+
+@override_settings(REST_FRAMEWORK=auth_override, **fixture_settings)
+@pytest.mark.django_db
+def test_vision_parser_raw_image_upload(client, token, catalog):  # noqa: F811
+    resp = client.post(
+        "/api/parser/",
+        read_image(),
+        content_type="image/jpeg",
+        HTTP_AUTHORIZATION=f"Bearer {token}",
+    )
+    assert resp.status_code == 200
+    assert resp.data["name"] == "Undercover Dhp"
+
+    resp = client.post(
+        "/api/parser/",
+        b"",
+        content_type="image/jpeg",
+        HTTP_AUTHORIZATION=f"Bearer {token}",
+    )
+    assert resp.status_code == 400
+
+
+@override_settings(REST_FRAMEWORK=auth_override, **fixture_settings)
+@pytest.mark.django_db
+def test_vision_parser_multipart_image_upload(client, token, catalog):  # noqa: F811
+    resp = client.post(
+        "/api/parser/",
+        {"image": SimpleUploadedFile("image.jpg", read_image())},
+        HTTP_AUTHORIZATION=f"Bearer {token}",
+    )
+    assert resp.status_code == 200
+    assert resp.data["name"] == "Undercover Dhp"
+
+
+@override_settings(REST_FRAMEWORK=auth_override)
+@pytest.mark.django_db
+def test_vision_parser_raw_image_upload_async(client, token):
+    resp = client.post(
+        "/api/parser/?async=1",
+        b"foo",
+        content_type="image/png",
+        HTTP_AUTHORIZATION=f"Bearer {token}",
+    )
+    assert resp.status_code == 202
+    job = ParserJob.objects.get(id=resp.data["id"])
+    assert base64.b64decode(job.image) == b"foo"
+
+
+@override_settings(REST_FRAMEWORK=auth_override)
+@pytest.mark.django_db
+def test_vision_parser_invalid_requests(client, monkeypatch, token):
+    image = base64.b64encode(read_image()).decode()
+    resp = client.post(
+        "/api/parser/",
+        {"image": f"data:image/jpeg;base64,{image}", "async": [1]},
+        content_type="application/json",
+        HTTP_AUTHORIZATION=f"Bearer {token}",
+    )
+    assert resp.status_code == 400
+    assert resp.data == {"async": "Must be a valid boolean"}
+
+    resp = client.post(
+        "/api/parser/",
+        {"image": {"data": image}},
+        content_type="application/json",
+        HTTP_AUTHORIZATION=f"Bearer {token}",
+    )
+    assert resp.status_code == 400
+    assert resp.data == {"image": "Invalid image data"}
+
+    # Parsing errors aren't reported as invalid images
+    def get_tea_data(self, max_name_length=None):
+        raise AttributeError
+
+    monkeypatch.setattr(VisionParser, "get_tea_data", get_tea_data)
+    with pytest.raises(AttributeError):
+        client.post(
+            "/api/parser/",
+            {"image": f"data:image/jpeg;base64,{image}"},
+            content_type="application/json",
+            HTTP_AUTHORIZATION=f"Bearer {token}",
+        )
+
+
+@override_settings(REST_FRAMEWORK=auth_override)
+@pytest.mark.django_db
+def test_tea_multipart_image_upload(client, token):
+    category = Category(name="OOLONG")
+    category.save()
+    data = {
+        "name": "Test tea",
+        "subcategory": {"name": "Test subcategory", "category": category.id},
+    }
+    resp = client.post(
+        "/api/tea/",
+        {
+            "data": json.dumps(data),
+            "image": SimpleUploadedFile("image.jpg", read_image()),
+        },
+        HTTP_AUTHORIZATION=f"Bearer {token}",
+    )
+    assert resp.status_code == 201
+    assert resp.data["subcategory"]["name"] == "Test subcategory"
+    assert resp.data["image"].endswith(".jpeg")
+
+    tea = Tea.objects.get(id=resp.data["id"])
+    path = tea.image.name
+    assert os.path.isfile(os.path.join(settings.MEDIA_ROOT, path))
+    shutil.rmtree(os.path.join(settings.MEDIA_ROOT, os.path.dirname(path)))
+
+    resp = client.post(
+        "/api/tea/",
+        {"data": "[]", "image": SimpleUploadedFile("image.jpg", b"foo")},
+        HTTP_AUTHORIZATION=f"Bearer {token}",
+    )
+    assert resp.status_code == 400
@@ -0,0 +1,256 @@
+import asyncio
+import json
+
+import pytest
+from django.core.cache import caches
+from django.test import override_settings
+
+from catalog import places, places_cache
+from catalog.models import CustomUser, Origin, Tea
+from catalog.nested_resolver import get_known_coordinates
+from catalog.places import PlacesASGIHandler, PlacesError, lookup_place
+from catalog.places_cache import get_places_cache
+from catalog.reference_cache import get_reference_etag
+from catalog.serializers import get_or_create_origin
+
+from .test_views import auth_override
+
+
+@pytest.fixture(scope="function")
+@pytest.mark.django_db
+def token(client):
+    resp = client.post(
+        "/api/register/",
+        {"email": "test@test.com", "password1": "pAzzw0rd!", "password2": "pAzzw0rd!"},
+        content_type="application/json",
+    )
+    resp = client.post(
+        "/api/login/",
+        {"email": "test@test.com", "password": "pAzzw0rd!"},
+        content_type="application/json",
+    )
+    return resp.data["access"]
+
+
+def call_asgi(path, data, token):
+    """ Posts JSON data through the ASGI handler, returns status and body. """
+    body = json.dumps(data).encode()
+    scope = {
+        "type": "http",
+        "method": "POST",
+        "path": path,
+        "query_string": b"",
+        "headers": [
+            (b"host", b"testserver"),
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+            (b"authorization", f"Bearer {token}".encode()),
+        ],
+    }
+    messages = [{"type": "http.request", "body": body}]
+    sent = []
+
+    async def receive():
+        return messages.pop(0)
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(PlacesASGIHandler()(scope, receive, send))
+    body = b"".join(message.get("body", b"") for message in sent[1:])
+    return sent[0]["status"], json.loads(body)
+
+
+@override_settings(REST_FRAMEWORK=auth_override, JWT_TOKEN_USER=1)
+@pytest.mark.django_db
+def test_places_asgi_lookups_run_before_view(monkeypatch, token):
+    lookups = []
+
+    async def lookup_place_async(lookup, data):
+        places.get_lookup_params(lookup, data)
+        lookups.append((lookup, data))
+        if data["input"] == "error":
+            raise PlacesError("INVALID_REQUEST", "Bad input")
+        return [{"description": "Yunnan, China"}]
+
+    def lookup_place(lookup, data):
+        places.get_lookup_params(lookup, data)
+        raise AssertionError("Blocking lookup")
+
+    monkeypatch.setattr(places, "lookup_place_async", lookup_place_async)
+    monkeypatch.setattr(places, "lookup_place", lookup_place)
+
+    data = {"input": "yunn", "token": "session"}
+    status, body = call_asgi("/api/places/autocomplete/", data, token)
+    assert status == 200
+    assert body == [{"description": "Yunnan, China"}]
+    assert lookups == [("autocomplete", data)]
+
+    status, body = call_asgi(
+        "/api/places/autocomplete/", {"input": "error", "token": "session"}, token
+    )
+    assert status == 400
+    assert body == {"no_field_error": "INVALID_REQUEST (Bad input)"}
+
+    # Invalid requests are left to the view
+    status, body = call_asgi("/api/places/autocomplete/", {"input": "yunn"}, token)
+    assert status == 400
+    assert body == {"token": "Missing token field"}
+    assert len(lookups) == 2
+
+
+@override_settings(REST_FRAMEWORK=auth_override, JWT_TOKEN_USER=0)
+@pytest.mark.django_db(transaction=True)
+def test_places_asgi_lookups_skipped_for_inactive_users(monkeypatch, token):
+    lookups = []
+
+    async def lookup_place_async(lookup, data):
+        lookups.append((lookup, data))
+        return []
+
+    monkeypatch.setattr(places, "lookup_place_async", lookup_place_async)
+    CustomUser.objects.filter(email="test@test.com").update(is_active=False)
+
+    status, _ = call_asgi(
+        "/api/places/autocomplete/", {"input": "yunn", "token": "session"}, token
+    )
+    assert status == 401
+    assert lookups == []
+
+
+@override_settings(REST_FRAMEWORK=auth_override)
+@pytest.mark.django_db
+def test_places_wsgi_lookups(client, monkeypatch, token):
+    def lookup_place(lookup, data):
+        return {"result": {"adr_address": data["place_id"]}, "status": "OK"}
+
+    monkeypatch.setattr(places, "lookup_place", lookup_place)
+
+    resp = client.post(
+        "/api/places/details/",
+        {"place_id": "abc", "token": "session"},
+        HTTP_AUTHORIZATION=f"Bearer {token}",
+        content_type="application/json",
+    )
+    assert resp.status_code == 200
+    assert resp.data["result"] == {"adr_address": "abc"}
+
+
+class FakePlacesClient:
+    """ Records lookups and returns canned Places API results. """
+
+    def __init__(self):
+        self.lookups = []
+
+    def places_autocomplete(self, input_text, session_token, types):
+        self.lookups.append(("autocomplete", input_text, session_token))
+        return [{"description": "Yunnan, China", "place_id": "yunnan"}]
+
+    def place(self, place_id, session_token, fields):
+        self.lookups.append(("details", place_id, session_token))
+        return {
+            "result": {
+                "adr_address": '<span class="region">Yunnan Province</span>, '
+                '<span class="country-name">China</span>',
+                "geometry": {"location": {"lat": 24.5, "lng": 101.3}},
+            },
+            "status": "OK",
+        }
+
+
+@override_settings(REST_FRAMEWORK=auth_override, PLACES_CACHE_MAX_SIZE=2)
+@pytest.mark.django_db
+def test_places_cache(monkeypatch):
+    client = FakePlacesClient()
+    monkeypatch.setattr(places, "get_places_client", lambda: client)
+
+    # Inputs are normalized, session tokens aren't part of keys
+    for text, token in (("Yunnan", "a"), (" yunnan ", "b"), ("YUNNAN", "c")):
+        results = lookup_place("autocomplete", {"input": text, "token": token})
+        assert results[0]["place_id"] == "yunnan"
+    assert client.lookups == [("autocomplete", "Yunnan", "a")]
+
+    lookup_place("details", {"place_id": "yunnan", "token": "a"})
+    lookup_place("details", {"place_id": "yunnan", "token": "b"})
+    assert len(client.lookups) == 2
+    assert get_places_cache().stats() == {
+        "hits": 3,
+        "shared_hits": 0,
+        "misses": 2,
+        "entries": 2,
+    }
+
+    # Least recently used lookup is evicted
+    lookup_place("details", {"place_id": "fujian", "token": "a"})
+    lookup_place("autocomplete", {"input": "yunnan", "token": "a"})
+    assert len(client.lookups) == 4
+
+
+@override_settings(REST_FRAMEWORK=auth_override, PLACES_CACHE_ALIAS="shared")
+@pytest.mark.django_db
+def test_places_cache_shared_by_workers(monkeypatch):
+    client = FakePlacesClient()
+    monkeypatch.setattr(places, "get_places_client", lambda: client)
+    caches["shared"].clear()
+
+    data = {"input": "Yunnan", "token": "a"}
+    lookup_place("autocomplete", data)
+    # Another worker gets its own cache instance
+    places_cache.reset_places_cache("PLACES_CACHE_ALIAS")
+    results = lookup_place("autocomplete", data)
+    assert results[0]["place_id"] == "yunnan"
+    assert len(client.lookups) == 1
+    assert get_places_cache().stats() == {
+        "hits": 0,
+        "shared_hits": 1,
+        "misses": 0,
+        "entries": 1,
+    }
+
+    # Then served from local entries
+    lookup_place("autocomplete", data)
+    assert get_places_cache().stats()["hits"] == 1
+
+
+@override_settings(REST_FRAMEWORK=auth_override)
+@pytest.mark.django_db
+def test_places_details_coordinates_saved_to_origins(client, monkeypatch, token):
+    monkeypatch.setattr(places, "get_places_client", FakePlacesClient)
+    user = CustomUser.objects.get(email="test@test.com")
+    origin = Origin.objects.create(user=user, country="China", region="Yunnan")
+    other_user = CustomUser.objects.create_user("other@test.com", "pAzzw0rd!")
+    other_origin = Origin.objects.create(
+        user=other_user, country="China", region="Yunnan"
+    )
+    tea = Tea.objects.create(user=user, name="Puerh", origin=origin)
+    etag = get_reference_etag("origins", user.pk)
+
+    resp = client.post(
+        "/api/places/details/",
+        {"place_id": "yunnan", "token": "session"},
+        HTTP_AUTHORIZATION=f"Bearer {token}",
+        content_type="application/json",
+    )
+    assert resp.status_code == 200
+    origin.refresh_from_db()
+    assert (origin.latitude, origin.longitude) == (24.5, 101.3)
+    assert Tea.objects.get(pk=tea.pk).modified_on > tea.modified_on
+    assert get_reference_etag("origins", user.pk) != etag
+
+    # Private origins of other users are left to them
+    other_origin.refresh_from_db()
+    assert other_origin.latitude is None
+
+    # Origins of a place known to the user get its coordinates without lookup,
+    # not from private origins of other users
+    new_user = CustomUser.objects.create_user("new@test.com", "pAzzw0rd!")
+    new_origin = get_or_create_origin(
+        {"country": "China", "region": "Yunnan", "user": new_user}
+    )
+    assert new_origin.pk != origin.pk
+    assert new_origin.latitude is None
+    key = ("China", "Yunnan", "")
+    assert get_known_coordinates([key], user) == {key: (24.5, 101.3)}
+    assert get_known_coordinates([key], new_user) == {}
+    Origin.objects.filter(pk=origin.pk).update(is_public=True)
+    assert get_known_coordinates([key], new_user) == {key: (24.5, 101.3)}
@@ -0,0 +1,168 @@
+import uuid
+
+import pytest
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import QuerySet
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+
+from catalog.models import CacheVersion, Category, CustomUser, Subcategory
+from catalog.reference_cache import VERSION_KEY
+
+from .test_views import auth_override
+
+
+@pytest.fixture(scope="function")
+@pytest.mark.django_db
+def token(client):
+    resp = client.post(
+        "/api/register/",
+        {"email": "test@test.com", "password1": "pAzzw0rd!", "password2": "pAzzw0rd!"},
+        content_type="application/json",
+    )
+    resp = client.post(
+        "/api/login/",
+        {"email": "test@test.com", "password": "pAzzw0rd!"},
+        content_type="application/json",
+    )
+    return resp.data["access"]
+
+
+@override_settings(REST_FRAMEWORK=auth_override)
+@pytest.mark.django_db
+def test_category_list_etag(client, token):
+    Category.objects.create(name="OOLONG")
+    resp = client.get("/api/category/", HTTP_AUTHORIZATION=f"Bearer {token}")
+    assert resp.status_code == 200
+    assert len(resp.data) == 1
+    etag = resp["ETag"]
+
+    with CaptureQueriesContext(connection) as context:
+        resp = client.get(
+            "/api/category/",
+            HTTP_AUTHORIZATION=f"Bearer {token}",
+            HTTP_IF_NONE_MATCH=etag,
+        )
+    assert resp.status_code == 304
+    assert resp["ETag"] == etag
+    assert not any("catalog_category" in q["sql"] for q in context.captured_queries)
+
+    # Public data is served from cache until a category changes
+    with CaptureQueriesContext(connection) as context:
+        resp = client.get("/api/category/", HTTP_AUTHORIZATION=f"Bearer {token}")
+    assert resp.status_code == 200
+    assert not any("catalog_category" in q["sql"] for q in context.captured_queries)
+
+    Category.objects.create(name="GREEN")
+    resp = client.get(
+        "/api/category/",
+        HTTP_AUTHORIZATION=f"Bearer {token}",
+        HTTP_IF_NONE_MATCH=etag,
+    )
+    assert resp.status_code == 200
+    assert resp["ETag"] != etag
+    assert len(resp.data) == 2
+
+
+@override_settings(REST_FRAMEWORK=auth_override)
+@pytest.mark.django_db
+def test_subcategory_list_merges_private_rows(client, token):
+    user = CustomUser.objects.get(email="test@test.com")
+    other = CustomUser.objects.create_user("other@test.com", "pAzzw0rd!")
+    Subcategory.objects.create(user=other, name="Public", is_public=True)
+    Subcategory.objects.create(user=other, name="Other private")
+    resp = client.get("/api/subcategory/", HTTP_AUTHORIZATION=f"Bearer {token}")
+    assert [item["name"] for item in resp.data] == ["Public"]
+    etag = resp["ETag"]
+
+    resp = client.post(
+        "/api/subcategory/",
+        {"name": "Private"},
+        content_type="application/json",
+        HTTP_AUTHORIZATION=f"Bearer {token}",
+    )
+    assert resp.status_code == 201
+    resp = client.get(
+        "/api/subcategory/",
+        HTTP_AUTHORIZATION=f"Bearer {token}",
+        HTTP_IF_NONE_MATCH=etag,
+    )
+    assert resp.status_code == 200
+    assert [item["name"] for item in resp.data] == ["Public", "Private"]
+
+    # Other users private rows only change their own lists
+    etag = resp["ETag"]
+    Subcategory.objects.create(user=other, name="Other private 2")
+    resp = client.get(
+        "/api/subcategory/",
+        HTTP_AUTHORIZATION=f"Bearer {token}",
+        HTTP_IF_NONE_MATCH=etag,
+    )
+    assert resp.status_code == 304
+
+    Subcategory.objects.filter(user=user).delete()
+    resp = client.get(
+        "/api/subcategory/",
+        HTTP_AUTHORIZATION=f"Bearer {token}",
+        HTTP_IF_NONE_MATCH=etag,
+    )
+    assert resp.status_code == 200
+    assert [item["name"] for item in resp.data] == ["Public"]
+
+
+@override_settings(REST_FRAMEWORK=auth_override)
+@pytest.mark.django_db
+def test_category_list_etag_shared_by_workers(client, token):
+    resp = client.get("/api/category/", HTTP_AUTHORIZATION=f"Bearer {token}")
+    etag = resp["ETag"]
+
+    # Versions live in the database, a worker with an empty local cache
+    # answers with the same ETag
+    cache.clear()
+    resp = client.get(
+        "/api/category/",
+        HTTP_AUTHORIZATION=f"Bearer {token}",
+        HTTP_IF_NONE_MATCH=etag,
+    )
+    assert resp.status_code == 304
+
+    # Another worker changed public data
+    CacheVersion.objects.filter(key=VERSION_KEY).update(version=uuid.uuid4())
+    resp = client.get(
+        "/api/category/",
+        HTTP_AUTHORIZATION=f"Bearer {token}",
+        HTTP_IF_NONE_MATCH=etag,
+    )
+    assert resp.status_code == 200
+
+
+@override_settings(REST_FRAMEWORK=auth_override)
+@pytest.mark.django_db
+def test_vendor_list_etag_changed_by_bulk_created_vendors(client, monkeypatch, token):
+    resp = client.get("/api/vendor/", HTTP_AUTHORIZATION=f"Bearer {token}")
+    assert resp.data == []
+    etag = resp["ETag"]
+
+    # Bulk inserts, used by databases returning their primary keys, don't send
+    # post_save, SQLite doesn't so rows are saved one by one without signals
+    def bulk_create(queryset, instances, **kwargs):
+        for instance in instances:
+            instance._save_table(cls=type(instance))
+        return instances
+
+    monkeypatch.setattr(connection.features, "can_return_rows_from_bulk_insert", True)
+    monkeypatch.setattr(QuerySet, "bulk_create", bulk_create)
+    resp = client.post(
+        "/api/tea/",
+        {"name": "Tea", "vendor": {"name": "Test vendor"}},
+        HTTP_AUTHORIZATION=f"Bearer {token}",
+        content_type="application/json",
+    )
+    assert resp.status_code == 201
+
+    resp = client.get(
+        "/api/vendor/", HTTP_AUTHORIZATION=f"Bearer {token}", HTTP_IF_NONE_MATCH=etag
+    )
+    assert resp.status_code == 200
+    assert [vendor["name"] for vendor in resp.data] == ["Test vendor"]
@@ -2,6 +2,10 @@ import pytest
 
 from datetime import timedelta
 
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from catalog.brewing_cache import VERSION_KEY as BREWINGS_VERSION_KEY
 from catalog.serializers import (
     BrewingSerializer,
     BrewingSessionSerializer,
@@ -11,7 +15,8 @@ from catalog.serializers import (
     VendorSerializer,
     TeaSerializer,
 )
-from catalog.models import Category, CustomUser
+from catalog.models import Brewing, Category, CustomUser, Origin, Vendor
+from catalog.versions import get_version
 
 
 @pytest.mark.django_db
@@ -186,3 +191,47 @@ def test_invalid_brewing_session_serializer(client):
     assert serializer.errors == {
         "current_infusion": ["Ensure this value is greater than or equal to 1."]
     }
+
+
+@pytest.mark.django_db
+def test_tea_serializer_resolves_nested_in_batch(client):
+    user = CustomUser.objects.create_user("test@test.com", "pAzzw0rd!")
+    category = Category.objects.create(name="OOLONG")
+    data = {
+        "gongfu_brewing": {"temperature": 95, "weight": 5.25},
+        "western_brewing": {"temperature": 90},
+        "origin": {"country": "China", "region": "Fujian"},
+        "subcategory": {"name": "Da Hong Pao", "category": category.id},
+        "vendor": {"name": "Test vendor"},
+    }
+    # Shared versions are initialized once
+    get_version(BREWINGS_VERSION_KEY)
+    counts = []
+    for name in ("Tea 1", "Tea 2"):
+        serializer = TeaSerializer(data={**data, "name": name})
+        assert serializer.is_valid()
+        with CaptureQueriesContext(connection) as context:
+            tea = serializer.save(user=user)
+        counts.append(len(context))
+
+    assert tea.gongfu_brewing.weight == 5.2
+    assert tea.subcategory.category == category
+    assert Brewing.objects.count() == 2
+    assert Origin.objects.count() == 1
+    # Existing nested instances are fetched with one query per type, brewings
+    # without a new check of the brewing cache version within the request
+    assert counts[1] == 5
+    # New private instances also bump the user reference data version
+    assert counts[0] < 15
+
+
+@pytest.mark.django_db
+def test_tea_serializer_matches_names_exactly(client):
+    user = CustomUser.objects.create_user("test@test.com", "pAzzw0rd!")
+    vendor = Vendor.objects.create(user=user, name="Test Vendor", is_public=True)
+    # Case variants existing side by side don't make lookups ambiguous
+    Vendor.objects.create(user=user, name="TEST VENDOR", is_public=True)
+    serializer = TeaSerializer(data={"name": "Tea", "vendor": {"name": "Test Vendor"}})
+    assert serializer.is_valid()
+    assert serializer.save(user=user).vendor == vendor
+    assert Vendor.objects.count() == 2
@@ -1,4 +1,5 @@
 import pytest
+from django.contrib.auth import base_user
 
 from catalog.serializers import LoginSerializer, UserSerializer
 
@@ -18,6 +19,35 @@ def test_valid_login_serializer(client):
     assert serializer.errors == {}
 
 
+@pytest.mark.django_db
+def test_login_serializer_hashes_password_once(client, monkeypatch):
+    client.post(
+        "/api/register/",
+        {"email": "test@test.com", "password1": "pAzzw0rd!", "password2": "pAzzw0rd!"},
+        content_type="application/json",
+    )
+    calls = []
+    check_password = base_user.check_password
+    get_token = LoginSerializer.get_token
+
+    def count_check_password(*args, **kwargs):
+        calls.append("check_password")
+        return check_password(*args, **kwargs)
+
+    def count_get_token(cls, user):
+        calls.append("get_token")
+        return get_token(user)
+
+    monkeypatch.setattr(base_user, "check_password", count_check_password)
+    monkeypatch.setattr(LoginSerializer, "get_token", classmethod(count_get_token))
+
+    serializer = LoginSerializer(
+        data={"email": "test@test.com", "password": "pAzzw0rd!"}
+    )
+    assert serializer.is_valid()
+    assert calls == ["check_password", "get_token"]
+
+
 @pytest.mark.django_db
 def test_invalid_login_serializer_missing_field(client):
     client.post(
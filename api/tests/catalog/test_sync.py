@@ -0,0 +1,190 @@
+import uuid
+from datetime import timedelta
+
+import pytest
+from django.core.management import call_command
+from django.test import override_settings
+from django.utils import timezone
+
+from catalog.models import (
+    Brewing,
+    BrewingSession,
+    CustomUser,
+    Origin,
+    Subcategory,
+    Tea,
+    Tombstone,
+)
+from catalog.sync import get_sync_token
+
+from .test_views import auth_override
+
+
+@pytest.fixture(scope="function")
+@pytest.mark.django_db
+def token(client):
+    resp = client.post(
+        "/api/register/",
+        {"email": "test@test.com", "password1": "pAzzw0rd!", "password2": "pAzzw0rd!"},
+        content_type="application/json",
+    )
+    resp = client.post(
+        "/api/login/",
+        {"email": "test@test.com", "password": "pAzzw0rd!"},
+        content_type="application/json",
+    )
+    return resp.data["access"]
+
+
+@override_settings(REST_FRAMEWORK=auth_override, SYNC_OVERLAP=0)
+@pytest.mark.django_db
+def test_sync_returns_changes_since_token(client, token):
+    user = CustomUser.objects.get(email="test@test.com")
+    other = CustomUser.objects.create(email="test2@test.com")
+    tea = Tea.objects.create(user=user, name="Old tea")
+    deleted_tea = Tea.objects.create(user=user, name="Deleted tea")
+    session = BrewingSession.objects.create(user=user, tea=deleted_tea)
+    Tea.objects.create(user=other, name="Other tea")
+
+    resp = client.get("/api/sync/", HTTP_AUTHORIZATION=f"Bearer {token}")
+    assert resp.status_code == 200
+    assert resp.data["full"]
+    assert len(resp.data["teas"]) == 2
+    assert len(resp.data["brewing_sessions"]) == 1
+    sync_token = resp.data["token"]
+
+    # Nothing changed
+    resp = client.get(
+        f"/api/sync/?since={sync_token}", HTTP_AUTHORIZATION=f"Bearer {token}"
+    )
+    assert not resp.data["full"]
+    assert resp.data["teas"] == []
+    assert resp.data["brewing_sessions"] == []
+
+    resp = client.put(
+        f"/api/tea/{tea.id}/",
+        {"name": "Updated tea"},
+        content_type="application/json",
+        HTTP_AUTHORIZATION=f"Bearer {token}",
+    )
+    assert resp.status_code == 200
+    resp = client.delete(
+        f"/api/tea/{deleted_tea.id}/", HTTP_AUTHORIZATION=f"Bearer {token}"
+    )
+    assert resp.status_code == 204
+
+    resp = client.get(
+        f"/api/sync/?since={sync_token}", HTTP_AUTHORIZATION=f"Bearer {token}"
+    )
+    assert [t["name"] for t in resp.data["teas"]] == ["Updated tea"]
+    assert resp.data["deleted"]["teas"] == [deleted_tea.id]
+    # Session lost its tea
+    assert [s["id"] for s in resp.data["brewing_sessions"]] == [str(session.id)]
+    assert resp.data["brewing_sessions"][0]["tea"] is None
+
+    resp = client.get(
+        f"/api/sync/?since={sync_token}&types=brewing_sessions",
+        HTTP_AUTHORIZATION=f"Bearer {token}",
+    )
+    assert "teas" not in resp.data
+    assert resp.data["deleted"] == {"brewing_sessions": []}
+
+
+@override_settings(REST_FRAMEWORK=auth_override)
+@pytest.mark.django_db
+def test_sync_invalid_parameters(client, token):
+    # Invalid tokens lead to a full sync, as expired ones
+    resp = client.get("/api/sync/?since=foo", HTTP_AUTHORIZATION=f"Bearer {token}")
+    assert resp.status_code == 200
+    assert resp.data["full"]
+    resp = client.get("/api/sync/?types=foo", HTTP_AUTHORIZATION=f"Bearer {token}")
+    assert resp.status_code == 400
+
+
+@override_settings(REST_FRAMEWORK=auth_override, SYNC_TOMBSTONE_RETENTION=1)
+@pytest.mark.django_db
+def test_sync_expired_token_and_tombstones(client, token):
+    user = CustomUser.objects.get(email="test@test.com")
+    Tea.objects.create(user=user, name="Test tea")
+    old = timezone.now() - timedelta(days=2)
+    tombstone = Tombstone.objects.create(
+        user=user, model=Tombstone.TEA, object_id=uuid.uuid4()
+    )
+    Tombstone.objects.filter(id=tombstone.id).update(deleted_on=old)
+
+    resp = client.get(
+        f"/api/sync/?since={get_sync_token(user, old)}",
+        HTTP_AUTHORIZATION=f"Bearer {token}",
+    )
+    assert resp.data["full"]
+    assert len(resp.data["teas"]) == 1
+
+    # Token of another user
+    other = CustomUser.objects.create(email="test2@test.com")
+    resp = client.get(
+        f"/api/sync/?since={get_sync_token(other, timezone.now())}",
+        HTTP_AUTHORIZATION=f"Bearer {token}",
+    )
+    assert resp.data["full"]
+
+    call_command("prune_tombstones")
+    assert not Tombstone.objects.exists()
+
+
+@override_settings(REST_FRAMEWORK=auth_override, SYNC_OVERLAP=0)
+@pytest.mark.django_db
+def test_sync_returns_teas_with_changed_nested_instances(client, token):
+    user = CustomUser.objects.get(email="test@test.com")
+    origin = Origin.objects.create(user=user, country="China")
+    brewing = Brewing.objects.create(temperature=90)
+    subcategory = Subcategory.objects.create(
+        user=user, name="Subcategory", origin=origin
+    )
+    tea = Tea.objects.create(user=user, name="Tea", gongfu_brewing=brewing)
+    sub_tea = Tea.objects.create(user=user, name="Sub tea", subcategory=subcategory)
+    session = BrewingSession.objects.create(user=user, tea=tea, brewing=brewing)
+    resp = client.get("/api/sync/", HTTP_AUTHORIZATION=f"Bearer {token}")
+    sync_token = resp.data["token"]
+
+    # Saves changing nothing don't touch nesting teas
+    Origin.objects.get(pk=origin.pk).save()
+    subcategory.save()
+    resp = client.get(
+        f"/api/sync/?since={sync_token}", HTTP_AUTHORIZATION=f"Bearer {token}"
+    )
+    assert resp.data["teas"] == []
+
+    origin.latitude = 10
+    origin.save()
+    resp = client.get(
+        f"/api/sync/?since={sync_token}", HTTP_AUTHORIZATION=f"Bearer {token}"
+    )
+    assert [t["id"] for t in resp.data["teas"]] == [str(sub_tea.id)]
+    assert resp.data["teas"][0]["subcategory"]["origin"]["latitude"] == 10
+    sync_token = resp.data["token"]
+
+    brewing.delete()
+    resp = client.get(
+        f"/api/sync/?since={sync_token}", HTTP_AUTHORIZATION=f"Bearer {token}"
+    )
+    assert [t["id"] for t in resp.data["teas"]] == [str(tea.id)]
+    assert resp.data["teas"][0]["gongfu_brewing"] is None
+    assert [s["id"] for s in resp.data["brewing_sessions"]] == [str(session.id)]
+
+
+@pytest.mark.django_db(transaction=True)
+def test_tombstones_recorded_outside_api():
+    user = CustomUser.objects.create(email="test@test.com")
+    tea = Tea.objects.create(user=user, name="Tea")
+    session_id = BrewingSession.objects.create(user=user, tea=tea).id
+    BrewingSession.objects.get(id=session_id).delete()
+    Tea.objects.filter(id=tea.id).delete()
+    assert set(Tombstone.objects.values_list("model", "object_id")) == {
+        (Tombstone.TEA, tea.id),
+        (Tombstone.BREWING_SESSION, session_id),
+    }
+
+    # Deleting a user doesn't fail on tombstones of its cascaded teas
+    Tea.objects.create(user=user, name="Tea")
+    user.delete()
+    assert not CustomUser.objects.exists()
@@ -1,10 +1,20 @@
 import pytest
+from django.db import connection
 from django.test import override_settings
-from catalog.models import Category
+from django.test.utils import CaptureQueriesContext
+from catalog.models import (
+    Brewing,
+    Category,
+    CustomUser,
+    Origin,
+    Subcategory,
+    Tea,
+    Vendor,
+)
 
 auth_override = {
     "DEFAULT_AUTHENTICATION_CLASSES": (
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
+        "catalog.authentication.TokenUserAuthentication",
         "rest_framework.authentication.SessionAuthentication",
     ),
     "DEFAULT_PERMISSION_CLASSES": ("rest_framework.permissions.IsAuthenticated",),
@@ -163,8 +173,8 @@ def test_user_can_crud_tea(client, token):
 
     resp = client.get("/api/tea/", HTTP_AUTHORIZATION=f"Bearer {token}")
     assert resp.status_code == 200
-    assert len(resp.data) > 0
-    _id = resp.data[0]["id"]
+    assert len(resp.data["results"]) > 0
+    _id = resp.data["results"][0]["id"]
     resp = client.get(f"/api/tea/{_id}/", HTTP_AUTHORIZATION=f"Bearer {token}")
     assert resp.status_code == 200
     assert resp.data["name"] == "Test tea"
@@ -249,8 +259,8 @@ def test_users_cannot_view_others_teas(client, token):
 
     resp = client.get("/api/tea/", HTTP_AUTHORIZATION=f"Bearer {token}")
     assert resp.status_code == 200
-    assert len(resp.data) > 0
-    _id = resp.data[0]["id"]
+    assert len(resp.data["results"]) > 0
+    _id = resp.data["results"][0]["id"]
     resp = client.get(f"/api/tea/{_id}/", HTTP_AUTHORIZATION=f"Bearer {token}")
     assert resp.status_code == 200
     assert resp.data["name"] == "Test tea"
@@ -273,7 +283,7 @@ def test_users_cannot_view_others_teas(client, token):
 
     resp = client.get("/api/tea/", HTTP_AUTHORIZATION=f"Bearer {token2}")
     assert resp.status_code == 200
-    assert len(resp.data) == 0
+    assert len(resp.data["results"]) == 0
     resp = client.get(f"/api/tea/{_id}/", HTTP_AUTHORIZATION=f"Bearer {token2}")
     assert resp.status_code == 404
 
@@ -287,8 +297,8 @@ def test_users_cannot_view_others_teas(client, token):
 
     resp = client.get("/api/tea/", HTTP_AUTHORIZATION=f"Bearer {token2}")
     assert resp.status_code == 200
-    assert len(resp.data) > 0
-    _id2 = resp.data[0]["id"]
+    assert len(resp.data["results"]) > 0
+    _id2 = resp.data["results"][0]["id"]
     resp = client.get(f"/api/tea/{_id2}/", HTTP_AUTHORIZATION=f"Bearer {token2}")
     assert resp.status_code == 200
     assert resp.data["name"] == "Test tea"
@@ -309,8 +319,8 @@ def test_user_can_crud_brewing_session(client, token):
 
     resp = client.get("/api/brewing_session/", HTTP_AUTHORIZATION=f"Bearer {token}")
     assert resp.status_code == 200
-    assert len(resp.data) > 0
-    _id = resp.data[0]["id"]
+    assert len(resp.data["results"]) > 0
+    _id = resp.data["results"][0]["id"]
     resp = client.get(
         f"/api/brewing_session/{_id}/", HTTP_AUTHORIZATION=f"Bearer {token}"
     )
@@ -350,8 +360,8 @@ def test_users_cannot_view_others_brewing_sessions(client, token):
 
     resp = client.get("/api/brewing_session/", HTTP_AUTHORIZATION=f"Bearer {token}")
     assert resp.status_code == 200
-    assert len(resp.data) > 0
-    _id = resp.data[0]["id"]
+    assert len(resp.data["results"]) > 0
+    _id = resp.data["results"][0]["id"]
     resp = client.get(
         f"/api/brewing_session/{_id}/", HTTP_AUTHORIZATION=f"Bearer {token}"
     )
@@ -375,7 +385,7 @@ def test_users_cannot_view_others_brewing_sessions(client, token):
 
     resp = client.get("/api/brewing_session/", HTTP_AUTHORIZATION=f"Bearer {token2}")
     assert resp.status_code == 200
-    assert len(resp.data) == 0
+    assert len(resp.data["results"]) == 0
     resp = client.get(
         f"/api/brewing_session/{_id}/", HTTP_AUTHORIZATION=f"Bearer {token2}"
     )
@@ -390,8 +400,8 @@ def test_users_cannot_view_others_brewing_sessions(client, token):
 
     resp = client.get("/api/brewing_session/", HTTP_AUTHORIZATION=f"Bearer {token2}")
     assert resp.status_code == 200
-    assert len(resp.data) > 0
-    _id2 = resp.data[0]["id"]
+    assert len(resp.data["results"]) > 0
+    _id2 = resp.data["results"][0]["id"]
     resp = client.get(
         f"/api/brewing_session/{_id2}/", HTTP_AUTHORIZATION=f"Bearer {token2}"
     )
@@ -401,3 +411,110 @@ def test_users_cannot_view_others_brewing_sessions(client, token):
         f"/api/brewing_session/{_id2}/", HTTP_AUTHORIZATION=f"Bearer {token}"
     )
     assert resp.status_code == 404
+
+
+def get_brewing(temperature):
+    return Brewing.objects.get_or_create(temperature=temperature)[0]
+
+
+def create_nested_teas(user, count):
+    category = Category.objects.create(name=f"Category {count}")
+    for i in range(count):
+        origin = Origin.objects.create(user=user, country=f"Country {count}-{i}")
+        Tea.objects.create(
+            user=user,
+            name=f"Tea {i}",
+            category=category,
+            gongfu_brewing=get_brewing(90 + i % 10),
+            western_brewing=get_brewing(80 + i % 10),
+            origin=origin,
+            subcategory=Subcategory.objects.create(
+                user=user,
+                name=f"Subcategory {count}-{i}",
+                category=category,
+                origin=origin,
+                gongfu_brewing=get_brewing(70 + i % 10),
+                western_brewing=get_brewing(60 + i % 10),
+            ),
+            vendor=Vendor.objects.create(
+                user=user, name=f"Vendor {count}-{i}", origin=origin
+            ),
+        )
+
+
+@override_settings(REST_FRAMEWORK=auth_override)
+@pytest.mark.django_db
+def test_tea_views_query_count_is_flat(client, token):
+    user = CustomUser.objects.get(email="test@test.com")
+    queries = []
+    for count in (1, 10):
+        create_nested_teas(user, count)
+        with CaptureQueriesContext(connection) as context:
+            resp = client.get("/api/tea/", HTTP_AUTHORIZATION=f"Bearer {token}")
+        assert resp.status_code == 200
+        assert resp.data["results"][0]["subcategory"]["gongfu_brewing"]["temperature"]
+        queries.append(len(context))
+    assert len(resp.data["results"]) == 11
+    assert queries[0] == queries[1]
+
+    _id = resp.data["results"][0]["id"]
+    with CaptureQueriesContext(connection) as context:
+        resp = client.get(f"/api/tea/{_id}/", HTTP_AUTHORIZATION=f"Bearer {token}")
+    assert resp.status_code == 200
+    assert resp.data["vendor"]["origin"]
+    assert len(context) == queries[0]
+
+
+@override_settings(REST_FRAMEWORK=auth_override, API_PAGE_SIZE=4)
+@pytest.mark.django_db
+def test_tea_list_cursor_pagination(client, token):
+    user = CustomUser.objects.get(email="test@test.com")
+    create_nested_teas(user, 10)
+    ids = list(Tea.objects.order_by("-created_on", "-id").values_list("id", flat=True))
+
+    url = "/api/tea/"
+    pages = []
+    while url:
+        resp = client.get(url, HTTP_AUTHORIZATION=f"Bearer {token}")
+        assert resp.status_code == 200
+        pages.append([tea["id"] for tea in resp.data["results"]])
+        url = resp.data["next"]
+    assert [len(page) for page in pages] == [4, 4, 2]
+    assert [_id for page in pages for _id in page] == [str(_id) for _id in ids]
+
+    resp = client.get("/api/tea/?page_size=8", HTTP_AUTHORIZATION=f"Bearer {token}")
+    assert len(resp.data["results"]) == 8
+
+    resp = client.get("/api/tea/?paginate=false", HTTP_AUTHORIZATION=f"Bearer {token}")
+    assert len(resp.data) == 10
+
+
+@override_settings(REST_FRAMEWORK=auth_override)
+@pytest.mark.django_db
+def test_tea_list_field_selection(client, token):
+    user = CustomUser.objects.get(email="test@test.com")
+    create_nested_teas(user, 5)
+
+    with CaptureQueriesContext(connection) as context:
+        resp = client.get(
+            "/api/tea/?fields=id,name,vendor,subcategory&expand=subcategory",
+            HTTP_AUTHORIZATION=f"Bearer {token}",
+        )
+    assert resp.status_code == 200
+    tea = resp.data["results"][0]
+    assert set(tea) == {"id", "name", "vendor", "subcategory"}
+    assert isinstance(tea["vendor"], int)
+    assert tea["subcategory"]["gongfu_brewing"]["temperature"]
+    sql = " ".join(q["sql"] for q in context.captured_queries)
+    assert '"catalog_tea"."notes"' not in sql
+    assert '"catalog_vendor"' not in sql
+
+    # Expanding alone keeps all fields, with nested objects as IDs
+    resp = client.get("/api/tea/?expand=", HTTP_AUTHORIZATION=f"Bearer {token}")
+    tea = resp.data["results"][0]
+    assert "notes" in tea
+    assert isinstance(tea["gongfu_brewing"], int)
+
+    resp = client.get("/api/tea/?fields=id,foo", HTTP_AUTHORIZATION=f"Bearer {token}")
+    assert resp.status_code == 400
+    assert resp.data["fields"] == "Unknown fields: foo"
@@ -1,4 +1,7 @@
 import pytest
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
 from catalog.models import CustomUser
 
 
@@ -192,3 +195,40 @@ def test_logout(client):
     client.post("/api/logout/", content_type="application/json")
     resp = client.get("/api/user/", content_type="application/json")
     assert str(resp.status_code)[0] == "4"
+
+
+@override_settings(JWT_TOKEN_USER=1)
+@pytest.mark.django_db
+def test_token_user_authentication(client):
+    client.post(
+        "/api/register/",
+        {"email": "test@test.com", "password1": "pAzzw0rd!", "password2": "pAzzw0rd!"},
+        content_type="application/json",
+    )
+    resp = client.post(
+        "/api/login/",
+        {"email": "test@test.com", "password": "pAzzw0rd!"},
+        content_type="application/json",
+    )
+    access_token = resp.data["access"]
+    user_table = CustomUser._meta.db_table
+
+    with CaptureQueriesContext(connection) as queries:
+        resp = client.get("/api/tea/", HTTP_AUTHORIZATION=f"Bearer {access_token}")
+    assert resp.status_code == 200
+    assert not [q for q in queries if f'FROM "{user_table}"' in q["sql"]]
+
+    # Fields missing from claims are loaded together on first access
+    with CaptureQueriesContext(connection) as queries:
+        resp = client.get("/api/user/", HTTP_AUTHORIZATION=f"Bearer {access_token}")
+    assert resp.status_code == 200
+    assert resp.data["email"] == "test@test.com"
+    assert resp.data["joined_at"]
+    assert len([q for q in queries if f'FROM "{user_table}"' in q["sql"]]) == 1
+
+    with override_settings(JWT_TOKEN_USER=0), CaptureQueriesContext(
+        connection
+    ) as queries:
+        resp = client.get("/api/tea/", HTTP_AUTHORIZATION=f"Bearer {access_token}")
+    assert resp.status_code == 200
+    assert len([q for q in queries if f'FROM "{user_table}"' in q["sql"]]) == 1
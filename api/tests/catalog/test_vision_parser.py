@@ -1,9 +1,13 @@
 import base64
+import random
+
 import pytest
 from django.core.management import call_command
 from django.test import override_settings
+from google.cloud import vision
 
 from catalog.models import Category, Subcategory, Vendor
+from catalog.vision_parser import FlatDocument, VisionParser
 
 from .test_views import auth_override
 
@@ -372,3 +376,99 @@ def test_vision_parser_image_19(client, token):
     assert resp.data["year"] == 2019
     assert "category" not in resp.data
     assert Vendor.objects.get(id=resp.data["vendor"]).name == "White2Tea"
+
+
+def get_random_document(rng):
+    """ Returns a random text detection document. """
+    words = ["Da", "Hong", "Pao", "2019", "大红袍", "Mei", "Leaf", "oolong", "a"]
+    document = vision.types.TextAnnotation()
+    for _ in range(rng.randint(1, 2)):
+        page = document.pages.add()
+        for _ in range(rng.randint(0, 3)):
+            block = page.blocks.add()
+            for _ in range(rng.randint(0, 3)):
+                paragraph = block.paragraphs.add()
+                for _ in range(rng.randint(0, 6)):
+                    word = paragraph.words.add()
+                    word.confidence = rng.choice([0, 0.5, 0.875, 1])
+                    for _ in range(rng.choice([3, 4])):
+                        vertex = word.bounding_box.vertices.add()
+                        vertex.x = rng.randint(0, 100)
+                        vertex.y = rng.randint(0, 100)
+                    for character in rng.choice(words):
+                        symbol = word.symbols.add()
+                        symbol.text = character
+                    symbol.property.detected_break.type = rng.choice([0, 1, 3, 5])
+    return document
+
+
+def get_word_by_word_data(parser, document):
+    """
+    Returns words, phrases and reduced data walking the document word by word,
+    as parsing stages did before it was flattened.
+    """
+    words = []
+    blocks = []
+    for page in document.pages:
+        for block in page.blocks:
+            phrases = []
+            for paragraph in block.paragraphs:
+                phrase_words = []
+                phrase_area = 0
+                phrase_confidence = 0
+                for word in paragraph.words:
+                    end_of_phrase = False
+                    word_area = parser.get_area_from_bounding_box(word.bounding_box)
+                    word_string = ""
+                    for symbol in word.symbols:
+                        word_string += symbol.text
+                        if symbol.property.detected_break.type in (3, 5):
+                            end_of_phrase = True
+                    if word.confidence:
+                        phrase_confidence += word.confidence
+                    else:
+                        phrase_confidence += 1
+                    words.append(word_string)
+                    phrase_words.append(word_string)
+                    phrase_area += word_area
+                    if end_of_phrase:
+                        font_size = phrase_area / len("".join(phrase_words))
+                        confidence = phrase_confidence / len(phrase_words)
+                        phrases.append(
+                            {
+                                "words": phrase_words,
+                                "font_size": font_size,
+                                "confidence": confidence,
+                            }
+                        )
+                        phrase_words = []
+                        phrase_area = 0
+                        phrase_confidence = 0
+            blocks.append({"phrases": phrases})
+
+    phrases = []
+    for length in range(1, 5):
+        for start in range(len(words) - length + 1):
+            phrase = words[start:][:length]
+            phrases.append(" ".join(phrase).lower())
+    return words, list(dict.fromkeys(phrases)), {"blocks": blocks}
+
+
+def test_flat_document_matches_word_by_word_traversal():
+    rng = random.Random(0)
+    for _ in range(200):
+        document = get_random_document(rng)
+        parser = VisionParser(b"", backend=object(), index=object())
+        parser.document = document
+        words, phrases, reduced_data = get_word_by_word_data(parser, document)
+        assert parser.get_text_detection_word_list() == words
+        assert parser.get_phrases() == phrases
+        assert parser.reduced_data_parser() == reduced_data
+
+        # Cached documents parse the same
+        cached = VisionParser(b"", backend=object(), index=object())
+        cached.flat_document = FlatDocument.deserialize(
+            parser.get_flat_document().serialize()
+        )
+        assert cached.get_phrases() == phrases
+        assert cached.reduced_data_parser() == reduced_data
@@ -113,46 +113,97 @@ export async function uploadInstance(
   }
 }
 
+// Bulk endpoint limits, items per request and request body size under the
+// web server one
+const BULK_MAX_ITEMS = 100;
+const BULK_MAX_BYTES = 4 * 1024 * 1024;
+
+/**
+ * Splits bulk requests in chunks of at most BULK_MAX_ITEMS items and
+ * BULK_MAX_BYTES, an item larger than that being sent alone.
+ *
+ * @category Services
+ * @param {Object[]} requests - Bulk request items
+ * @returns {number[][]} Chunks of request positions
+ */
+function getBulkChunks(requests: Object[]): number[][] {
+  const chunks: number[][] = [];
+  let chunk: number[] = [];
+  let size = 2;
+  requests.forEach((request, i) => {
+    const itemSize = new Blob([JSON.stringify(request)]).size + 1;
+    if (
+      chunk.length &&
+      (chunk.length >= BULK_MAX_ITEMS || size + itemSize > BULK_MAX_BYTES)
+    ) {
+      chunks.push(chunk);
+      chunk = [];
+      size = 2;
+    }
+    chunk.push(i);
+    size += itemSize;
+  });
+  if (chunk.length) chunks.push(chunk);
+  return chunks;
+}
+
 /**
- * Tries to upload teas or brewing sessions offline instances from storage to API.
- * If successful releases the cache.
+ * Tries to upload teas or brewing sessions offline instances from storage to API,
+ * through the bulk endpoint in chunks. Uploaded instances and the ones rejected
+ * by the API are released from the cache, the others kept for later.
  *
  * @category Services
  * @param {"tea"|"session"} type - Instance type
  */
 export async function uploadOffline(type: "tea" | "session"): Promise<void> {
-  // Storage name
+  // Storage name and API endpoint
   const storage = "offline-" + type + "s";
+  const endpoint = type === "tea" ? "tea" : "brewing_session";
 
   const offline = await localforage.getItem<TeaInstance | SessionInstance[]>(
     storage
   );
-  if (!offline) return;
-
-  let failed: TeaInstance | SessionInstance[] = [];
-  let error = "";
-
-  const requests = offline.map(
-    async (instance: TeaInstance | SessionInstance) => {
-      try {
-        const request = { ...instance, id: undefined, offline_id: undefined };
-        await uploadInstance(request, instance.id);
-      } catch (e) {
-        // Save failed instance if proper
-        if (e.message !== "Bad Request") failed.push(instance);
-        error = e.message;
-      }
-    }
-  );
+  if (!offline || !offline.length) return;
 
-  await Promise.allSettled(requests);
+  const requests = offline.map((instance: TeaInstance | SessionInstance) => {
+    let request = JSON.parse(
+      JSON.stringify({ ...instance, id: undefined, offline_id: undefined })
+    );
+    // String UUID means API generated, instance has been previously uploaded
+    if (typeof instance.id === "string") {
+      request.id = instance.id;
+      // Remove image from update request
+      if (request.image) delete request.image;
+    }
+    return request;
+  });
 
-  if (failed.length) {
-    await localforage.setItem<TeaInstance | SessionInstance[]>(storage, failed);
-    throw new Error(error);
-  } else {
-    await localforage.setItem(storage, []);
+  // Keep instances failed for another reason than invalid or missing data,
+  // whole chunks if the request itself failed
+  const failed: number[] = [];
+  for (const chunk of getBulkChunks(requests)) {
+    try {
+      const res = await APIRequest(
+        `/${endpoint}/bulk/`,
+        "POST",
+        JSON.stringify(chunk.map((i) => requests[i]))
+      );
+      const results: { status: number }[] = await res.json();
+      chunk.forEach((i, position) => {
+        if (results[position].status >= 500) failed.push(i);
+      });
+    } catch (e) {
+      failed.push(...chunk);
+    }
   }
+
+  await localforage.setItem<TeaInstance | SessionInstance[]>(
+    storage,
+    offline.filter((_: TeaInstance | SessionInstance, i: number) =>
+      failed.includes(i)
+    )
+  );
+  if (failed.length) throw new Error("Upload failed");
 }
 
 /**
@@ -226,12 +277,11 @@ export async function syncInstances(
 
   // Get cached API instances if ID not already on offline ones,
   // meaning they've been modified but not uploaded yet
-  let cached = await localforage.getItem<GenericModels[]>(storage);
-  if (!cached) cached = [];
-  else
-    cached = cached.filter(
-      (c) => !offline.some((o) => o.offline_id === c.offline_id)
-    );
+  let cachedOnline = await localforage.getItem<GenericModels[]>(storage);
+  if (!cachedOnline) cachedOnline = [];
+  const cached = cachedOnline.filter(
+    (c) => !offline.some((o) => o.offline_id === c.offline_id)
+  );
 
   // All locally stored instances
   const locals = offline.concat(cached);
@@ -239,9 +289,43 @@ export async function syncInstances(
   // Set initial state merging cached data
   dispatch({ type: "SET", data: locals });
 
-  // Get online instances
-  const res = await APIRequest(`/${endpoint}/`, "GET");
-  const body = await res?.json();
+  // Get online instances, only changes since last sync for teas and sessions
+  let body: GenericModels[] | undefined;
+  let syncToken: string | undefined;
+  if (type === "tea" || type === "session") {
+    const key = type === "tea" ? "teas" : "brewing_sessions";
+    const lastToken = await localforage.getItem<string>("sync-token-" + storage);
+    const since = lastToken ? `&since=${encodeURIComponent(lastToken)}` : "";
+    let res: Response;
+    try {
+      res = await APIRequest(`/sync/?types=${key}${since}`, "GET");
+    } catch (e) {
+      // Drop the token in case the API rejects it, next sync is a full one
+      if (lastToken) await localforage.removeItem("sync-token-" + storage);
+      throw e;
+    }
+    const sync = await res?.json();
+    if (sync) {
+      syncToken = sync.token;
+      const changed: GenericModels[] = sync[key];
+      if (sync.full) body = changed;
+      else {
+        // Apply changes and deletions to previously synced instances
+        const deleted: string[] = sync.deleted[key];
+        body = cachedOnline
+          .filter(
+            (c) =>
+              "id" in c &&
+              !deleted.some((id) => id === c.id) &&
+              !changed.some((i) => "id" in i && i.id === c.id)
+          )
+          .concat(changed);
+      }
+    }
+  } else {
+    const res = await APIRequest(`/${endpoint}/`, "GET");
+    body = await res?.json();
+  }
 
   // Remove API instances present offline and generate offline ID
   let online: GenericModels[] = [];
@@ -326,6 +410,8 @@ export async function syncInstances(
 
   // Update the cache
   await localforage.setItem<GenericModels[]>(storage, online);
+  if (syncToken)
+    await localforage.setItem<string>("sync-token-" + storage, syncToken);
 }
 
 /**